@@ -6,8 +6,10 @@ import numpy as np
 import pandas as pd
 import validation as valid
 import helpfunctions as hf
+import outputwriter as ow
 import matplotlib.pyplot as plt
 from openpyxl.styles import Alignment
+from PyQt5.QtCore import QEventLoop
 from PyQt5.QtWidgets import QApplication
 from compoundNamesGUI import AssignValuesWindow
 from cellNamesGUI import AssignNamesValuesWindow
@@ -65,11 +67,7 @@ def pop_up_compound_GUI(pairs_df: pd.DataFrame, cell_name: str):
     :param cell_name: The name of the cell line.
     :return: A list of assigned names for the compound names.
     """
-    control_types = ['CONTROL', 'DMSO', 'PBS']
-    compound_name = pairs_df['compound_name'].unique()
-
-    control_list = list(set(compound_name) & set(control_types))
-    inhibitor_list = list(set(compound_name) - set(control_list))
+    control_list, inhibitor_list = hf.get_default_compound_lists(pairs_df)
     app = QApplication.instance()  # Retrieve the existing QApplication instance
     if app is None:
         app = QApplication(sys.argv)
@@ -85,6 +83,48 @@ def pop_up_compound_GUI(pairs_df: pd.DataFrame, cell_name: str):
     return compounds_list
 
 
+def get_application() -> QApplication:
+    """
+    This function returns the QApplication instance, creating it if needed.
+
+    :return: The QApplication instance.
+    """
+    app = QApplication.instance()
+    if app is None:
+        app = QApplication(sys.argv)
+    return app
+
+
+def wait_for_window(window):
+    """
+    This function shows a window and waits until it is closed, in a nested event loop, so the windows that are
+    already open stay responsive. The window should emit a 'closed' signal.
+
+    :param window: The window to wait for.
+    """
+    loop = QEventLoop()
+    window.closed.connect(loop.quit)
+    window.show()
+    if window.isVisible():
+        loop.exec_()
+
+
+def ask_compound_selection(cell_df: pd.DataFrame, cell_name: str):
+    """
+    This function shows the compound GUI of a cell line like 'pop_up_compound_GUI', without stopping the event loop
+    that is running, so it can be used while an analysis reports its progress.
+
+    :param cell_df: The input dataframe of the cell line.
+    :param cell_name: The name of the cell line.
+    :return: A tuple containing the control list and the inhibitor list.
+    """
+    app = get_application()  # noqa: F841 - the application must outlive the window
+    control_list, inhibitor_list = hf.get_default_compound_lists(cell_df)
+    window = AssignValuesWindow(control_list, inhibitor_list, cell_name)
+    wait_for_window(window)
+    return window.result
+
+
 def set_column_width_and_alignment(worksheet):
     """
     Set the column width and alignment in the given worksheet to fit the content.
@@ -131,17 +171,29 @@ def parse_measurement_string(measurement_str: str) -> float:
     if measurement_str == '-0-':
         return 0
 
-    units = {'nM': 1e-9, 'uM': 1e-6, 'mM': 1e-3, 'ug/ml': 1}
+    units = {'pm': 1e-12, 'nm': 1e-9, 'um': 1e-6, 'mm': 1e-3, 'm': 1, 'ug/ml': 1}
 
     value_str, unit_str = re.findall(r'([\d.-]+)(\D*)', measurement_str)[0]
     value = float(value_str)
-    unit = unit_str.strip()
+    unit = unit_str.strip().lower()
 
     return value * units.get(unit, 0)
 
 
+def get_fixed_col_parser(fixed_col: str):
+    """
+    This function returns the function that parses the values of the fixed column into comparable numbers.
+
+    :param fixed_col: The name of the fixed column.
+    :return: 'parse_time_string' for 'time', 'parse_measurement_string' otherwise.
+    """
+    if fixed_col == 'time':
+        return parse_time_string
+    return parse_measurement_string
+
+
 def create_bars(processes_values: dict, sorted_pairs: dict, pairs_dict: dict, pair: list, fixed_col: str,
-                cell_path: str, cell_name: str):
+                cell_path: str, cell_name: str, writer: ow.OutputWriter = None):
     """
     This function create bars for given cell
 
@@ -152,6 +204,7 @@ def create_bars(processes_values: dict, sorted_pairs: dict, pairs_dict: dict, pa
     :param fixed_col: The fixed column the user chose
     :param cell_path: The path of the cell
     :param cell_name: The name of the cell line
+    :param writer: The background writer. Default is None - the figures are saved synchronously.
     """
     print(f"Start creating bars for {cell_name}({sorted_pairs[0][1]}, {sorted_pairs[0][2]})..")
     for process_key in processes_values.keys():
@@ -189,15 +242,13 @@ def create_bars(processes_values: dict, sorted_pairs: dict, pairs_dict: dict, pa
         save_directory = os.path.join(cell_path, 'Bars', sorted_pairs[0][1] + ", " + sorted_pairs[0][2])
         os.makedirs(save_directory, exist_ok=True)
         save_path = os.path.join(save_directory, f' Process {process_key} - by {fixed_col}.png')
-        plt.savefig(save_path, dpi=300)
+        save_figure(plt.gcf(), save_path, writer,
+                    message=f"bar {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} saved successfully")
         plt.close()
 
-        print(
-            f"bar {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} saved successfully")
-
 
 def create_graphs(process_sum: dict, sorted_pairs: dict, pairs_dict: dict, pair: list, fixed_col: str, cell_path: str,
-                  cell_name: str):
+                  cell_name: str, writer: ow.OutputWriter = None):
     """
     This function create graphs for given cell
 
@@ -208,6 +259,7 @@ def create_graphs(process_sum: dict, sorted_pairs: dict, pairs_dict: dict, pair:
     :param fixed_col: The fixed column the user chose
     :param cell_path: The path of the cell
     :param cell_name: The name of the cell line
+    :param writer: The background writer. Default is None - the figures are saved synchronously.
     """
     print(f"Start creating graphs for {cell_name}({sorted_pairs[0][1]}, {sorted_pairs[0][2]})..")
     for process_key in process_sum.keys():
@@ -242,13 +294,13 @@ def create_graphs(process_sum: dict, sorted_pairs: dict, pairs_dict: dict, pair:
         save_directory = os.path.join(cell_path, 'Graphs', sorted_pairs[0][1] + ", " + sorted_pairs[0][2])
         os.makedirs(save_directory, exist_ok=True)
         save_path = os.path.join(save_directory, f' Process {process_key} - by {fixed_col}.png')
-        plt.savefig(save_path, dpi=300)
+        save_figure(fig, save_path, writer,
+                    message=f"graph {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} saved "
+                            f"successfully")
         plt.close(fig)
 
-        print(f"graph {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} saved successfully")
-
 
-def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: str):
+def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: str, writer: ow.OutputWriter = None):
     """
     The function create graphs for pairs from the data, where there is at least 2 values for process
 
@@ -256,6 +308,7 @@ def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: st
     :param cell_name: The name of the cell line
     :param fixed_col: The fixed column the user chose
     :param cell_path: The path of the cell
+    :param writer: The background writer. Default is None - the figures are saved synchronously.
     """
     graphs = False
     pairs = list(set((key[1], key[2]) for key in pairs_dict if key[1] != key[2]))
@@ -263,10 +316,8 @@ def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: st
         # takes all the matching pairs from the dictionary
         matching_pairs = [key for key in pairs_dict if key[1] == pair[0] and key[2] == pair[1]]
         if matching_pairs and len(matching_pairs) > 1:
-            if fixed_col == 'time':
-                sorted_pairs = sorted(matching_pairs, key=lambda key: parse_time_string(key[3]))  # sorted by time
-            else:
-                sorted_pairs = sorted(matching_pairs, key=lambda key: parse_measurement_string(key[3]))
+            parser = get_fixed_col_parser(fixed_col)
+            sorted_pairs = sorted(matching_pairs, key=lambda key: parser(key[3]))  # sorted by the fixed column
             process_sum, processes_values = {}, {}
             # iterate over the keys and extract the df and their values pair process
             for key in sorted_pairs:
@@ -278,7 +329,7 @@ def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: st
                     else:
                         processes_values[process].extend([df[process].tolist()[:2]])
 
-            create_bars(processes_values, sorted_pairs, pairs_dict, pair, fixed_col, cell_path, cell_name)
+            create_bars(processes_values, sorted_pairs, pairs_dict, pair, fixed_col, cell_path, cell_name, writer)
 
             for process_key, value in processes_values.items():
                 if len(value) > 1:
@@ -320,19 +371,19 @@ def create_plots(pairs_dict: dict, cell_name: str, fixed_col: str, cell_path: st
                     save_directory = os.path.join(cell_path, 'Graphs', sorted_pairs[0][1] + ", " + sorted_pairs[0][2])
                     os.makedirs(save_directory, exist_ok=True)
                     save_path = os.path.join(save_directory, f' Process {process_key} - by {fixed_col}.png')
-                    plt.savefig(save_path, dpi=300)
+                    save_figure(fig, save_path, writer,
+                                message=f"graph {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} "
+                                        f"saved successfully")
                     plt.close(fig)
 
-                    print(
-                        f"graph {sorted_pairs[0][1]}, {sorted_pairs[0][2]}, process {process_key} saved successfully")
-
-                create_graphs(process_sum, sorted_pairs, pairs_dict, pair, fixed_col, cell_path, cell_name)
+                create_graphs(process_sum, sorted_pairs, pairs_dict, pair, fixed_col, cell_path, cell_name, writer)
 
     if not graphs:
         print("There is not enough data for creating graphs")
 
 
-def plot_G_values(title: str, uid: list, values: list, save_path: str, edge_percents: float):
+def plot_G_values(title: str, uid: list, values: list, save_path: str, edge_percents: float,
+                  writer: ow.OutputWriter = None):
     """
     This function accepts columns representing processes and sorts for each process its proteins.
     In addition, the function saves the plot of process
@@ -342,6 +393,7 @@ def plot_G_values(title: str, uid: list, values: list, save_path: str, edge_perc
     :param values: The sorted list of G_values.
     :param save_path: The path to save the figures, if None the plots will be displayed one by one
     :param edge_percents: The percentage of proteins to be considered as the edge for each process.
+    :param writer: The background writer. Default is None - the figure is saved synchronously.
     """
     valid.is_valid_path(save_path)
 
@@ -361,8 +413,8 @@ def plot_G_values(title: str, uid: list, values: list, save_path: str, edge_perc
         plt.scatter([uid[i] for i in lower_edge_indices], [values[i] for i in lower_edge_indices], color='red')
         plt.scatter([uid[i] for i in upper_edge_indices], [values[i] for i in upper_edge_indices], color='red')
 
-    plt.savefig(os.path.join(save_path, f'{title}.SVG'), dpi=300)
-    print(f"The SVG file '{title}' saved successfully")
+    save_figure(plt.gcf(), os.path.join(save_path, f'{title}.SVG'), writer,
+                message=f"The SVG file '{title}' saved successfully")
     plt.close()
 
 
@@ -399,6 +451,56 @@ def create_new_sheet(df: pd.DataFrame, path: str, sheet_name: str):
         print(f"The sheet '{sheet_name}' was not created because the DataFrame is empty")
 
 
+def save_figure(fig, path: str, writer: ow.OutputWriter = None, dpi: int = 300, message: str = None):
+    """
+    This function saves a figure, in the background if a writer is given.
+
+    :param fig: The figure to save.
+    :param path: The destination path.
+    :param writer: The background writer. Default is None - the figure is saved synchronously.
+    :param dpi: The resolution of the figure.
+    :param message: A message to print once the figure is written, see 'print_when_saved'. Default is None.
+    """
+    if writer is None:
+        fig.savefig(path, dpi=dpi)
+    else:
+        writer.submit_figure(fig, path, dpi=dpi)
+    print_when_saved(message, writer)
+
+
+def save_csv(df: pd.DataFrame, path: str, writer: ow.OutputWriter = None, message: str = None, **to_csv_kwargs):
+    """
+    This function saves a DataFrame as CSV, in the background if a writer is given.
+
+    :param df: The DataFrame to save.
+    :param path: The destination path.
+    :param writer: The background writer. Default is None - the file is saved synchronously.
+    :param message: A message to print once the file is written, see 'print_when_saved'. Default is None.
+    :param to_csv_kwargs: Keyword arguments passed to 'DataFrame.to_csv'.
+    """
+    if writer is None:
+        df.to_csv(path, **to_csv_kwargs)
+    else:
+        writer.submit_csv(df, path, **to_csv_kwargs)
+    print_when_saved(message, writer)
+
+
+def print_when_saved(message: str, writer: ow.OutputWriter = None):
+    """
+    This function prints a message once the writes queued so far are completed: at once without a writer, or from
+    the writer thread that completes them. Nothing is printed if one of the writes fails.
+
+    :param message: The message to print. If None, nothing is printed.
+    :param writer: The background writer. Default is None - the writes are already completed.
+    """
+    if message is None:
+        return
+    if writer is None:
+        print(message)
+    else:
+        writer.when_done(lambda: print(message))
+
+
 def get_folder_name(data_path: str) -> str:
     """
     This function accepts a path with a filename at the end and returns the filename at the end of the path.
@@ -411,7 +513,8 @@ def get_folder_name(data_path: str) -> str:
 
 
 def export_data(file_iter: int, pairs_df: pd.DataFrame, pairs_dict: dict, cell_name: str, fixed_col: str,
-                data_path: str, save_path: str, sheet_name: str):
+                data_path: str, save_path: str, sheet_name: str, writer: ow.OutputWriter = None,
+                workbook: ow.WorkbookWriter = None):
     """
     Export the analyzed data and create plots for a specific cell line.
 
@@ -423,6 +526,8 @@ def export_data(file_iter: int, pairs_df: pd.DataFrame, pairs_dict: dict, cell_n
     :param data_path: The path where the original dataframes are stored.
     :param save_path: The path where the exported data and plots will be saved.
     :param sheet_name: The name of the sheet or file to be exported.
+    :param writer: The background writer. Default is None - the files are saved synchronously.
+    :param workbook: The workbook of all the results. If given, the table is also written as a sheet of it.
     """
     folder_name = get_folder_name(data_path)
     folder_path = os.path.join(save_path, folder_name)
@@ -432,10 +537,11 @@ def export_data(file_iter: int, pairs_df: pd.DataFrame, pairs_dict: dict, cell_n
     os.makedirs(cell_path, exist_ok=True)
 
     if file_iter == 0:
-        create_plots(pairs_dict, cell_name, fixed_col, cell_path)
+        create_plots(pairs_dict, cell_name, fixed_col, cell_path, writer)
 
     file_path = os.path.join(cell_path, sheet_name + '.csv')
     print(f"creating '{sheet_name}.csv'..")
 
-    pairs_df.to_csv(file_path, index=True)
-    print(f"{sheet_name}.csv created successfully\n")
+    save_csv(pairs_df, file_path, writer, message=f"{sheet_name}.csv created successfully\n", index=True)
+    if workbook is not None:
+        workbook.add_sheet(pairs_df, sheet_name)
@@ -0,0 +1,154 @@
+import os
+import numpy as np
+import pandas as pd
+import exceptions as e
+import validation as valid
+import UIFunctions as UIf
+import helpfunctions as hf
+import outputwriter as ow
+
+
+class GroupTensor:
+    def __init__(self, l_df: pd.DataFrame, fixed_col: str = 'time'):
+        """
+        This method builds the group tensor of 'L': the count, mean and variance of every (cell line, compound,
+        fixed value, process), computed with a single groupby-aggregate and stored as dense arrays of shape
+        (cell lines, compounds, fixed values, processes). Missing groups have a count of 0 and NaN statistics.
+
+        :param l_df: The 'L' DataFrame (or the important 'L').
+        :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+        """
+        valid.is_valid_L(l_df)
+        if fixed_col not in ('time', 'dosage'):
+            raise e.InvalidColumnsException(f"The fixed column '{fixed_col}' should be 'time' or 'dosage'")
+        self.fixed_col = fixed_col
+        self.processes = hf.get_analysis_columns(l_df)
+        self.cell_lines = l_df['cell_line_name'].unique().tolist()
+        self.compounds = l_df['compound_name'].unique().tolist()
+        self.fixed_values = l_df[fixed_col].unique().tolist()
+
+        aggregated = l_df.astype({process: float for process in self.processes}).groupby(
+            ['cell_line_name', 'compound_name', fixed_col], sort=False)[self.processes].agg(['count', 'mean', 'var'])
+        full_index = pd.MultiIndex.from_product([self.cell_lines, self.compounds, self.fixed_values])
+        aggregated = aggregated.reindex(full_index)
+        shape = (len(self.cell_lines), len(self.compounds), len(self.fixed_values), len(self.processes))
+
+        self.count = aggregated.xs('count', axis=1, level=1).fillna(0).to_numpy(dtype=int).reshape(shape)
+        self.mean = aggregated.xs('mean', axis=1, level=1).to_numpy(dtype=float).reshape(shape)
+        self.var = aggregated.xs('var', axis=1, level=1).to_numpy(dtype=float).reshape(shape)
+
+    def get_positions(self, labels: list, axis_labels: list) -> list:
+        """
+        This method returns the positions of the labels on an axis of the tensor, skipping the missing labels.
+
+        :param labels: The labels to find.
+        :param axis_labels: The labels of the axis.
+        :return: A list of positions.
+        """
+        return [axis_labels.index(label) for label in labels if label in axis_labels]
+
+    def pool(self, compounds: list, fixed_values: list = None):
+        """
+        This method pools the groups of several compounds, for all the cell lines, fixed values and processes at once.
+
+        :param compounds: The compound names to pool.
+        :param fixed_values: The fixed values to keep, in this order. Default is all the fixed values.
+        :return: A tuple (count, mean, m2) of arrays of shape (cell lines, fixed values, processes), where m2 is the sum
+                 of squared deviations from the pooled mean.
+        """
+        compound_idx = self.get_positions(compounds, self.compounds)
+        value_idx = self.get_positions(fixed_values, self.fixed_values) if fixed_values is not None else slice(None)
+        count = self.count[:, compound_idx][:, :, value_idx]
+        mean = self.mean[:, compound_idx][:, :, value_idx]
+        m2 = np.maximum(count - 1, 0) * np.nan_to_num(self.var[:, compound_idx][:, :, value_idx])
+        return hf.pool_statistics(count, mean, m2, axis=1)
+
+    def contrast(self, compound: str, control_list: list = None) -> pd.DataFrame:
+        """
+        This method contrasts a compound with the pooled controls in every cell line and at every fixed value, for all
+        the processes at once.
+
+        :param compound: The compound name.
+        :param control_list: The controls to pool. Default is the controls of 'hf.get_default_compound_lists'.
+        :return: A DataFrame with a row per (cell line, fixed value, process) where both the compound and the controls
+                 were measured.
+        """
+        if compound not in self.compounds:
+            raise e.InvalidCompoundException(f"The compound '{compound}' is not in the data")
+        if control_list is None:
+            control_list, _ = hf.get_default_compound_lists(pd.DataFrame({'compound_name': self.compounds}))
+
+        n_control, mean_control, m2_control = self.pool(control_list)
+        n_compound, mean_compound, m2_compound = self.pool([compound])
+        p = hf.get_t_test_p_values(n_control, mean_control, m2_control, n_compound, mean_compound, m2_compound)
+
+        index = pd.MultiIndex.from_product([self.cell_lines, self.fixed_values, self.processes],
+                                           names=['cell_line_name', self.fixed_col, 'process'])
+        contrast = pd.DataFrame({'compound_name': compound,
+                                 'n_control': n_control.ravel(),
+                                 'n_compound': n_compound.ravel(),
+                                 'mean_control': mean_control.ravel(),
+                                 'mean_compound': mean_compound.ravel(),
+                                 'difference': (mean_compound - mean_control).ravel(),
+                                 'sign_changed': (np.sign(mean_control) != np.sign(mean_compound)).ravel(),
+                                 'p': p.ravel()}, index=index)
+        measured = (contrast['n_control'] > 0) & (contrast['n_compound'] > 0)
+        return contrast.loc[measured].reset_index()
+
+
+def sign_flip_summary(contrast: pd.DataFrame, p_value: float = 0.05) -> pd.DataFrame:
+    """
+    This function summarizes a contrast across the cell lines: for every process, the number of cell lines in which the
+    compound flips the sign of the controls, and in which it does so with a significant t-test.
+
+    :param contrast: The DataFrame returned by 'GroupTensor.contrast'.
+    :param p_value: The p-value threshold. Default is 0.05.
+    :return: A DataFrame indexed by process, sorted by the number of flipping cell lines.
+    """
+    flips = contrast.assign(significant_flip=contrast['sign_changed'] & (contrast['p'] <= p_value))
+    flipped = flips.loc[flips['sign_changed']]
+    summary = pd.DataFrame({
+        'cell_lines': flips.groupby('process')['cell_line_name'].nunique(),
+        'flipping_cell_lines': flipped.groupby('process')['cell_line_name'].nunique(),
+        'significant_flipping_cell_lines': flips.loc[flips['significant_flip']].groupby('process')[
+            'cell_line_name'].nunique()})
+    summary = summary.fillna(0).astype(int)
+    summary['flipping_names'] = flipped.groupby('process')['cell_line_name'].unique().map(', '.join)
+    summary['flipping_names'] = summary['flipping_names'].fillna('')
+    return summary.sort_values('flipping_cell_lines', ascending=False, kind='stable')
+
+
+def analyze_cross_cell_lines(important_l: pd.DataFrame, data_path: str, compounds: list = None,
+                             fixed_col: str = 'time', p_value: float = 0.05, save_path: str = os.getcwd(),
+                             writer: ow.OutputWriter = None) -> dict:
+    """
+    This function contrasts every compound with the controls across all the cell lines and saves a
+    'cross_<compound>_by_<fixed_col>.csv' file with the contrasts and a 'cross_<compound>_summary_by_<fixed_col>.csv'
+    file with the sign flips per process.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param compounds: The compounds to contrast. Default is all the compounds that are not controls.
+    :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+    :param p_value: The p-value threshold of the summary. Default is 0.05.
+    :param save_path: The path where the exported data will be saved.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :return: A dictionary of compound to its sign flip summary.
+    """
+    tensor = GroupTensor(important_l, fixed_col=fixed_col)
+    control_list, inhibitor_list = hf.get_default_compound_lists(important_l)
+    if compounds is None:
+        compounds = inhibitor_list
+    folder_path = os.path.join(save_path, UIf.get_folder_name(data_path), 'cross_cell_lines')
+    os.makedirs(folder_path, exist_ok=True)
+
+    summaries = {}
+    with ow.writer_context(writer) as writer:
+        for compound in compounds:
+            contrast = tensor.contrast(compound, control_list)
+            summaries[compound] = sign_flip_summary(contrast, p_value)
+            UIf.save_csv(contrast, os.path.join(folder_path, f'cross_{compound}_by_{fixed_col}.csv'), writer,
+                         message=f"cross_{compound}_by_{fixed_col}.csv created successfully", index=False)
+            UIf.save_csv(summaries[compound],
+                         os.path.join(folder_path, f'cross_{compound}_summary_by_{fixed_col}.csv'), writer)
+    return summaries
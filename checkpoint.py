@@ -0,0 +1,139 @@
+import os
+import json
+import threading
+import pandas as pd
+import outputwriter as ow
+
+JOURNAL_NAME = 'analyze_L_journal.json'
+
+
+class CheckpointJournal:
+    def __init__(self, folder_path: str, parameters: dict, resume: bool = False):
+        """
+        This method opens the checkpoint journal of an 'analyze_L' run in the output folder of a dataset. The journal
+        records the parameters of the run, the selections of every cell line and every completed unit. With 'resume',
+        the journal of a previous run with the same parameters is continued; otherwise a new journal is started.
+
+        :param folder_path: The output folder of the dataset.
+        :param parameters: The parameters of the run. A journal made with other parameters is not resumed.
+        :param resume: If True, continues the journal of a previous run. Default is False.
+        """
+        self.path = os.path.join(folder_path, JOURNAL_NAME)
+        self.parameters = json.loads(json.dumps(parameters, default=to_json))
+        self.state = {'parameters': self.parameters, 'cell_lines': None, 'selections': {}, 'completed': []}
+
+        if resume and os.path.isfile(self.path):
+            with open(self.path) as journal_file:
+                state = json.load(journal_file)
+            if state.get('parameters') == self.parameters:
+                self.state = state
+                print(f"Resuming from '{self.path}': {len(self.state['completed'])} completed unit(s)")
+            else:
+                print(f"The checkpoint '{self.path}' was made with other parameters, starting over")
+        self.completed = set(self.state['completed'])
+        self.lock = threading.Lock()
+        os.makedirs(folder_path, exist_ok=True)
+
+    def get_unit(self, cell_line: str, fixed_col: str, file_iter: int) -> str:
+        """
+        This method returns the name of a unit of work.
+
+        :param cell_line: The name of the cell line.
+        :param fixed_col: The name of the fixed column.
+        :param file_iter: The index of the output file of the cell line (0 to 3).
+        :return: The name of the unit.
+        """
+        return f'{cell_line}|{fixed_col}|{file_iter}'
+
+    def is_done(self, cell_line: str, fixed_col: str, file_iter: int) -> bool:
+        """
+        This method checks whether a unit was completed.
+
+        :param cell_line: The name of the cell line.
+        :param fixed_col: The name of the fixed column.
+        :param file_iter: The index of the output file of the cell line.
+        :return: True if the unit was completed.
+        """
+        return self.get_unit(cell_line, fixed_col, file_iter) in self.completed
+
+    def mark_done(self, cell_line: str, fixed_col: str, file_iter: int, writer: ow.OutputWriter = None):
+        """
+        This method records a completed unit once all its files are on disk. With a background writer, the unit is
+        recorded by the writer when the pending outputs are written, so the analysis does not wait for them.
+
+        :param cell_line: The name of the cell line.
+        :param fixed_col: The name of the fixed column.
+        :param file_iter: The index of the output file of the cell line.
+        :param writer: The background writer of the outputs of the unit, if any.
+        """
+        unit = self.get_unit(cell_line, fixed_col, file_iter)
+        if writer is not None:
+            writer.when_done(lambda: self.record_unit(unit))
+        else:
+            self.record_unit(unit)
+
+    def record_unit(self, unit: str):
+        """
+        This method records a completed unit and saves the journal.
+
+        :param unit: The name of the unit.
+        """
+        with self.lock:
+            if unit not in self.completed:
+                self.completed.add(unit)
+                self.state['completed'].append(unit)
+                self.save()
+
+    def get_cell_lines(self, cell_line_list: list = None) -> list:
+        """
+        This method returns the cell lines of the run: the given ones, or the ones of the resumed journal.
+
+        :param cell_line_list: The cell lines given to the run, if any.
+        :return: The cell lines, or None if they should still be chosen.
+        """
+        return cell_line_list if cell_line_list is not None else self.state['cell_lines']
+
+    def get_selection(self, cell_line: str):
+        """
+        This method returns the recorded selection of a cell line.
+
+        :param cell_line: The name of the cell line.
+        :return: A tuple containing the control list and the inhibitor list, or None if it was not recorded.
+        """
+        if cell_line not in self.state['selections']:
+            return None
+        control_list, inhibitor_list = self.state['selections'][cell_line]
+        return list(control_list), list(inhibitor_list)
+
+    def record_selections(self, cell_line_list: list, selections: dict):
+        """
+        This method records the cell lines and the compound selections of the run.
+
+        :param cell_line_list: The cell lines of the run.
+        :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple.
+        """
+        with self.lock:
+            self.state['cell_lines'] = list(cell_line_list)
+            self.state['selections'] = {cell_line: [list(control_list), list(inhibitor_list)]
+                                        for cell_line, (control_list, inhibitor_list) in selections.items()}
+            self.save()
+
+    def save(self):
+        """
+        This method writes the journal atomically. It is called with the lock held.
+        """
+        ow.atomic_write(json.dumps(self.state, indent=2, default=to_json).encode(), self.path)
+
+
+def to_json(value):
+    """
+    This function converts the values that JSON can not encode, such as a Series of error limits or numpy scalars.
+
+    :param value: The value to convert.
+    :return: A value that JSON can encode.
+    """
+    if isinstance(value, pd.Series):
+        return {str(key): float(item) for key, item in value.items()}
+    if hasattr(value, 'item'):
+        return value.item()
+    return str(value)
@@ -0,0 +1,240 @@
+import os
+import sys
+import glob
+import json
+import time
+import argparse
+import contextlib
+import traceback
+import matplotlib
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
+matplotlib.use('Agg')
+
+import oncosensepy as osp  # noqa: E402
+import celltensor as ct  # noqa: E402
+
+DEFAULT_CONFIG = {'fixed_cols': ['time'],
+                  'p_value': 0.05,
+                  'threshold': 2,
+                  'edge_percents': 0.1,
+                  'save_path': os.getcwd(),
+                  'jobs': 1,
+                  'pair_schedule': 'all',
+                  'correction': None,
+                  'correction_scope': 'cell_line',
+                  'test': 'ttest',
+                  'resume': False,
+                  'checkpoint': False,
+                  'cache': None,
+                  'workbook': False,
+                  'sparse': False,
+                  'dtype': 'float64',
+                  'cross_cell_lines': False,
+                  'cell_lines': None,
+                  'selections': {}}
+
+
+def find_workbooks(inputs: list) -> list:
+    """
+    This function expands the inputs into a sorted list of workbooks. An input can be a workbook, a directory (all its
+    '.xlsx' files are taken) or a glob pattern.
+
+    :param inputs: The input workbooks, directories or glob patterns.
+    :return: The list of the workbook paths.
+    """
+    workbooks = []
+    for item in inputs:
+        if os.path.isdir(item):
+            matches = glob.glob(os.path.join(item, '*.xlsx'))
+        else:
+            matches = glob.glob(item)
+        workbooks.extend(path for path in matches if not os.path.basename(path).startswith('~$'))
+    return sorted(set(os.path.abspath(path) for path in workbooks))
+
+
+def load_config(config_path: str = None, overrides: dict = None) -> dict:
+    """
+    This function builds the run config from the defaults, a JSON config file and the command-line overrides.
+
+    :param config_path: The path of the JSON config file. Default is None - only the defaults are used.
+    :param overrides: The values given on the command line. None values are ignored.
+    :return: The run config.
+    """
+    config = dict(DEFAULT_CONFIG)
+    if config_path is not None:
+        with open(config_path) as config_file:
+            config.update(json.load(config_file))
+    if overrides:
+        config.update({key: value for key, value in overrides.items() if value is not None})
+    return config
+
+
+def run_dataset(data_path: str, config: dict) -> dict:
+    """
+    This function runs the full headless pipeline on a single workbook. The cell lines and compounds are taken from
+    the config instead of the GUI.
+
+    :param data_path: The path of the workbook.
+    :param config: The run config.
+    :return: A dictionary with the status, the error (if any) and the duration of each stage.
+    """
+    result = {'dataset': data_path, 'status': 'ok', 'error': '', 'timings': {}}
+    start = time.perf_counter()
+    stage = 'get_LGE_data'
+    try:
+        l_df, g_df, err_limit_lambda = osp.get_LGE_data(data_path, dtype=config['dtype'])
+        result['timings'][stage] = time.perf_counter() - start
+
+        stage = 'important_L'
+        stage_start = time.perf_counter()
+        important_l = osp.important_L(l_df, err_limit_lambda, config['threshold'])
+        result['timings'][stage] = time.perf_counter() - stage_start
+
+        os.makedirs(config['save_path'], exist_ok=True)
+        workbook_context = contextlib.nullcontext()
+        if config['workbook']:
+            workbook_context = osp.open_workbook(data_path, config['save_path'])
+        with workbook_context as workbook:
+            stage = 'analyze_G'
+            stage_start = time.perf_counter()
+            osp.analyze_G(g_df, important_l, data_path, save_path=config['save_path'],
+                          edge_percents=config['edge_percents'], workbook=workbook)
+            result['timings'][stage] = time.perf_counter() - stage_start
+
+            stage = 'analyze_L'
+            stage_start = time.perf_counter()
+            cell_line_list = config['cell_lines']
+            if cell_line_list is None:
+                cell_line_list = important_l['cell_line_name'].unique().tolist()
+            osp.analyze_L_axes(important_l, err_limit_lambda, data_path, fixed_cols=tuple(config['fixed_cols']),
+                               p_value=config['p_value'], save_path=config['save_path'], cell_line_list=cell_line_list,
+                               selections=config['selections'], pair_schedule=config['pair_schedule'],
+                               correction=config['correction'], correction_scope=config['correction_scope'],
+                               test=config['test'], resume=config['resume'], cache_path=config['cache'],
+                               workbook=workbook, sparse=config['sparse'], checkpoint=config['checkpoint'],
+                               threshold=config['threshold'])
+            result['timings'][stage] = time.perf_counter() - stage_start
+
+            if config['cross_cell_lines']:
+                stage = 'cross_cell_lines'
+                stage_start = time.perf_counter()
+                for fixed_col in config['fixed_cols']:
+                    ct.analyze_cross_cell_lines(important_l, data_path, fixed_col=fixed_col, p_value=config['p_value'],
+                                                save_path=config['save_path'])
+                result['timings'][stage] = time.perf_counter() - stage_start
+    except Exception as ex:
+        result['status'] = 'failed'
+        result['error'] = f"{stage}: {type(ex).__name__}: {ex}"
+        traceback.print_exc()
+    result['timings']['total'] = time.perf_counter() - start
+    return result
+
+
+def run_batch(workbooks: list, config: dict) -> list:
+    """
+    This function schedules the workbooks across a pool of worker processes.
+
+    :param workbooks: The paths of the workbooks.
+    :param config: The run config. 'jobs' is the maximal number of workbooks processed concurrently.
+    :return: The results of 'run_dataset', in the order of the workbooks.
+    """
+    results = {}
+    jobs = max(1, min(int(config['jobs']), len(workbooks)))
+    if jobs == 1:
+        for data_path in workbooks:
+            results[data_path] = run_dataset(data_path, config)
+    else:
+        with ProcessPoolExecutor(max_workers=jobs) as executor:
+            futures = {executor.submit(run_dataset, data_path, config): data_path for data_path in workbooks}
+            for future in as_completed(futures):
+                data_path = futures[future]
+                try:
+                    results[data_path] = future.result()
+                except Exception as ex:
+                    results[data_path] = {'dataset': data_path, 'status': 'failed',
+                                          'error': f"worker: {type(ex).__name__}: {ex}", 'timings': {}}
+                print(f"Finished '{os.path.basename(data_path)}' ({results[data_path]['status']})")
+    return [results[data_path] for data_path in workbooks]
+
+
+def print_report(results: list):
+    """
+    This function prints the status and the stage timings of every workbook.
+
+    :param results: The results of 'run_batch'.
+    """
+    stages = ['get_LGE_data', 'important_L', 'analyze_G', 'analyze_L', 'cross_cell_lines', 'total']
+    name_width = max([len('dataset')] + [len(os.path.basename(result['dataset'])) for result in results])
+    stage_widths = [max(14, len(stage) + 2) for stage in stages]
+    print('\n' + 'dataset'.ljust(name_width) + '  status  ' +
+          ''.join(stage.rjust(width) for stage, width in zip(stages, stage_widths)))
+    for result in results:
+        timings = ''.join((f"{result['timings'][stage]:.2f}s" if stage in result['timings'] else '-').rjust(width)
+                          for stage, width in zip(stages, stage_widths))
+        print(os.path.basename(result['dataset']).ljust(name_width) + '  ' + result['status'].ljust(6) + '  ' + timings)
+        if result['error']:
+            print(' ' * (name_width + 2) + result['error'])
+
+
+def main(argv: list = None) -> int:
+    """
+    This function is the command-line entry point.
+
+    :param argv: The command-line arguments. Default is None - 'sys.argv' is used.
+    :return: The exit code: 0 if all the workbooks succeeded, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Analyze one or more 'L'/'G' workbooks without the GUI.")
+    parser.add_argument('inputs', nargs='+', help="Workbooks, directories of workbooks or glob patterns")
+    parser.add_argument('--config', help="JSON run config; command-line options override it")
+    parser.add_argument('--fixed-col', dest='fixed_cols', action='append', choices=['time', 'dosage'],
+                        help="Fixed column of the pairs, can be given twice (default: time)")
+    parser.add_argument('--p-value', dest='p_value', type=float, help="P-value threshold (default: 0.05)")
+    parser.add_argument('--threshold', type=int, help="'important_L' threshold (default: 2)")
+    parser.add_argument('--edge-percents', dest='edge_percents', type=float, help="G edge percents (default: 0.1)")
+    parser.add_argument('--save-path', dest='save_path', help="Output directory (default: current directory)")
+    parser.add_argument('--jobs', type=int, help="Number of workbooks processed concurrently (default: 1)")
+    parser.add_argument('--pair-schedule', dest='pair_schedule', choices=['all', 'adjacent', 'baseline'],
+                        help="Pairs of an inhibitor with itself across the fixed column (default: all)")
+    parser.add_argument('--correction', choices=['bh', 'bonferroni'],
+                        help="Multiple-testing correction of the p-values (default: none)")
+    parser.add_argument('--correction-scope', dest='correction_scope', choices=['cell_line', 'global'],
+                        help="Family of the correction (default: cell_line)")
+    parser.add_argument('--test', choices=['ttest', 'permutation'], help="Test of the pairs (default: ttest)")
+    parser.add_argument('--resume', action='store_const', const=True,
+                        help="Skip the units completed by a previous run with the same parameters")
+    parser.add_argument('--checkpoint', action='store_const', const=True,
+                        help="Keep a checkpoint journal in the output folder, so the run can be resumed")
+    parser.add_argument('--cache', help="Directory of a result cache reused between runs (default: none)")
+    parser.add_argument('--workbook', action='store_const', const=True,
+                        help="Also write all the result tables into a single '<dataset>_results.xlsx' workbook")
+    parser.add_argument('--sparse', action='store_const', const=True,
+                        help="Skip the tests of the processes that are within the error limit in both groups of a pair")
+    parser.add_argument('--dtype', choices=['float64', 'float32'],
+                        help="Storage dtype of the process values; float32 halves their memory (default: float64)")
+    parser.add_argument('--cross-cell-lines', dest='cross_cell_lines', action='store_const', const=True,
+                        help="Also contrast every compound with the controls across all the cell lines")
+    args = parser.parse_args(argv)
+
+    config = load_config(args.config, {'fixed_cols': args.fixed_cols, 'p_value': args.p_value,
+                                       'threshold': args.threshold, 'edge_percents': args.edge_percents,
+                                       'save_path': args.save_path, 'jobs': args.jobs,
+                                       'pair_schedule': args.pair_schedule, 'correction': args.correction,
+                                       'correction_scope': args.correction_scope, 'test': args.test,
+                                       'resume': args.resume, 'checkpoint': args.checkpoint,
+                                       'cache': args.cache,
+                                       'workbook': args.workbook, 'sparse': args.sparse,
+                                       'dtype': args.dtype, 'cross_cell_lines': args.cross_cell_lines})
+    workbooks = find_workbooks(args.inputs)
+    if not workbooks:
+        print("No workbooks found")
+        return 1
+
+    print(f"Analyzing {len(workbooks)} workbook(s) with {config['jobs']} job(s)..")
+    results = run_batch(workbooks, config)
+    print_report(results)
+    return 0 if all(result['status'] == 'ok' for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -1,9 +1,11 @@
-from PyQt5.QtCore import Qt
+from PyQt5.QtCore import Qt, pyqtSignal
 from PyQt5.QtGui import QFont
 from PyQt5.QtWidgets import QWidget, QListWidget, QPushButton, QHBoxLayout, QVBoxLayout, QMessageBox
 
 
 class AssignValuesWindow(QWidget):
+    closed = pyqtSignal()
+
     def __init__(self, control_list: list, inhibitor_list: list, cell_name: str):
         """
         This method initializes an instance of the AssignValuesWindow class.
@@ -237,3 +239,5 @@ class AssignValuesWindow(QWidget):
             else:
                 # User cancelled exit, ignore the close event
                 event.ignore()
+        if event.isAccepted():
+            self.closed.emit()
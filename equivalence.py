@@ -0,0 +1,284 @@
+import os
+import sys
+import glob
+import time
+import argparse
+import tempfile
+import numpy as np
+import pandas as pd
+import matplotlib
+
+matplotlib.use('Agg')
+
+import oncosensepy as osp  # noqa: E402
+import helpfunctions as hf  # noqa: E402
+import UIFunctions as UIf  # noqa: E402
+import cli  # noqa: E402
+
+FIXED_COL_SUFFIXES = {'_by_time.csv': 'time', '_by_dosage.csv': 'dosage'}
+BLOCK_END = '-'
+DEFAULT_TOLERANCES = {'float64': (1e-9, 1e-12), 'float32': (1e-5, 1e-8)}
+
+
+def find_golden_datasets(data_dir: str, golden_dir: str, datasets: list = None) -> list:
+    """
+    This function pairs the workbooks of the data folder with their shipped reference outputs. A workbook has reference
+    outputs if the golden folder holds a folder named as its output folder.
+
+    :param data_dir: The folder of the input workbooks.
+    :param golden_dir: The folder that holds the reference output folders.
+    :param datasets: The names of the datasets to check. Default is None - all the datasets with reference outputs.
+    :return: A list of (workbook path, reference output folder) tuples.
+    """
+    pairs = []
+    for data_path in cli.find_workbooks([data_dir]):
+        folder_name = UIf.get_folder_name(data_path)
+        golden_path = os.path.join(golden_dir, folder_name)
+        if datasets is not None and folder_name not in datasets:
+            continue
+        if os.path.isdir(golden_path):
+            pairs.append((data_path, golden_path))
+    return pairs
+
+
+def read_pair_blocks(csv_path: str) -> list:
+    """
+    This function reads the compounds of every pair of a reference '<cell_line>_by_<fixed_col>.csv' file. A pair is
+    exported as the rows of its first group, then the rows of its second group, and ends with a '-' row.
+
+    :param csv_path: The path of the reference file.
+    :return: A list with the compound names of every pair, in the order they appear.
+    """
+    df = pd.read_csv(csv_path, index_col=0, dtype=str, keep_default_na=False)
+    blocks, compounds = [], []
+    for label, compound in zip(df.index, df['compound_name']):
+        if label == BLOCK_END:
+            blocks.append(compounds)
+            compounds = []
+        elif compound and compound not in compounds:
+            compounds.append(compound)
+    return blocks
+
+
+def infer_selection(cell_df: pd.DataFrame, csv_path: str) -> tuple:
+    """
+    This function infers the control and inhibitor lists that produced a reference file. In a pair of two compounds
+    the first one is a control, and the controls and the inhibitors are ordered as they first appear, which is the
+    order the pairs were built in. Compounds of the cell line that are not in any reported pair are split as in
+    'hf.get_default_compound_lists' and added at the end, since they do not change the reported pairs.
+
+    :param cell_df: The input dataframe of the cell line.
+    :param csv_path: The path of the reference '<cell_line>_by_<fixed_col>.csv' file.
+    :return: A tuple containing the control list and the inhibitor list.
+    """
+    control_list, inhibitor_list = [], []
+    for compounds in read_pair_blocks(csv_path):
+        if len(compounds) == 2 and compounds[0] not in control_list:
+            control_list.append(compounds[0])
+        for compound in compounds[-1:] if len(compounds) == 2 else compounds:
+            if compound not in inhibitor_list and compound not in control_list:
+                inhibitor_list.append(compound)
+    default_controls, default_inhibitors = hf.get_default_compound_lists(cell_df)
+    control_list += [name for name in default_controls if name not in control_list + inhibitor_list]
+    inhibitor_list += [name for name in default_inhibitors if name not in control_list + inhibitor_list]
+    return control_list, inhibitor_list
+
+
+def infer_run(important_l: pd.DataFrame, golden_path: str) -> tuple:
+    """
+    This function infers the cell lines, the compound selections and the fixed columns of a reference output folder.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param golden_path: The reference output folder of the dataset.
+    :return: A tuple containing the cell line list, the selections dictionary and the fixed columns.
+    """
+    cell_line_list, selections, fixed_cols = [], {}, []
+    cell_lines = important_l['cell_line_name'].unique().tolist()
+    for cell_line in cell_lines:
+        for suffix, fixed_col in FIXED_COL_SUFFIXES.items():
+            csv_path = os.path.join(golden_path, cell_line, cell_line + suffix)
+            if not os.path.isfile(csv_path):
+                continue
+            if fixed_col not in fixed_cols:
+                fixed_cols.append(fixed_col)
+            if cell_line not in selections:
+                cell_line_list.append(cell_line)
+                cell_df = important_l[important_l['cell_line_name'] == cell_line]
+                selections[cell_line] = infer_selection(cell_df, csv_path)
+    return cell_line_list, selections, fixed_cols
+
+
+def compare_tables(golden_csv: str, output_csv: str, rtol: float, atol: float) -> dict:
+    """
+    This function compares two CSV files cell by cell. Cells that are equal as text match, and numeric cells match if
+    they are equal within the tolerances, as in 'np.isclose'.
+
+    :param golden_csv: The path of the reference file.
+    :param output_csv: The path of the new file.
+    :param rtol: The relative tolerance.
+    :param atol: The absolute tolerance.
+    :return: A dictionary with the status ('ok', 'differ' or 'missing'), the number of differing cells, the largest
+             numeric difference and a description of the first difference.
+    """
+    result = {'status': 'ok', 'cells': 0, 'max_diff': 0.0, 'first': ''}
+    if not os.path.isfile(output_csv):
+        result['status'] = 'missing'
+        return result
+    golden = pd.read_csv(golden_csv, header=None, dtype=str, keep_default_na=False).to_numpy()
+    output = pd.read_csv(output_csv, header=None, dtype=str, keep_default_na=False).to_numpy()
+    if golden.shape != output.shape:
+        result.update(status='differ', cells=max(golden.size, output.size),
+                      first=f"shape {output.shape} instead of {golden.shape}")
+        return result
+
+    rows, cols = np.nonzero(golden != output)
+    for row, col in zip(rows, cols):
+        try:
+            expected, actual = float(golden[row, col]), float(output[row, col])
+        except ValueError:
+            expected = actual = None
+        if expected is not None and (np.isclose(actual, expected, rtol=rtol, atol=atol)
+                                     or (np.isnan(expected) and np.isnan(actual))):
+            continue
+        if expected is not None and not (np.isnan(expected) or np.isnan(actual)):
+            result['max_diff'] = max(result['max_diff'], abs(actual - expected))
+        if not result['cells']:
+            result['first'] = f"row {row}, column {col}: '{output[row, col]}' instead of '{golden[row, col]}'"
+        result['cells'] += 1
+    if result['cells']:
+        result['status'] = 'differ'
+    return result
+
+
+def compare_outputs(golden_path: str, output_path: str, rtol: float, atol: float) -> list:
+    """
+    This function compares every CSV file of a reference output folder with the same file of a new output folder.
+    Files that exist only in the new folder are not compared.
+
+    :param golden_path: The reference output folder of the dataset.
+    :param output_path: The new output folder of the dataset.
+    :param rtol: The relative tolerance.
+    :param atol: The absolute tolerance.
+    :return: A list with the result of 'compare_tables' of every file, with its relative path under 'file'.
+    """
+    results = []
+    for golden_csv in sorted(glob.glob(os.path.join(golden_path, '**', '*.csv'), recursive=True)):
+        relative_path = os.path.relpath(golden_csv, golden_path)
+        result = compare_tables(golden_csv, os.path.join(output_path, relative_path), rtol, atol)
+        result['file'] = relative_path
+        results.append(result)
+    return results
+
+
+def run_equivalence(data_path: str, golden_path: str, save_path: str, rtol: float, atol: float,
+                    dtype: str = 'float64', sparse: bool = False, threshold: int = 2, p_value: float = 0.05,
+                    edge_percents: float = 0.1) -> dict:
+    """
+    This function reruns the headless pipeline on a workbook with the selections implied by its reference outputs,
+    compares the new tables with the reference tables and times every stage.
+
+    :param data_path: The path of the workbook.
+    :param golden_path: The reference output folder of the dataset.
+    :param save_path: The path where the new outputs are saved.
+    :param rtol: The relative tolerance.
+    :param atol: The absolute tolerance.
+    :param dtype: The storage type of the process values, see 'get_LGE_data'. Default is 'float64'.
+    :param sparse: Whether to skip the tests of quiet processes, see 'analyze_L'. Default is False.
+    :param threshold: The number of significant values of an important process. Default is 2.
+    :param p_value: The p-value threshold. Default is 0.05.
+    :param edge_percents: The percentage of the edges of 'G'. Default is 0.1.
+    :return: A dictionary in the form of the results of 'cli.run_dataset', with the file comparisons under 'files'.
+    """
+    result = {'dataset': data_path, 'status': 'ok', 'error': '', 'timings': {}, 'files': []}
+    start = time.perf_counter()
+
+    l_df, g_df, err_limit_lambda = osp.get_LGE_data(data_path, dtype=dtype)
+    result['timings']['get_LGE_data'] = time.perf_counter() - start
+
+    stage_start = time.perf_counter()
+    important_l = osp.important_L(l_df, err_limit_lambda, threshold)
+    result['timings']['important_L'] = time.perf_counter() - stage_start
+
+    cell_line_list, selections, fixed_cols = infer_run(important_l, golden_path)
+
+    stage_start = time.perf_counter()
+    osp.analyze_G(g_df, important_l, data_path, save_path=save_path, edge_percents=edge_percents)
+    result['timings']['analyze_G'] = time.perf_counter() - stage_start
+
+    stage_start = time.perf_counter()
+    if cell_line_list:
+        osp.analyze_L_axes(important_l, err_limit_lambda, data_path, fixed_cols=tuple(fixed_cols), p_value=p_value,
+                           save_path=save_path, cell_line_list=cell_line_list, selections=selections, sparse=sparse)
+    result['timings']['analyze_L'] = time.perf_counter() - stage_start
+    result['timings']['total'] = time.perf_counter() - start
+
+    output_path = os.path.join(save_path, UIf.get_folder_name(data_path))
+    result['files'] = compare_outputs(golden_path, output_path, rtol, atol)
+    failed = [file for file in result['files'] if file['status'] != 'ok']
+    if failed:
+        result['status'] = 'differ'
+        result['error'] = f"{len(failed)} of {len(result['files'])} tables differ"
+    return result
+
+
+def print_differences(results: list):
+    """
+    This function prints the tables that differ from the reference tables.
+
+    :param results: The results of 'run_equivalence'.
+    """
+    for result in results:
+        for file in result['files']:
+            if file['status'] == 'missing':
+                print(f"{UIf.get_folder_name(result['dataset'])}/{file['file']}: missing")
+            elif file['status'] == 'differ':
+                print(f"{UIf.get_folder_name(result['dataset'])}/{file['file']}: {file['cells']} cells differ "
+                      f"(max difference {file['max_diff']:.3g}), first at {file['first']}")
+
+
+def main(argv: list = None) -> int:
+    """
+    This function is the command-line entry point.
+
+    :param argv: The command-line arguments. Default is None - 'sys.argv' is used.
+    :return: The exit code: 0 if all the tables match the reference tables, 1 otherwise.
+    """
+    parser = argparse.ArgumentParser(description="Rerun the pipeline on the workbooks that have reference outputs and "
+                                                 "compare the new tables with them.")
+    parser.add_argument('--data-dir', default='Data', help="The folder of the input workbooks.")
+    parser.add_argument('--golden-dir', default=os.path.dirname(os.path.abspath(__file__)),
+                        help="The folder that holds the reference output folders, e.g. 'supp_data_4'.")
+    parser.add_argument('--datasets', nargs='+', help="The datasets to check. Default is all of them.")
+    parser.add_argument('--save-path', help="The folder of the new outputs. Default is a temporary folder.")
+    parser.add_argument('--rtol', type=float, help="The relative tolerance. Default depends on --dtype.")
+    parser.add_argument('--atol', type=float, help="The absolute tolerance. Default depends on --dtype.")
+    parser.add_argument('--dtype', choices=hf.PROCESS_DTYPES, default='float64',
+                        help="The storage type of the process values.")
+    parser.add_argument('--sparse', action='store_true', help="Skip the tests of the quiet processes.")
+    args = parser.parse_args(argv)
+
+    rtol = DEFAULT_TOLERANCES[args.dtype][0] if args.rtol is None else args.rtol
+    atol = DEFAULT_TOLERANCES[args.dtype][1] if args.atol is None else args.atol
+    pairs = find_golden_datasets(args.data_dir, args.golden_dir, args.datasets)
+    if not pairs:
+        print(f"No workbook in '{args.data_dir}' has reference outputs in '{args.golden_dir}'")
+        return 1
+    save_path = args.save_path or tempfile.mkdtemp(prefix='equivalence_')
+    os.makedirs(save_path, exist_ok=True)
+    print(f"Saving the new outputs in '{save_path}'")
+
+    results = []
+    for data_path, golden_path in pairs:
+        print(f"Checking '{os.path.basename(data_path)}' against '{golden_path}'")
+        results.append(run_equivalence(data_path, golden_path, save_path, rtol, atol, args.dtype, args.sparse))
+
+    cli.print_report(results)
+    print_differences(results)
+    n_files = sum(len(result['files']) for result in results)
+    n_failed = sum(file['status'] != 'ok' for result in results for file in result['files'])
+    print(f"\n{n_files - n_failed} of {n_files} tables match (rtol={rtol:g}, atol={atol:g})")
+    return 1 if n_failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,89 @@
+import numpy as np
+import pandas as pd
+import exceptions as e
+import validation as valid
+import helpfunctions as hf
+
+REPLICATE_COLUMNS = ['cell_line_name', 'compound_name', '2D_3D', 'dosage', 'time']
+
+
+def get_replicate_residuals(l_df: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function returns the deviation of every sample from the mean of its replicates (the samples with the same
+    cell line, compound, 2D_3D, dosage and time). The deviations are scaled by sqrt(n / (n - 1)) so that they estimate
+    the noise of a single sample; samples without replicates are dropped.
+
+    :param l_df: The 'L' DataFrame.
+    :return: A DataFrame of residuals with a column per process.
+    """
+    valid.is_valid_L(l_df)
+    analysis_cols = hf.get_analysis_columns(l_df)
+    groups = l_df.groupby(REPLICATE_COLUMNS, sort=False)
+    sizes = groups['barcode'].transform('size').to_numpy()
+    residuals = l_df[analysis_cols] - groups[analysis_cols].transform('mean')
+    replicated = sizes > 1
+    scale = np.sqrt(sizes[replicated] / (sizes[replicated] - 1))
+    return residuals.loc[replicated].mul(scale, axis=0)
+
+
+def bootstrap_quantile(residuals: np.ndarray, n_resamples: int, quantile: float, seed: int,
+                       max_elements: int) -> np.ndarray:
+    """
+    This function estimates the quantile of the absolute noise of every column by bootstrap. The resamples are drawn
+    as one index array per chunk and evaluated for all the columns at once; a chunk holds at most 'max_elements'
+    resampled values. If a single resample of all the columns does not fit, the columns are evaluated in blocks with
+    the same index array.
+
+    :param residuals: The residual matrix, a row per sample and a column per process.
+    :param n_resamples: The number of bootstrap resamples.
+    :param quantile: The quantile of the absolute residuals.
+    :param seed: The seed of the random generator.
+    :param max_elements: The maximal number of resampled values held in memory at once.
+    :return: The bootstrap mean of the quantile, per column.
+    :raises InvalidDataSetException: If a single resample of one column does not fit in 'max_elements'.
+    """
+    rng = np.random.default_rng(seed)
+    abs_residuals = np.abs(residuals)
+    n_samples, n_cols = abs_residuals.shape
+    if n_samples > max_elements:
+        raise e.InvalidDataSetException(f"A resample of {n_samples} values does not fit in {max_elements} elements")
+    chunk_size = max(1, max_elements // (n_samples * n_cols))
+    col_chunk = min(n_cols, max_elements // (chunk_size * n_samples))
+
+    total = np.zeros(n_cols)
+    done = 0
+    while done < n_resamples:
+        size = min(chunk_size, n_resamples - done)
+        idx = rng.integers(0, n_samples, size=(size, n_samples))
+        for start in range(0, n_cols, col_chunk):
+            cols = slice(start, start + col_chunk)
+            total[cols] += np.quantile(abs_residuals[idx, cols], quantile, axis=1).sum(axis=0)
+        done += size
+    return total / n_resamples
+
+
+def bootstrap_error_limit(l_df: pd.DataFrame, n_resamples: int = 1000, quantile: float = 0.95, seed: int = 0,
+                          per_process: bool = False, max_elements: int = 2 ** 24):
+    """
+    This function estimates the error limit lambda by bootstrapping the replicate noise of 'L'. The limit is the
+    bootstrap estimate of the given quantile of the absolute noise of a single sample.
+
+    :param l_df: The 'L' DataFrame.
+    :param n_resamples: The number of bootstrap resamples. Default is 1000.
+    :param quantile: The quantile of the absolute noise. Default is 0.95.
+    :param seed: The seed of the random generator, for reproducible limits. Default is 0.
+    :param per_process: If True, returns a limit per process instead of a single limit. Default is False.
+    :param max_elements: The maximal number of resampled values held in memory at once. Default is 2 ** 24.
+    :return: The error limit lambda, or a Series of error limits indexed by process if 'per_process' is True.
+    """
+    if n_resamples <= 0:
+        raise e.NegativeNumberException("The number of resamples should be positive number")
+    residuals = get_replicate_residuals(l_df)
+    if residuals.empty:
+        raise e.InvalidDataSetException("There are no replicates to estimate the noise from")
+
+    if per_process:
+        limits = bootstrap_quantile(residuals.to_numpy(dtype=float), n_resamples, quantile, seed, max_elements)
+        return pd.Series(limits, index=residuals.columns)
+    pooled = residuals.to_numpy(dtype=float).reshape(-1, 1)
+    return float(bootstrap_quantile(pooled, n_resamples, quantile, seed, max_elements)[0])
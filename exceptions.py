@@ -31,3 +31,13 @@ class InvalidCellLineException(Exception):
 class InvalidUIDException(Exception):
     def __init__(self, message):
         super().__init__(message)
+
+
+class InvalidCompoundException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
+
+
+class AnalysisCancelledException(Exception):
+    def __init__(self, message):
+        super().__init__(message)
@@ -1,38 +1,97 @@
 import itertools
 import numpy as np
 import pandas as pd
-from scipy.stats import ttest_ind
+import exceptions as e
+import permutation as perm
+from scipy.stats import ttest_ind, ttest_ind_from_stats
 
 
-def find_edges(list_names_g: list[float], list_values_g: list[str], edge_percents: float):
+def get_edge_count(num_elements: int, edge_percents: float) -> int:
     """
-    The function finds the start and end edges of a graph represented as a DataFrame.
+    This function returns the number of proteins in each edge, as in 'find_edges'.
 
-    :param list_names_g: The list of the names of the proteins
-    :param list_values_g: The list of the values
-    :param edge_percents: The percents for the edges
-    :return: Tuple[List[str], List[float], List[str], List[float]]: A tuple containing the start and end edges of the graph and their values.
+    :param num_elements: The number of proteins.
+    :param edge_percents: The percents for the edges, a fraction or a percentage above 1.
+    :return: The number of proteins in each edge.
     """
-    if len(list_values_g) == 0:
-        return [], []
     if edge_percents <= 0:
         edge_percents = 0
     elif edge_percents >= 100:
         edge_percents = 1
     elif 1 < edge_percents < 100:
         edge_percents /= 100
+    return int(edge_percents * num_elements)
+
+
+def find_edges(list_names_g: list[float], list_values_g: list[str], edge_percents: float):
+    """
+    The function finds the start and end edges of a graph represented as a DataFrame. If the edge percents of the
+    proteins round down to no protein, both edges are empty.
+
+    :param list_names_g: The list of the names of the proteins
+    :param list_values_g: The list of the values
+    :param edge_percents: The percents for the edges
+    :return: Tuple[List[str], List[float], List[str], List[float]]: A tuple containing the start and end edges of the graph and their values.
+    """
+    if len(list_values_g) == 0:
+        return [], [], [], []
     num_elements = len(list_names_g)
-    num_edges = int(edge_percents * num_elements)
+    num_edges = get_edge_count(num_elements, edge_percents)
 
     lower_edges = list_names_g[:num_edges]
-    upper_edges = list_names_g[-num_edges:]
+    upper_edges = list_names_g[num_elements - num_edges:]
     lower_values = list_values_g[:num_edges]
-    upper_values = list_values_g[-num_edges:]
+    upper_values = list_values_g[num_elements - num_edges:]
 
     return lower_edges, lower_values, upper_edges, upper_values
 
 
-def add_reason(sign_changed: bool, Emerging_process: bool, Disappearing_process: bool, p: float, p_value: float) -> str:
+POPCOUNT_TABLE = np.array([bin(byte).count('1') for byte in range(256)], dtype=np.uint8)
+
+
+def pack_edge_sets(edge_positions: list, n_proteins: int) -> np.ndarray:
+    """
+    This function encodes edge sets as bitsets over the protein positions.
+
+    :param edge_positions: A list of edge sets, each one a list of protein positions.
+    :param n_proteins: The number of proteins.
+    :return: A uint8 array with a packed row of ceil(n_proteins / 8) bytes per edge set.
+    """
+    members = np.zeros((len(edge_positions), n_proteins), dtype=bool)
+    for i, positions in enumerate(edge_positions):
+        members[i, positions] = True
+    return np.packbits(members, axis=1)
+
+
+def count_bits(packed: np.ndarray) -> np.ndarray:
+    """
+    This function counts the set bits of every row of a packed bitset array.
+
+    :param packed: A uint8 array of packed bitsets, a row per set.
+    :return: The number of set bits of every row.
+    """
+    return POPCOUNT_TABLE[packed].sum(axis=-1, dtype=np.int64)
+
+
+def get_edge_overlap(packed: np.ndarray):
+    """
+    This function computes the pairwise overlap of packed edge sets with popcounts of their bitwise intersections.
+
+    :param packed: A uint8 array of packed bitsets, a row per set, as returned by 'pack_edge_sets'.
+    :return: A tuple (intersections, jaccard) of (sets x sets) arrays with the size of every intersection and the
+             Jaccard index of every pair of sets (NaN for two empty sets).
+    """
+    sizes = count_bits(packed)
+    intersections = np.empty((len(packed), len(packed)), dtype=np.int64)
+    for i in range(len(packed)):
+        intersections[i] = count_bits(packed[i] & packed)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        jaccard = intersections / (sizes[:, None] + sizes[None, :] - intersections)
+    return intersections, jaccard
+
+
+def add_reason(sign_changed: bool, Emerging_process: bool, Disappearing_process: bool, p: float, p_value: float,
+               label: str = 'P-Value') -> str:
     """
     Adds a reason row to a Pandas DataFrame indicating the result of the analysis.
 
@@ -41,10 +100,11 @@ def add_reason(sign_changed: bool, Emerging_process: bool, Disappearing_process:
     :param Disappearing_process: A flag indicating there is only one of the same type and ***.
     :param p: The p-value calculated for the statistical test.
     :param p_value: The p-value threshold for determining significance.
+    :param label: The name of the significance test in the reason. Default is 'P-Value'.
     :return: the reason for the change.
     """
     if sign_changed and (p <= p_value):
-        return "P-Value and Sign change"
+        return f"{label} and Sign change"
 
     elif sign_changed:
         return "Sign change"
@@ -56,7 +116,7 @@ def add_reason(sign_changed: bool, Emerging_process: bool, Disappearing_process:
         return "Disappearing process"
 
     elif p <= p_value:
-        return "P-Value"
+        return label
 
 
 def create_pairs_df(pairs_dict: dict) -> pd.DataFrame:
@@ -76,8 +136,28 @@ def create_pairs_df(pairs_dict: dict) -> pd.DataFrame:
     return pairs_df
 
 
+def schedule_pairs(values: list, schedule: str = 'all', sort_key=None) -> list:
+    """
+    This function returns the pairs of fixed column values to compare for the same compound.
+
+    :param values: The fixed column values of the compound, in the order of the data.
+    :param schedule: 'all' for all the pairs (quadratic in the number of values), 'adjacent' for consecutive values
+                     only, or 'baseline' for the first value against each of the others. Default is 'all'.
+    :param sort_key: The function that orders the values for the 'adjacent' and 'baseline' schedules.
+    :return: A list of (first, second) pairs.
+    """
+    if schedule == 'all':
+        return list(itertools.combinations(values, 2))
+    sorted_values = sorted(values, key=sort_key)
+    if schedule == 'adjacent':
+        return list(zip(sorted_values[:-1], sorted_values[1:]))
+    if schedule == 'baseline':
+        return [(sorted_values[0], value) for value in sorted_values[1:]]
+    raise ValueError(f"Unknown schedule '{schedule}', should be 'all', 'adjacent' or 'baseline'")
+
+
 def pairs_df_to_dict(cell_df: pd.DataFrame, cell_name: str, control_list: list, inhibitor_list: list,
-                     fixed_col: str):
+                     fixed_col: str, schedule: str = 'all', sort_key=None):
     """
     This function convert a Pandas dataframe to a dictionary of pairs of dataframes.
 
@@ -86,6 +166,8 @@ def pairs_df_to_dict(cell_df: pd.DataFrame, cell_name: str, control_list: list,
     :param control_list: The control compound list.
     :param inhibitor_list: The inhibitor compound list.
     :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+    :param schedule: The schedule of the pairs of inhibitor_list with itself, see 'schedule_pairs'. Default is 'all'.
+    :param sort_key: The function that orders the fixed_col values for the schedule.
     :return: A dictionary where each key is a tuple representing a pair of compounds, along with optional time points.
              The corresponding value is a Pandas dataframe containing data for that pair.
              The keys are generated by combining cell_name, compound names and time points.
@@ -110,7 +192,7 @@ def pairs_df_to_dict(cell_df: pd.DataFrame, cell_name: str, control_list: list,
     # Pairs of inhibitor_list with itself with different fixed_col
     for i in inhibitor_list:
         unique_fixed_col_i = pairs_df.loc[pairs_df['compound_name'] == i, fixed_col].unique()
-        for t1, t2 in itertools.combinations(unique_fixed_col_i, 2):
+        for t1, t2 in schedule_pairs(list(unique_fixed_col_i), schedule, sort_key):
             df_i_t1 = pairs_df.loc[(pairs_df['compound_name'] == i) & (pairs_df[fixed_col] == t1)]
             df_i_t2 = pairs_df.loc[(pairs_df['compound_name'] == i) & (pairs_df[fixed_col] == t2)]
             if not (df_i_t1.empty and df_i_t2.empty):
@@ -119,6 +201,21 @@ def pairs_df_to_dict(cell_df: pd.DataFrame, cell_name: str, control_list: list,
     return pairs_dict
 
 
+def get_default_compound_lists(cell_df: pd.DataFrame):
+    """
+    This function splits the compounds of a cell line into the default control and inhibitor lists.
+
+    :param cell_df: The input dataframe of the cell line.
+    :return: A tuple containing the control list and the inhibitor list, in the order of the data.
+    """
+    control_types = ['CONTROL', 'DMSO', 'PBS']
+    compound_name = cell_df['compound_name'].unique()
+
+    control_list = [name for name in compound_name if name in control_types]
+    inhibitor_list = [name for name in compound_name if name not in control_types]
+    return control_list, inhibitor_list
+
+
 def conTreat_df_to_dict(cell_df: pd.DataFrame, cell_name: str, fixed_col: str = 'time'):
     """
     This function convert a dataframe to a dictionary of pairs of dataframes (control vs treatment).
@@ -131,11 +228,7 @@ def conTreat_df_to_dict(cell_df: pd.DataFrame, cell_name: str, fixed_col: str =
              The keys are generated by combining cell_name, compound names, and time points.
              The keys represent pairs of the entire control_list and the entire inhibitor_list with the same fixed_col.
     """
-    control_types = ['CONTROL', 'DMSO', 'PBS']
-    compound_name = cell_df['compound_name'].unique()
-
-    control_list = list(set(compound_name) & set(control_types))
-    inhibitor_list = list(set(compound_name) - set(control_list))
+    control_list, inhibitor_list = get_default_compound_lists(cell_df)
 
     # Filter the dataframe to only include rows with compound names in the control_list and inhibitor_list
     pairs_df = cell_df.loc[cell_df['compound_name'].isin(control_list + inhibitor_list)]
@@ -154,7 +247,7 @@ def conTreat_df_to_dict(cell_df: pd.DataFrame, cell_name: str, fixed_col: str =
 
 
 def df_to_dict(cell_df: pd.DataFrame, cell_line: str, control_list: list, inhibitor_list: list,
-               control_treatment: bool, fixed_col: str):
+               control_treatment: bool, fixed_col: str, schedule: str = 'all', sort_key=None):
     """
     This function convert a dataframe to a dictionary.
 
@@ -164,6 +257,8 @@ def df_to_dict(cell_df: pd.DataFrame, cell_line: str, control_list: list, inhibi
     :param inhibitor_list: The inhibitor compound list.
     :param control_treatment: Flag indicating whether control treatment is applied.
     :param fixed_col: The name of the fixed column.
+    :param schedule: The schedule of the pairs of inhibitor_list with itself, see 'schedule_pairs'. Default is 'all'.
+    :param sort_key: The function that orders the fixed_col values for the schedule.
     :return: A tuple containing three elements:
              pairs_dict - A dictionary where each key represents a pair of compounds, along with optional time points,
              and the corresponding value is a Pandas dataframe containing data for that pair.
@@ -173,7 +268,8 @@ def df_to_dict(cell_df: pd.DataFrame, cell_line: str, control_list: list, inhibi
     if control_treatment:
         pairs_dict, control_list, inhibitor_list = conTreat_df_to_dict(cell_df, cell_line, fixed_col=fixed_col)
     else:
-        pairs_dict = pairs_df_to_dict(cell_df, cell_line, control_list, inhibitor_list, fixed_col=fixed_col)
+        pairs_dict = pairs_df_to_dict(cell_df, cell_line, control_list, inhibitor_list, fixed_col=fixed_col,
+                                      schedule=schedule, sort_key=sort_key)
 
     return pairs_dict, control_list, inhibitor_list
 
@@ -191,6 +287,64 @@ def get_analysis_columns(sub_df: pd.DataFrame):
     return analysis_cols
 
 
+PROCESS_DTYPES = ('float64', 'float32')
+
+
+def get_process_dtypes(processes: list, dtype: str = 'float64') -> dict:
+    """
+    This function maps the process columns to the given floating-point dtype, e.g. for the 'dtype' of 'pd.read_excel'.
+
+    :param processes: The process columns.
+    :param dtype: 'float64' or 'float32'. Default is 'float64'.
+    :return: A dictionary of process column to dtype.
+    """
+    if str(dtype) not in PROCESS_DTYPES:
+        raise ValueError(f"Unknown dtype '{dtype}', should be one of {list(PROCESS_DTYPES)}")
+    return {process: dtype for process in processes}
+
+
+def get_error_limits(err_limit_lambda: float, processes):
+    """
+    This function aligns the error limit lambda with a list of processes.
+
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+    :param processes: The processes to align to.
+    :return: The error limit lambda if it is a single value, otherwise an array of the error limits of the processes.
+    """
+    if not isinstance(err_limit_lambda, pd.Series):
+        return err_limit_lambda
+    missing = pd.Index(processes).difference(err_limit_lambda.index)
+    if len(missing) > 0:
+        raise e.InvalidColumnsException(f"There is no error limit for the processes {list(missing)}")
+    return err_limit_lambda.reindex(processes).to_numpy()
+
+
+def get_comparison_masks(sub_df: pd.DataFrame, key: tuple, cl: list, il: list, control_treatment: bool,
+                         fixed_col: str):
+    """
+    This function retrieves the row masks of the two conditions compared for a given key.
+
+    :param sub_df: The subset of the DataFrame.
+    :param key: The key representing the compounds and time points to compare.
+    :param cl: The control_list.
+    :param il: The inhibitor_list.
+    :param control_treatment: Flag indicating whether to perform a comparison between CONTROL and TREATMENT as a single unit.
+    :param fixed_col: The name of the fixed column.
+    :return: A tuple containing two boolean Series selecting the rows of the first and second conditions.
+    """
+    if control_treatment:
+        first_mask = (sub_df['compound_name'].isin(cl)) & (sub_df[fixed_col] == key[3])
+        second_mask = (sub_df['compound_name'].isin(il)) & (sub_df[fixed_col] == key[3])
+    else:
+        if key[1] == key[2]:
+            first_mask = sub_df[fixed_col] == key[3]
+            second_mask = sub_df[fixed_col] == key[4]
+        else:
+            first_mask = sub_df['compound_name'] == key[1]
+            second_mask = sub_df['compound_name'] == key[2]
+    return first_mask, second_mask
+
+
 def get_comparison_data(sub_df: pd.DataFrame, key: tuple, process: str, cl: list, il: list, control_treatment: bool,
                         fixed_col: str):
     """
@@ -205,17 +359,346 @@ def get_comparison_data(sub_df: pd.DataFrame, key: tuple, process: str, cl: list
     :param fixed_col: The name of the fixed column.
     :return: A tuple containing two DataFrames representing the data for the first and second conditions.
     """
+    first_mask, second_mask = get_comparison_masks(sub_df, key, cl, il, control_treatment, fixed_col)
+    df_first = sub_df.loc[first_mask, process]
+    df_second = sub_df.loc[second_mask, process]
+    return df_first, df_second
+
+
+def compute_pair_statistics(sub_df: pd.DataFrame, key: tuple, analysis_cols: list, cl: list, il: list,
+                            control_treatment: bool, fixed_col: str, test: str = 'ttest',
+                            test_cols: list = None) -> pd.DataFrame:
+    """
+    This function computes the raw statistics of a pair for all the processes at once: the sample counts and means of
+    both conditions and the p-value of the test. The t-test p-value is NaN when one of the conditions has a single
+    sample, while the permutation test also runs on single samples.
+
+    :param sub_df: The DataFrame of the pair.
+    :param key: The key representing the compounds and time points to compare.
+    :param analysis_cols: The processes to compute the statistics for.
+    :param cl: The control_list.
+    :param il: The inhibitor_list.
+    :param control_treatment: Flag indicating whether to perform a comparison between CONTROL and TREATMENT as a single unit.
+    :param fixed_col: The name of the fixed column.
+    :param test: 'ttest' for Student's t-test or 'permutation' for the permutation test of 'perm.permutation_test'.
+                 Default is 'ttest'.
+    :param test_cols: The processes that are tested, e.g. the active ones of 'sl.SparseL.get_active_processes'. If
+                      the pair can be tested (see 'is_testable'), the other processes get a p-value of 1, so they still
+                      count in a multiple-testing family; otherwise all the p-values are NaN, as without 'test_cols'.
+                      Default is None - all the processes are tested.
+    :return: A DataFrame indexed by process with the columns 'n_first', 'n_second', 'mean_first', 'mean_second' and 'p'.
+    """
+    first_mask, second_mask = get_comparison_masks(sub_df, key, cl, il, control_treatment, fixed_col)
+    df_first = sub_df.loc[first_mask, analysis_cols]
+    df_second = sub_df.loc[second_mask, analysis_cols]
+
+    stats = pd.DataFrame({'n_first': df_first.shape[0],
+                          'n_second': df_second.shape[0],
+                          'mean_first': df_first.astype(float).mean(),
+                          'mean_second': df_second.astype(float).mean(),
+                          'p': np.nan}, index=analysis_cols)
+    if test_cols is None:
+        stats['p'] = test_pair(df_first.to_numpy(dtype=float), df_second.to_numpy(dtype=float), test)
+    elif is_testable(df_first.shape[0], df_second.shape[0], test):
+        stats['p'] = 1.0
+        if test_cols:
+            stats.loc[test_cols, 'p'] = test_pair(df_first[test_cols].to_numpy(dtype=float),
+                                                  df_second[test_cols].to_numpy(dtype=float), test)
+    return stats
+
+
+def is_testable(n_first: int, n_second: int, test: str = 'ttest') -> bool:
+    """
+    This function checks whether the test of a pair can give a p-value: the t-test needs two samples in each
+    condition, the permutation test a sample in each condition.
+
+    :param n_first: The number of samples of the first condition.
+    :param n_second: The number of samples of the second condition.
+    :param test: 'ttest' or 'permutation', see 'test_pair'. Default is 'ttest'.
+    :return: True if the test can give a p-value, False otherwise.
+    """
+    if test not in ('ttest', 'permutation'):
+        raise ValueError(f"Unknown test '{test}', should be 'ttest' or 'permutation'")
+    min_samples = 2 if test == 'ttest' else 1
+    return n_first >= min_samples and n_second >= min_samples
+
+
+def test_pair(first: np.ndarray, second: np.ndarray, test: str = 'ttest') -> np.ndarray:
+    """
+    This function tests the difference between the samples of two conditions for all the processes at once.
+
+    :param first: The samples of the first condition, a row per sample and a column per process.
+    :param second: The samples of the second condition, a row per sample and a column per process.
+    :param test: 'ttest' for Student's t-test or 'permutation' for the permutation test of 'perm.permutation_test'
+                 (exact or Monte Carlo, also run on single samples, but small groups can not reach small p-values,
+                 e.g. 1/3 for 2 vs 2 samples, see 'perm.get_min_p_value'). Default is 'ttest'.
+    :return: The p-value of every process. The t-test p-values are NaN when one of the conditions has a single sample.
+    """
+    if not is_testable(first.shape[0], second.shape[0], test):
+        return np.full(first.shape[1], np.nan)
+    if test == 'permutation':
+        return perm.permutation_test(first, second)
+    t, p = ttest_ind(first, second, axis=0)
+    return p
+
+
+class GroupIndex:
+    def __init__(self, cell_df: pd.DataFrame, analysis_cols: list,
+                 group_cols: tuple = ('compound_name', 'time', 'dosage')):
+        """
+        This method builds the group index of a cell line: the sample array, the row positions and the summary
+        statistics (count, mean and sum of squared deviations) of every (compound, time, dosage) group, computed once
+        and shared between the analyses of several fixed columns.
+
+        :param cell_df: The input dataframe of the cell line.
+        :param analysis_cols: The processes to index.
+        :param group_cols: The columns that define a group.
+        """
+        self.analysis_cols = list(analysis_cols)
+        self.group_cols = list(group_cols)
+        self.groups = {}
+        grouped = cell_df.groupby(self.group_cols, sort=False)
+        positions = grouped.indices
+        for group_key, group_df in grouped:
+            values = group_df[self.analysis_cols].to_numpy(dtype=float)
+            mean = group_df[self.analysis_cols].astype(float).mean().to_numpy()
+            self.groups[group_key] = {'values': values,
+                                      'positions': positions[group_key],
+                                      'n': values.shape[0],
+                                      'mean': mean,
+                                      'm2': ((values - mean) ** 2).sum(axis=0)}
+
+    def select(self, compounds: list, fixed_col: str, fixed_value) -> list:
+        """
+        This method returns the groups of the given compounds that have the given value in the fixed column.
+
+        :param compounds: The compound names.
+        :param fixed_col: The name of the fixed column.
+        :param fixed_value: The value of the fixed column.
+        :return: A list of the matching groups.
+        """
+        compound_idx = self.group_cols.index('compound_name')
+        fixed_idx = self.group_cols.index(fixed_col)
+        return [group for group_key, group in self.groups.items()
+                if group_key[compound_idx] in compounds and group_key[fixed_idx] == fixed_value]
+
+    @staticmethod
+    def stack(groups: list) -> np.ndarray:
+        """
+        This method stacks the samples of several groups in the order of the rows of the cell line, which is the
+        order 'get_comparison_masks' selects them in, so a seeded permutation test gives the same p-values on both.
+
+        :param groups: The groups to stack.
+        :return: The samples, a row per sample and a column per process.
+        """
+        positions = np.concatenate([group['positions'] for group in groups])
+        values = np.vstack([group['values'] for group in groups])
+        return values[np.argsort(positions, kind='stable')]
+
+    @staticmethod
+    def pool(groups: list):
+        """
+        This method pools the summary statistics of several groups.
+
+        :param groups: The groups to pool.
+        :return: A tuple containing the count, the mean and the sum of squared deviations of the pooled groups.
+        """
+        if len(groups) == 1:
+            return groups[0]['n'], groups[0]['mean'], groups[0]['m2']
+        n, mean, m2 = pool_statistics(np.array([[group['n']] for group in groups]),
+                                      np.array([group['mean'] for group in groups]),
+                                      np.array([group['m2'] for group in groups]))
+        return int(n[0]), mean, m2
+
+
+def pool_statistics(n: np.ndarray, mean: np.ndarray, m2: np.ndarray, axis: int = 0):
+    """
+    This function pools the summary statistics of groups along an axis, element-wise over the other axes. Groups
+    without samples are ignored, and a pool without samples has a NaN mean.
+
+    :param n: The counts of the groups, broadcastable to the means.
+    :param mean: The means of the groups.
+    :param m2: The sums of squared deviations of the groups.
+    :param axis: The axis of the groups. Default is 0.
+    :return: A tuple containing the count, the mean and the sum of squared deviations of the pooled groups.
+    """
+    mean, m2 = np.nan_to_num(mean), np.nan_to_num(m2)
+    total = n.sum(axis=axis)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        pooled_mean = (n * mean).sum(axis=axis) / total
+    pooled_m2 = (m2 + n * (mean - np.expand_dims(np.nan_to_num(pooled_mean), axis)) ** 2).sum(axis=axis)
+    return total, pooled_mean, pooled_m2
+
+
+def get_t_test_p_values(n_first, mean_first, m2_first, n_second, mean_second, m2_second) -> np.ndarray:
+    """
+    This function runs Student's t-test from summary statistics, element-wise over arrays of any shape. The p-value is
+    NaN when one of the groups has less than two samples.
+
+    :param n_first: The counts of the first groups, broadcastable to the means.
+    :param mean_first: The means of the first groups.
+    :param m2_first: The sums of squared deviations of the first groups.
+    :param n_second: The counts of the second groups, broadcastable to the means.
+    :param mean_second: The means of the second groups.
+    :param m2_second: The sums of squared deviations of the second groups.
+    :return: An array of p-values.
+    """
+    n_first, mean_first, m2_first, n_second, mean_second, m2_second = np.broadcast_arrays(
+        n_first, mean_first, m2_first, n_second, mean_second, m2_second)
+    tested = (n_first > 1) & (n_second > 1)
+    p = np.full(tested.shape, np.nan)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        t, p_tested = ttest_ind_from_stats(mean_first[tested], np.sqrt(m2_first[tested] / (n_first[tested] - 1)),
+                                           n_first[tested], mean_second[tested],
+                                           np.sqrt(m2_second[tested] / (n_second[tested] - 1)), n_second[tested])
+    p[tested] = p_tested
+    return p
+
+
+def compute_pair_statistics_from_index(group_index: GroupIndex, key: tuple, cl: list, il: list,
+                                       control_treatment: bool, fixed_col: str, test: str = 'ttest',
+                                       analysis_cols: list = None) -> pd.DataFrame:
+    """
+    This function computes the same statistics as 'compute_pair_statistics' from the summary statistics of a group
+    index, without touching the rows of the pair. The permutation test runs on the samples kept by the index.
+
+    :param group_index: The group index of the cell line.
+    :param key: The key representing the compounds and time points to compare.
+    :param cl: The control_list.
+    :param il: The inhibitor_list.
+    :param control_treatment: Flag indicating whether to perform a comparison between CONTROL and TREATMENT as a single unit.
+    :param fixed_col: The name of the fixed column.
+    :param test: 'ttest' or 'permutation', see 'test_pair'. Default is 'ttest'.
+    :param analysis_cols: The processes to compute the statistics for, a subset of the processes of the index. Only
+                          these are tested. Default is None - all the processes of the index.
+    :return: A DataFrame indexed by process with the columns 'n_first', 'n_second', 'mean_first', 'mean_second' and 'p'.
+    """
     if control_treatment:
-        df_first = sub_df.loc[(sub_df['compound_name'].isin(cl)) & (sub_df[fixed_col] == key[3]), process]
-        df_second = sub_df.loc[(sub_df['compound_name'].isin(il)) & (sub_df[fixed_col] == key[3]), process]
+        first_groups = group_index.select(cl, fixed_col, key[3])
+        second_groups = group_index.select(il, fixed_col, key[3])
+    elif key[1] == key[2]:
+        first_groups = group_index.select([key[1]], fixed_col, key[3])
+        second_groups = group_index.select([key[1]], fixed_col, key[4])
     else:
-        if key[1] == key[2]:
-            df_first = sub_df.loc[sub_df[fixed_col] == key[3], process]
-            df_second = sub_df.loc[sub_df[fixed_col] == key[4], process]
-        else:
-            df_first = sub_df.loc[sub_df['compound_name'] == key[1], process]
-            df_second = sub_df.loc[sub_df['compound_name'] == key[2], process]
-    return df_first, df_second
+        first_groups = group_index.select([key[1]], fixed_col, key[3])
+        second_groups = group_index.select([key[2]], fixed_col, key[3])
+
+    n_first, mean_first, m2_first = GroupIndex.pool(first_groups)
+    n_second, mean_second, m2_second = GroupIndex.pool(second_groups)
+    col_positions = slice(None)
+    if analysis_cols is None:
+        analysis_cols = group_index.analysis_cols
+    else:
+        col_positions = pd.Index(group_index.analysis_cols).get_indexer(analysis_cols)
+        if (col_positions < 0).any():
+            raise KeyError(f"The processes {list(pd.Index(analysis_cols)[col_positions < 0])} are not in the group "
+                           f"index")
+        mean_first, m2_first = mean_first[col_positions], m2_first[col_positions]
+        mean_second, m2_second = mean_second[col_positions], m2_second[col_positions]
+
+    stats = pd.DataFrame({'n_first': n_first,
+                          'n_second': n_second,
+                          'mean_first': mean_first,
+                          'mean_second': mean_second,
+                          'p': np.nan}, index=analysis_cols)
+    if test != 'ttest':
+        stats['p'] = test_pair(GroupIndex.stack(first_groups)[:, col_positions],
+                               GroupIndex.stack(second_groups)[:, col_positions], test)
+    else:
+        stats['p'] = get_t_test_p_values(n_first, mean_first, m2_first, n_second, mean_second, m2_second)
+    return stats
+
+
+def get_significance_flags(stats: pd.DataFrame, p_value: float, err_limit_lambda: float,
+                           p_col: str = 'p') -> pd.DataFrame:
+    """
+    This function evaluates the significance rules of 'create_reason_dataframe' on precomputed pair statistics, for all
+    the rows at once.
+
+    :param stats: The statistics DataFrame, as returned by 'compute_pair_statistics'.
+    :param p_value: The threshold p-value for significance.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+    :param p_col: The column of the p-values compared with 'p_value', e.g. 'q' for adjusted p-values. Default is 'p'.
+    :return: A DataFrame of boolean columns 'sign_changed', 'emerging', 'disappearing', 'p_significant' and 'keep',
+             where 'keep' marks the rows that get a reason.
+    """
+    abs_first = stats['mean_first'].abs()
+    abs_second = stats['mean_second'].abs()
+    err_limit_lambda = get_error_limits(err_limit_lambda,
+                                        stats['process'] if 'process' in stats.columns else stats.index)
+    single = (stats['n_first'] == 1) | (stats['n_second'] == 1)
+
+    flags = pd.DataFrame(index=stats.index)
+    flags['sign_changed'] = np.sign(stats['mean_first']) != np.sign(stats['mean_second'])
+    flags['emerging'] = single & (abs_first < err_limit_lambda) & (err_limit_lambda < abs_second)
+    flags['disappearing'] = single & (abs_first > err_limit_lambda) & (err_limit_lambda > abs_second)
+    flags['p_significant'] = stats[p_col] <= p_value
+    flags['keep'] = (flags['sign_changed'] | flags['emerging'] | flags['disappearing'] | flags['p_significant']) & (
+            (abs_first > err_limit_lambda) | (abs_second > err_limit_lambda))
+    return flags
+
+
+def get_reasons(stats: pd.DataFrame, p_value: float, err_limit_lambda: float, p_col: str = 'p') -> pd.Series:
+    """
+    This function returns the reasons of the significant processes of a pair.
+
+    :param stats: The statistics DataFrame, as returned by 'compute_pair_statistics'.
+    :param p_value: The threshold p-value for significance.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+    :param p_col: The column of the p-values compared with 'p_value'. The adjusted p-values of 'q' are reported as
+                  'Q-Value' in the reasons. Default is 'p'.
+    :return: A Series of reasons indexed by the significant processes.
+    """
+    flags = get_significance_flags(stats, p_value, err_limit_lambda, p_col)
+    kept = flags.loc[flags['keep']]
+    label = 'Q-Value' if p_col == 'q' else 'P-Value'
+    reasons = [add_reason(row.sign_changed, row.emerging, row.disappearing, p, p_value, label)
+               for row, p in zip(kept.itertuples(), stats.loc[flags['keep'], p_col])]
+    return pd.Series(reasons, index=kept.index, dtype=object)
+
+
+def adjust_p_values(p_values, method: str = 'bh') -> np.ndarray:
+    """
+    This function adjusts p-values for multiple testing, for all the tests at once. NaN p-values (tests that could not
+    be run) are kept as NaN and are not counted as tests.
+
+    :param p_values: The raw p-values.
+    :param method: 'bh' for the Benjamini-Hochberg false discovery rate or 'bonferroni' for the family-wise error
+                   rate. Default is 'bh'.
+    :return: The adjusted p-values (q-values), in the order of 'p_values'.
+    """
+    p_values = np.asarray(p_values, dtype=float)
+    adjusted = np.full(p_values.shape, np.nan)
+    tested = ~np.isnan(p_values)
+    p_tested = p_values[tested]
+    n_tests = len(p_tested)
+    if method == 'bonferroni':
+        adjusted[tested] = np.minimum(p_tested * n_tests, 1)
+    elif method == 'bh':
+        order = np.argsort(p_tested)
+        ranked = p_tested[order] * n_tests / np.arange(1, n_tests + 1)
+        # The q-value of a rank is the smallest ratio of all the ranks above it
+        ranked = np.minimum.accumulate(ranked[::-1])[::-1]
+        q_tested = np.empty(n_tests)
+        q_tested[order] = np.minimum(ranked, 1)
+        adjusted[tested] = q_tested
+    else:
+        raise ValueError(f"Unknown correction '{method}', should be 'bh' or 'bonferroni'")
+    return adjusted
+
+
+def add_reason_row(sub_df: pd.DataFrame, process: str, reason: str) -> pd.DataFrame:
+    """
+    This function returns the column of a process with its reason appended as a last row named 'Reason'.
+
+    :param sub_df: The original DataFrame.
+    :param process: The name of the process.
+    :param reason: The reason for the change.
+    :return: The process column with the 'Reason' row.
+    """
+    add_res = pd.DataFrame([[reason]], columns=[process])
+    add_res = add_res.rename(index={0: 'Reason'})
+    return pd.concat([sub_df[[process]], add_res])
 
 
 def create_reason_dataframe(sub_df: pd.DataFrame, process: str, p_value: float, df_first: pd.DataFrame,
@@ -228,9 +711,11 @@ def create_reason_dataframe(sub_df: pd.DataFrame, process: str, p_value: float,
     :param p_value: The threshold p-value for significance.
     :param df_first: The DataFrame for the first condition.
     :param df_second: The DataFrame for the second condition.
-    :param err_limit_lambda: The error limit lambda.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
     :return: The reason DataFrame if the conditions for significance are met, or None otherwise.
     """
+    if isinstance(err_limit_lambda, pd.Series):
+        err_limit_lambda = get_error_limits(err_limit_lambda, [process])[0]
     sign_changed = False
     Emerging_process = False
     Disappearing_process = False
@@ -248,11 +733,8 @@ def create_reason_dataframe(sub_df: pd.DataFrame, process: str, p_value: float,
         t, p = ttest_ind(df_first.tolist(), df_second.tolist())
     if sign_changed or Emerging_process or Disappearing_process or (p <= p_value):
         if (abs(df_first_mean) > err_limit_lambda) or (abs(df_second_mean) > err_limit_lambda):
-            add_res = pd.DataFrame(
-                [[add_reason(sign_changed, Emerging_process, Disappearing_process, p, p_value)]],
-                columns=[process])
-            add_res = add_res.rename(index={0: 'Reason'})
-            return pd.concat([sub_df[[process]], add_res])
+            return add_reason_row(sub_df, process,
+                                  add_reason(sign_changed, Emerging_process, Disappearing_process, p, p_value))
         return None
 
 
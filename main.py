@@ -17,7 +17,20 @@ if __name__ == '__main__':
     # filter_time = osp.filter_by_col(filter_dosage, 'time', ['0hr', '24hr'], new_sheet=False, sheet_name='important_L',
     #                                 data_path=data_set_path)
     #
+    # filter_time = osp.query_L(important_l, q.Isin('dosage', ['0.00001nm', '1nm', '40nm', '1uM']) &
+    #                           q.Isin('time', ['0hr', '24hr']), new_sheet=False, sheet_name='important_L',
+    #                           data_path=data_set_path)  # with 'import query as q', the same rows in one scan
+    #
     osp.analyze_G(g_df, important_l, data_set_path, edge_percents=0.1)
 
     osp.analyze_L(important_l, err_limit_lambda, data_set_path, fixed_col='time', p_value=0.05)
     # osp.analyze_L(important_l, err_limit_lambda, data_set_path, fixed_col='dosage', p_value=0.05) # delete # to activate
+    # osp.analyze_L_axes(important_l, err_limit_lambda, data_set_path, fixed_cols=('time', 'dosage'), p_value=0.05)
+    # osp.analyze_L_background(important_l, err_limit_lambda, data_set_path, fixed_col='time', p_value=0.05)
+
+    # import celltensor as ct  # delete # to contrast every compound with the controls across the cell lines
+    # ct.analyze_cross_cell_lines(important_l, data_set_path, fixed_col='time', p_value=0.05)
+
+    # statistics = osp.compute_L_statistics(l_df, fixed_col='time')  # delete # to sweep the analysis settings
+    # print(osp.sweep_L(l_df, statistics, p_values=[0.01, 0.05], thresholds=[1, 2, 3],
+    #                   err_limit_lambdas=[err_limit_lambda]))
@@ -0,0 +1,198 @@
+import io
+import os
+import json
+import numpy as np
+import pandas as pd
+from multiprocessing import shared_memory
+from concurrent.futures import ProcessPoolExecutor
+import exceptions as e
+import validation as valid
+import helpfunctions as hf
+import outputwriter as ow
+
+STORE_FILE = 'store.json'
+WORKER_STORE = {}
+
+
+def save_store(store_path: str, l_df: pd.DataFrame, g_df: pd.DataFrame, err_limit_lambda: float):
+    """
+    This function writes the 'L' and 'G' sheets as a matrix store: the process values as '.npy' matrices that can be
+    memory-mapped, the metadata as small CSV tables and a 'store.json' description. Every file is written atomically
+    and 'store.json' is written last, so a store is complete once it exists.
+
+    :param store_path: The directory of the store.
+    :param l_df: The 'L' DataFrame.
+    :param g_df: The 'G' DataFrame.
+    :param err_limit_lambda: The error limit lambda.
+    """
+    valid.is_valid_L(l_df)
+    valid.is_valid_G(g_df)
+    os.makedirs(store_path, exist_ok=True)
+    l_processes = hf.get_analysis_columns(l_df)
+    g_processes = g_df.columns[1:].tolist()
+
+    for name, matrix in [('L.npy', l_df[l_processes]), ('G.npy', g_df[g_processes])]:
+        buffer = io.BytesIO()
+        dtype = np.float32 if (matrix.dtypes == np.float32).all() else np.float64
+        np.save(buffer, np.ascontiguousarray(matrix.to_numpy(dtype=dtype)))
+        ow.atomic_write(buffer.getvalue(), os.path.join(store_path, name))
+    ow.save_csv(l_df.drop(columns=l_processes), os.path.join(store_path, 'L_meta.csv'), index=False)
+    ow.save_csv(g_df[['UID']], os.path.join(store_path, 'G_meta.csv'), index=False)
+
+    description = {'l_processes': l_processes,
+                   'g_processes': g_processes,
+                   'err_limit_lambda': float(err_limit_lambda)}
+    ow.atomic_write(json.dumps(description, indent=2, default=str).encode(), os.path.join(store_path, STORE_FILE))
+
+
+def read_description(store_path: str) -> dict:
+    """
+    This function reads the description of a matrix store.
+
+    :param store_path: The directory of the store.
+    :return: The description written by 'save_store'.
+    """
+    description_path = os.path.join(store_path, STORE_FILE)
+    if not os.path.isfile(description_path):
+        raise e.InvalidPathException(f"The path '{store_path}' is not a complete matrix store")
+    with open(description_path) as description_file:
+        return json.load(description_file)
+
+
+def build_frames(description: dict, l_meta: pd.DataFrame, g_meta: pd.DataFrame, l_values: np.ndarray,
+                 g_values: np.ndarray):
+    """
+    This function wraps the matrices of a store in 'L' and 'G' DataFrames without copying them.
+
+    :param description: The description of the store.
+    :param l_meta: The metadata of 'L'.
+    :param g_meta: The 'UID' column of 'G'.
+    :param l_values: The 'L' matrix.
+    :param g_values: The 'G' matrix.
+    :return: A tuple (l_df, g_df, err_limit_lambda) in the layout of 'get_LGE_data'.
+    """
+    l_df = pd.concat([l_meta, pd.DataFrame(l_values, columns=description['l_processes'], copy=False)], axis=1)
+    g_df = pd.concat([g_meta, pd.DataFrame(g_values, columns=description['g_processes'], copy=False)], axis=1)
+    return l_df, g_df, description['err_limit_lambda']
+
+
+def load_store(store_path: str, mmap: bool = True):
+    """
+    This function loads a matrix store. With 'mmap', the process values are memory-mapped read-only, so processes that
+    load the same store share the pages of the operating system cache instead of holding a copy each.
+
+    :param store_path: The directory of the store.
+    :param mmap: If True, memory-maps the matrices, otherwise reads them into memory. Default is True.
+    :return: A tuple (l_df, g_df, err_limit_lambda) in the layout of 'get_LGE_data'.
+    """
+    description = read_description(store_path)
+    mmap_mode = 'r' if mmap else None
+    l_values = np.load(os.path.join(store_path, 'L.npy'), mmap_mode=mmap_mode)
+    g_values = np.load(os.path.join(store_path, 'G.npy'), mmap_mode=mmap_mode)
+    l_meta = pd.read_csv(os.path.join(store_path, 'L_meta.csv'), keep_default_na=False)
+    g_meta = pd.read_csv(os.path.join(store_path, 'G_meta.csv'), keep_default_na=False)
+    return build_frames(description, l_meta, g_meta, l_values, g_values)
+
+
+class SharedStore:
+    def __init__(self, store_path: str):
+        """
+        This method copies the matrices of a store into shared memory blocks, for workers that should not depend on
+        the store files. The blocks live until 'close' is called.
+
+        :param store_path: The directory of the store.
+        """
+        self.description = read_description(store_path)
+        self.blocks = []
+        self.handle = {'description': self.description,
+                       'l_meta': pd.read_csv(os.path.join(store_path, 'L_meta.csv'), keep_default_na=False),
+                       'g_meta': pd.read_csv(os.path.join(store_path, 'G_meta.csv'), keep_default_na=False)}
+        for name in ('L', 'G'):
+            values = np.load(os.path.join(store_path, f'{name}.npy'), mmap_mode='r')
+            block = shared_memory.SharedMemory(create=True, size=max(values.nbytes, 1))
+            np.ndarray(values.shape, dtype=values.dtype, buffer=block.buf)[:] = values
+            self.blocks.append(block)
+            self.handle[name] = (block.name, values.shape, values.dtype.str)
+
+    def close(self):
+        """
+        This method releases and removes the shared memory blocks.
+        """
+        for block in self.blocks:
+            block.close()
+            block.unlink()
+        self.blocks = []
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def attach_shared(handle: dict):
+    """
+    This function attaches to the shared memory blocks of a 'SharedStore' without copying them.
+
+    :param handle: The 'handle' of the 'SharedStore'.
+    :return: A tuple (l_df, g_df, err_limit_lambda, blocks). The blocks should be kept alive while the DataFrames are
+             used.
+    """
+    blocks, values = [], {}
+    for name in ('L', 'G'):
+        block_name, shape, dtype = handle[name]
+        block = shared_memory.SharedMemory(name=block_name)
+        blocks.append(block)
+        values[name] = np.ndarray(shape, dtype=np.dtype(dtype), buffer=block.buf)
+        values[name].flags.writeable = False
+    l_df, g_df, err_limit_lambda = build_frames(handle['description'], handle['l_meta'], handle['g_meta'],
+                                                values['L'], values['G'])
+    return l_df, g_df, err_limit_lambda, blocks
+
+
+def init_worker(store):
+    """
+    This function attaches a worker process to a store once, when the worker starts.
+
+    :param store: The directory of a matrix store, or the 'handle' of a 'SharedStore'.
+    """
+    if isinstance(store, dict):
+        l_df, g_df, err_limit_lambda, blocks = attach_shared(store)
+        WORKER_STORE['blocks'] = blocks
+    else:
+        l_df, g_df, err_limit_lambda = load_store(store)
+    WORKER_STORE.update({'l_df': l_df, 'g_df': g_df, 'err_limit_lambda': err_limit_lambda})
+
+
+def run_worker_task(function, task):
+    """
+    This function runs a task on the store of the worker.
+
+    :param function: A module-level function called as function(l_df, g_df, err_limit_lambda, task).
+    :param task: The argument of the task.
+    :return: The result of the function.
+    """
+    return function(WORKER_STORE['l_df'], WORKER_STORE['g_df'], WORKER_STORE['err_limit_lambda'], task)
+
+
+def map_store(function, store_path: str, tasks: list, jobs: int = 1, shared: bool = False) -> list:
+    """
+    This function runs a function over tasks in a pool of worker processes that all attach to the same store, so only
+    the task arguments are sent to the workers and their memory stays flat with the number of workers.
+
+    :param function: A module-level function called as function(l_df, g_df, err_limit_lambda, task).
+    :param store_path: The directory of the store.
+    :param tasks: The task arguments, e.g. cell line names.
+    :param jobs: The number of worker processes. Default is 1.
+    :param shared: If True, the workers attach to shared memory blocks instead of memory-mapping the files.
+                   Default is False.
+    :return: The results of the tasks, in the order of the tasks.
+    """
+    read_description(store_path)
+    if shared:
+        with SharedStore(store_path) as shared_store:
+            with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker,
+                                     initargs=(shared_store.handle,)) as executor:
+                return list(executor.map(run_worker_task, [function] * len(tasks), tasks))
+    with ProcessPoolExecutor(max_workers=jobs, initializer=init_worker, initargs=(store_path,)) as executor:
+        return list(executor.map(run_worker_task, [function] * len(tasks), tasks))
@@ -0,0 +1,137 @@
+import os
+import json
+import pickle
+import hashlib
+import pandas as pd
+import outputwriter as ow
+
+CACHE_VERSION = 1
+ENTRY_SUFFIX = '.pkl'
+
+
+def hash_frame(df: pd.DataFrame) -> str:
+    """
+    This function hashes the content of a DataFrame: its labels, its values and its dtypes.
+
+    :param df: The DataFrame.
+    :return: The hexadecimal digest.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps([str(col) for col in df.columns]).encode())
+    digest.update(json.dumps([str(dtype) for dtype in df.dtypes]).encode())
+    digest.update(pd.util.hash_pandas_object(df, index=True).to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def hash_value(value) -> str:
+    """
+    This function hashes a parameter of a result: a DataFrame or a Series by content, anything else by its JSON or
+    string form.
+
+    :param value: The parameter.
+    :return: The hexadecimal digest.
+    """
+    if isinstance(value, pd.Series):
+        value = value.to_frame()
+    if isinstance(value, pd.DataFrame):
+        return hash_frame(value)
+    return hashlib.sha256(json.dumps(value, default=str).encode()).hexdigest()
+
+
+class ResultCache:
+    def __init__(self, cache_path: str, max_entries: int = 512, max_bytes: int = 1 << 30):
+        """
+        This method opens a disk-backed cache of results in a directory. An entry is a pickle file named by the
+        content hash of the inputs of the result, written atomically, so several processes can share the directory.
+        The modification time of an entry is its last use, and the least recently used entries are evicted when the
+        cache holds more than 'max_entries' entries or 'max_bytes' bytes.
+
+        :param cache_path: The directory of the cache.
+        :param max_entries: The maximal number of entries. Default is 512.
+        :param max_bytes: The maximal total size of the entries. Default is 1 GiB.
+        """
+        self.cache_path = cache_path
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_path, exist_ok=True)
+
+    def get_key(self, *parts) -> str:
+        """
+        This method builds the key of a result from its inputs.
+
+        :param parts: The inputs of the result, e.g. the DataFrame of a cell line and the parameters of the analysis.
+        :return: The key, a hexadecimal digest.
+        """
+        digest = hashlib.sha256(f'v{CACHE_VERSION}'.encode())
+        for part in parts:
+            digest.update(hash_value(part).encode())
+        return digest.hexdigest()
+
+    def get_path(self, key: str) -> str:
+        """
+        This method returns the path of the entry of a key.
+
+        :param key: The key of the result.
+        :return: The path of the entry.
+        """
+        return os.path.join(self.cache_path, key + ENTRY_SUFFIX)
+
+    def get(self, key: str):
+        """
+        This method returns a cached result and marks it as used.
+
+        :param key: The key of the result.
+        :return: The result, or None if it is not cached.
+        """
+        path = self.get_path(key)
+        try:
+            with open(path, 'rb') as entry_file:
+                result = pickle.load(entry_file)
+            os.utime(path)
+        except (OSError, EOFError, pickle.UnpicklingError):
+            self.misses += 1
+            return None
+        self.hits += 1
+        return result
+
+    def put(self, key: str, result):
+        """
+        This method caches a result and evicts the least recently used entries over the limits.
+
+        :param key: The key of the result.
+        :param result: The result, any picklable object.
+        """
+        ow.atomic_write(pickle.dumps(result, protocol=pickle.HIGHEST_PROTOCOL), self.get_path(key))
+        self.evict()
+
+    def evict(self):
+        """
+        This method removes the least recently used entries until the cache is within its limits.
+        """
+        entries = []
+        for entry in os.scandir(self.cache_path):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        entries.sort()
+        total_bytes = sum(size for _, size, _ in entries)
+        while entries and (len(entries) > self.max_entries or total_bytes > self.max_bytes):
+            _, size, path = entries.pop(0)
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            total_bytes -= size
+
+    def clear(self):
+        """
+        This method removes all the entries.
+        """
+        for entry in os.scandir(self.cache_path):
+            if entry.name.endswith(ENTRY_SUFFIX):
+                os.remove(entry.path)
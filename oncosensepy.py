@@ -1,21 +1,44 @@
 import os
+import time
+import numpy as np
 import pandas as pd
 import exceptions as e
 import UIFunctions as UIf
 import helpfunctions as hf
 import validation as valid
-
-
-def get_LGE_data(data_set_path: str):
+import outputwriter as ow
+import matrixstore as ms
+import checkpoint as cp
+import memo
+import progressGUI as pg
+import sparsel as sl
+import permutation as perm
+import query as q
+import matplotlib.pyplot as plt
+
+
+def get_LGE_data(data_set_path: str, store_path: str = None, dtype: str = 'float64'):
     """
     The function reads Excel sheets ('L', 'G' and 'ErrorLimitLambda') from the specified file path and returns clear DataFrames without missing values.
 
     :param data_set_path: The path to the Excel file containing the data.
+    :param store_path: The directory of a matrix store to write the data into once, see 'ms.save_store'. Workers can
+                       then attach to it with 'ms.load_store' or 'ms.map_store'. Default is None - no store is written.
+    :param dtype: The dtype of the process columns of 'L' and 'G': 'float64' or 'float32', which halves their memory.
+                  The process columns are parsed straight into it, so no float64 copy of them is built on load; the
+                  cells read from the workbook still bound the peak. The means and the tests are still computed in
+                  float64. Default is 'float64'.
     :return: l_df (pandas.DataFrame): A DataFrame containing the data from the 'L' sheet.
              g_df (pandas.DataFrame): A DataFrame containing the data from the 'G' sheet.
              err_limit_lambda (float): The error limit lambda.
     """
-    l_df = pd.read_excel(data_set_path, sheet_name='L').fillna(0)
+    with pd.ExcelFile(data_set_path) as workbook:
+        l_processes = hf.get_analysis_columns(workbook.parse('L', nrows=0))
+        l_df = workbook.parse('L', dtype=hf.get_process_dtypes(l_processes, dtype)).fillna(0)
+        g_processes = workbook.parse('G', nrows=0).columns[1:]
+        g_df = workbook.parse('G', dtype=hf.get_process_dtypes(g_processes, dtype)).fillna(0)
+        err_limit_lambda = workbook.parse('ErrorLimitLambda').columns.values[0]
+
     l_df['compound_name'] = l_df['compound_name'].apply(lambda x: 'CONTROL' if x == 0 else x)
     l_df['2D_3D'] = l_df['2D_3D'].apply(lambda x: '-0-' if x == 0 else x)
     l_df['dosage'] = l_df['dosage'].apply(lambda x: '-0-' if x == 0 else x)
@@ -24,45 +47,42 @@ def get_LGE_data(data_set_path: str):
     if 0 in l_df['cell_line_name'].values:
         e.InvalidCellLineException("Cell line name has missing values")
 
-    g_df = pd.read_excel(data_set_path, sheet_name='G').fillna(0)
-
     if 0 in g_df['UID'].values:
         e.InvalidUIDException("UID has missing values")
 
-    err_limit_lambda = pd.read_excel(data_set_path, sheet_name='ErrorLimitLambda').columns.values[0]
+    if store_path is not None:
+        ms.save_store(store_path, l_df, g_df, err_limit_lambda)
 
     return l_df, g_df, err_limit_lambda
 
 
 def important_L(l_df: pd.DataFrame, err_limit: float, threshold: int, new_sheet: bool = False,
-                sheet_name: str = 'important_L', data_path: str = '') -> pd.DataFrame:
+                sheet_name: str = 'important_L', data_path: str = '', sparse_l: sl.SparseL = None) -> pd.DataFrame:
     """
     This function returns a DataFrame with only the important columns. An important column is determined by whether the
     number of cells whose value is higher in absolute value than the error limit, is greater than or equal to the threshold.
 
     :param l_df: The DataFrame to be checked.
-    :param err_limit: The error limit.
+    :param err_limit: The error limit, or a Series of error limits indexed by process.
     :param threshold: The number of significant values.
     :param new_sheet: If True, creates a new sheet. Default is False.
     :param sheet_name: The name of the sheet to be created. Default is 'important_L'.
     :param data_path: The path where the new sheet will be created. Default is an empty string.
-    :return: The DataFrame with only the important columns selected.
+    :param sparse_l: The entries of 'l_df' above the error limit, see 'sl.SparseL'. If given, the counts are taken from
+                     it instead of the dense matrix. Default is None.
+    :return: The DataFrame with only the important columns selected. All the kept columns are selected in a single
+             indexing operation, so with pandas copy-on-write the result shares its data with 'l_df'.
     """
     valid.is_valid_L(l_df)
     if threshold < 0:
         raise e.NegativeNumberException("Threshold should be positive number")
-    new_df = l_df.loc[:, :5].copy()
-    col_names = l_df.columns.tolist()
-    time_col_idx = col_names.index('time')
-    analysis_cols = [c for c in col_names[time_col_idx + 1:]]
-
-    for col in analysis_cols:
-        count = 0
-        for cell in l_df[col]:
-            if abs(cell) > err_limit:
-                count += 1
-        if count >= threshold:
-            new_df[col] = l_df[col].copy()
+    analysis_cols = hf.get_analysis_columns(l_df)
+    if sparse_l is None:
+        counts = (l_df[analysis_cols].abs() > hf.get_error_limits(err_limit, analysis_cols)).sum()
+    else:
+        counts = sparse_l.get_counts().reindex(analysis_cols)
+    keep_cols = l_df.columns.isin(counts.index[counts >= threshold]) | ~l_df.columns.isin(analysis_cols)
+    new_df = l_df.loc[:, keep_cols]
 
     if new_sheet:
         print(f"Creating '{sheet_name}'..")
@@ -82,10 +102,10 @@ def filter_by_col(df: pd.DataFrame, col: str, filter_list: list, new_sheet: bool
     :param new_sheet: If True, creates a new sheet. Default is False.
     :param sheet_name: The name of the sheet to be created. Default is 'filter_by_col'.
     :param data_path: The path where the new sheet will be created. Default is an empty string.
-    :return: The DataFrame after filtering.
+    :return: The DataFrame after filtering. With pandas copy-on-write the rows are only copied when modified.
     """
     valid.is_valid_L(df)
-    filter_df = df.loc[(df[col].isin(filter_list))]
+    filter_df = df[df[col].isin(filter_list)]
     if len(filter_df) == 0:
         print(f"There is no data to show by '{col}' filtering")
 
@@ -96,84 +116,731 @@ def filter_by_col(df: pd.DataFrame, col: str, filter_list: list, new_sheet: bool
     return filter_df
 
 
+def query_L(df: pd.DataFrame, predicate: q.Predicate, materialize: bool = True, new_sheet: bool = False,
+            sheet_name: str = 'query_L', data_path: str = ''):
+    """
+    This function filters data by a predicate over the metadata columns, e.g.
+    q.Isin('dosage', ['1nm', '40nm']) & q.Between('time', '0hr', '24hr') & ~q.Isin('compound_name', ['DMSO']).
+    Unlike chained 'filter_by_col' calls, the DataFrame is validated and scanned once and the rows are selected once.
+
+    :param df: The DataFrame to filter.
+    :param predicate: The predicate, see 'query.py': 'q.Isin', 'q.Between' (on the parsed time or dosage), combined
+                      with '&', '|' and '~'.
+    :param materialize: If True, returns the filtered DataFrame. If False, returns only the index of the kept rows.
+                        Default is True.
+    :param new_sheet: If True, creates a new sheet with the filtered DataFrame. Default is False.
+    :param sheet_name: The name of the sheet to be created. Default is 'query_L'.
+    :param data_path: The path where the new sheet will be created. Default is an empty string.
+    :return: The DataFrame after filtering, or the index of its rows.
+    """
+    valid.is_valid_L(df)
+    mask = q.get_mask(df, predicate)
+    if not mask.any():
+        print(f"There is no data to show by the query {predicate!r}")
+    if not materialize and not new_sheet:
+        return df.index[mask]
+
+    filter_df = df[mask]
+    if new_sheet:
+        print(f"Creating '{sheet_name}'..")
+        UIf.create_new_sheet(filter_df, data_path, sheet_name)
+
+    return filter_df if materialize else filter_df.index
+
+
+def get_compound_selection(cell_df: pd.DataFrame, cell_line: str, selections: dict = None):
+    """
+    This function returns the control and inhibitor lists of a cell line, from the selections if given or from the GUI.
+
+    :param cell_df: The DataFrame of the cell line.
+    :param cell_line: The name of the cell line.
+    :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple. Cell lines that are missing
+                       get the default split of 'get_default_compound_lists'. Default is None - the GUI is shown.
+    :return: A tuple containing the control list and the inhibitor list.
+    """
+    if selections is None:
+        return UIf.pop_up_compound_GUI(cell_df, cell_line)
+    if cell_line in selections:
+        control_list, inhibitor_list = selections[cell_line]
+        return list(control_list), list(inhibitor_list)
+    return hf.get_default_compound_lists(cell_df)
+
+
 def analyze_L(important_l: pd.DataFrame, err_limit_lambda: float, data_path: str, fixed_col: str = 'time',
-              p_value: float = 0.05, save_path: str = os.getcwd()):
+              p_value: float = 0.05, save_path: str = os.getcwd(), **options):
     """
-    This function analyzes pairs of compounds in a dictionary of Pandas dataframes.
+    This function analyzes pairs of compounds in a dictionary of Pandas dataframes. It runs 'analyze_L_axes' with a
+    single fixed column.
 
     :param important_l: The DataFrame with only the important columns.
-    :param err_limit_lambda: The error limit lambda.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
     :param data_path: The path where the original dataframes are stored.
     :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
     :param p_value: The p-value threshold for determining whether the difference between means is significant. Default is 0.05.
     :param save_path: The path where the exported data and plots will be saved.
+    :param options: The other options of the run, e.g. 'selections', 'correction', 'test' or 'resume', see
+                    'analyze_L_axes'.
     :return: files with new information about sheet 'L' after the analysis.
     """
-    cell_line_list = UIf.pop_up_cell_GUI(important_l)
+    analyze_L_axes(important_l, err_limit_lambda, data_path, fixed_cols=(fixed_col,), p_value=p_value,
+                   save_path=save_path, **options)
 
+
+def analyze_L_axes(important_l: pd.DataFrame, err_limit_lambda: float, data_path: str,
+                   fixed_cols: tuple = ('time', 'dosage'), p_value: float = 0.05, save_path: str = os.getcwd(),
+                   writer: ow.OutputWriter = None, cell_line_list: list = None, selections: dict = None,
+                   pair_schedule: str = 'all', correction: str = None, correction_scope: str = 'cell_line',
+                   test: str = 'ttest', resume: bool = False, cache_path: str = None,
+                   workbook: ow.WorkbookWriter = None, sparse: bool = False, checkpoint: bool = False,
+                   threshold: int = None):
+    """
+    This function analyzes the pairs of compounds for one or more fixed columns in one pass. The GUIs are shown once,
+    and the group index of each cell line is built once and shared between the fixed columns. The outputs of each
+    fixed column are saved side by side in the cell line folder. With a correction, the p-values of each fixed column
+    are adjusted as a separate family.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+    :param data_path: The path where the original dataframes are stored.
+    :param fixed_cols: The names of the columns that will remain fixed in each pair. Default is ('time', 'dosage').
+    :param p_value: The p-value threshold for determining whether the difference between means is significant. Default is 0.05.
+    :param save_path: The path where the exported data and plots will be saved.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :param cell_line_list: The cell lines to analyze. Default is None - the cell lines are chosen in the GUI.
+    :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple, see
+                       'get_compound_selection'. Default is None - the compounds are chosen in the GUI.
+    :param pair_schedule: The pairs of an inhibitor with itself at different fixed column values: 'all', 'adjacent' or
+                          'baseline', see 'hf.schedule_pairs'. Default is 'all'.
+    :param correction: The multiple-testing correction of the p-values: None, 'bh' (Benjamini-Hochberg) or
+                       'bonferroni'. If given, all the p-values of the run are collected and adjusted before the reasons
+                       are decided, the adjusted 'Q-Value' is compared with 'p_value', and the raw and adjusted p-values
+                       are saved in a 'p_values_by_<fixed_col>.csv' file. Default is None.
+    :param correction_scope: 'cell_line' to adjust the p-values of each cell line separately or 'global' to adjust all
+                             of them together. Default is 'cell_line'.
+    :param test: The test of the difference between the pairs: 'ttest' or 'permutation', see 'hf.test_pair'. With
+                 'permutation', the group sizes whose smallest p-value is above 'p_value' are reported once at the end.
+                 Default is 'ttest'.
+    :param resume: If True, continues the checkpoint journal of a previous run with the same parameters and data in
+                   the output folder: its cell lines and selections are reused and its completed units are skipped.
+                   Implies 'checkpoint'. Default is False.
+    :param cache_path: The directory of a result cache shared between runs, see 'memo.ResultCache'. The result tables
+                       of a cell line are reused when its data, its selection and the parameters are unchanged, and
+                       only the exports are rebuilt. Default is None - nothing is cached.
+    :param workbook: The workbook of all the results, see 'open_workbook'. If given, every result table is also
+                     written as a sheet of it; with 'resume', only the tables of the units that are run. Default is
+                     None.
+    :param sparse: If True, the entries of 'L' above the error limit are kept as a sparse matrix, see 'sl.SparseL',
+                   and the processes that are quiet in both groups of a pair are not tested. The results are the same;
+                   with a correction, the quiet processes of a pair that can be tested (see 'hf.is_testable') count as
+                   tests with a p-value of 1, so the family is unchanged unless the full test gives no p-value for a
+                   quiet process (e.g. constant values), and 'bh' can only be more conservative. Default is False.
+    :param checkpoint: If True, keeps a checkpoint journal in the output folder, so a crashed run can be resumed with
+                       'resume'. Default is False - no journal is kept.
+    :param threshold: The threshold 'important_l' was selected with, recorded in the journal so a run with another
+                      threshold is not resumed. Default is None.
+    :return: files with new information about sheet 'L' after the analysis.
+    """
+    for fixed_col in fixed_cols:
+        if fixed_col not in ('time', 'dosage'):
+            raise e.InvalidColumnsException(f"The fixed column '{fixed_col}' should be 'time' or 'dosage'")
+
+    journal = None
+    if resume or checkpoint:
+        journal = open_journal(important_l, data_path, save_path, list(fixed_cols), p_value, err_limit_lambda,
+                               pair_schedule, correction, correction_scope, test, resume, threshold)
+    cell_line_list, cell_selections = get_run_selections(important_l, cell_line_list, selections, journal)
+    cache = None if cache_path is None else memo.ResultCache(cache_path)
+    sparse_l = sl.SparseL(important_l, err_limit_lambda) if sparse else None
+
+    with ow.writer_context(writer) as writer:
+        run = AnalysisRun(err_limit_lambda, data_path, p_value, save_path, writer, pair_schedule, test, journal, cache,
+                          workbook, sparse_l)
+        statistics = {}
+        if correction is not None:
+            for fixed_col in fixed_cols:
+                statistics[fixed_col] = collect_L_statistics(important_l, data_path, fixed_col, cell_line_list,
+                                                             cell_selections, pair_schedule, correction,
+                                                             correction_scope, save_path, writer, test, sparse_l)
+
+        for cell_line in cell_line_list:
+            cell_df = important_l.loc[important_l['cell_line_name'] == cell_line]
+            control_list, inhibitor_list = cell_selections[cell_line]
+            group_index = hf.GroupIndex(cell_df, hf.get_analysis_columns(cell_df))
+            for fixed_col in fixed_cols:
+                cell_statistics = None
+                if fixed_col in statistics:
+                    cell_statistics = statistics[fixed_col].loc[
+                        statistics[fixed_col]['cell_line_name'] == cell_line]
+                analyze_cell_line(run, cell_df, cell_line, control_list, inhibitor_list, fixed_col=fixed_col,
+                                  group_index=group_index, statistics=cell_statistics)
+        run.report_power()
+
+
+def analyze_L_background(important_l: pd.DataFrame, err_limit_lambda: float, data_path: str,
+                         fixed_col: str = 'time', p_value: float = 0.05, save_path: str = os.getcwd(),
+                         writer: ow.OutputWriter = None, pair_schedule: str = 'all', correction: str = None,
+                         correction_scope: str = 'cell_line', test: str = 'ttest', cache_path: str = None,
+                         workbook: ow.WorkbookWriter = None, sparse: bool = False):
+    """
+    This function runs 'analyze_L' with the GUI on a background worker thread. The cell line GUI is shown first, then
+    a progress window lists the duration of every output file and can cancel the analysis; the compound GUI of the
+    next cell line is shown while the previous cell line is analyzed. The function returns when the progress window
+    is closed. The plots are drawn off the main thread, so matplotlib is switched to the non-interactive 'Agg'
+    backend for the run, and the previous backend is restored at the end.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+    :param data_path: The path where the original dataframes are stored.
+    :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+    :param p_value: The p-value threshold for determining whether the difference between means is significant. Default is 0.05.
+    :param save_path: The path where the exported data and plots will be saved.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :param pair_schedule: The pairs of an inhibitor with itself, see 'analyze_L_axes'. Default is 'all'.
+    :param correction: The multiple-testing correction of the p-values, see 'analyze_L_axes'. With the 'cell_line'
+                       scope, the p-values of each cell line are adjusted on the worker; with the 'global' scope, the
+                       compounds of all the cell lines are chosen before the analysis starts. The raw and adjusted
+                       p-values of the analyzed cell lines are saved in a 'p_values_by_<fixed_col>.csv' file. Default is
+                       None.
+    :param correction_scope: 'cell_line' or 'global', see 'analyze_L_axes'. Default is 'cell_line'.
+    :param test: The test of the difference between the pairs, see 'analyze_L_axes'. Default is 'ttest'.
+    :param cache_path: The directory of a result cache shared between runs, see 'analyze_L_axes'. Default is None.
+    :param workbook: The workbook of all the results, see 'analyze_L_axes'. Default is None.
+    :param sparse: If True, the processes that are quiet in both groups of a pair are not tested, see
+                   'analyze_L_axes'. Default is False.
+    :return: files with new information about sheet 'L' after the analysis.
+    """
+    previous_backend = plt.get_backend()
+    plt.switch_backend('Agg')
+    try:
+        app = UIf.get_application()  # noqa: F841 - the application must outlive the windows
+        cell_line_list = UIf.pop_up_cell_GUI(important_l)
+        cache = None if cache_path is None else memo.ResultCache(cache_path)
+        sparse_l = sl.SparseL(important_l, err_limit_lambda) if sparse else None
+        selections = None
+        if correction is not None and correction_scope == 'global':
+            selections = {}
+            for cell_line in cell_line_list:
+                cell_df = important_l.loc[important_l['cell_line_name'] == cell_line]
+                selections[cell_line] = UIf.ask_compound_selection(cell_df, cell_line)
+        statistics = []
+
+        with ow.writer_context(writer) as writer:
+            run = AnalysisRun(err_limit_lambda, data_path, p_value, save_path, writer, pair_schedule, test,
+                              cache=cache, workbook=workbook, sparse_l=sparse_l)
+
+            def analyze(cell_line, selection, progress):
+                cell_df = important_l.loc[important_l['cell_line_name'] == cell_line]
+                control_list, inhibitor_list = selection
+                cell_statistics = None
+                if correction is not None:
+                    if selections is None or not statistics:
+                        run_selections = {cell_line: selection} if selections is None else selections
+                        statistics.append(adjust_L_statistics(
+                            compute_L_statistics(important_l, fixed_col=fixed_col, cell_line_list=list(run_selections),
+                                                 selections=run_selections, pair_schedule=pair_schedule, test=test,
+                                                 sparse_l=sparse_l), correction, correction_scope))
+                    cell_statistics = statistics[-1].loc[statistics[-1]['cell_line_name'] == cell_line]
+                analyze_cell_line(run, cell_df, cell_line, control_list, inhibitor_list, fixed_col=fixed_col,
+                                  statistics=cell_statistics, progress=progress)
+
+            worker = pg.AnalysisWorker(analyze)
+            window = pg.ProgressWindow(worker)
+            window.show()
+            worker.start()
+            for cell_line in cell_line_list:
+                if worker.cancelled.is_set():
+                    break
+                if selections is not None:
+                    worker.submit(cell_line, selections[cell_line])
+                    continue
+                cell_df = important_l.loc[important_l['cell_line_name'] == cell_line]
+                worker.submit(cell_line, UIf.ask_compound_selection(cell_df, cell_line))
+            worker.finish()
+            if window.isVisible():
+                UIf.wait_for_window(window)
+            worker.wait()
+            run.report_power()
+            if statistics:
+                save_L_statistics(pd.concat(statistics, ignore_index=True), data_path, fixed_col, save_path, writer)
+    finally:
+        plt.switch_backend(previous_backend)
+
+
+def open_workbook(data_path: str, save_path: str = os.getcwd()) -> ow.WorkbookWriter:
+    """
+    This function opens the workbook of all the results of a dataset, '<dataset>_results.xlsx' in its output folder.
+    It can be given to 'analyze_G' and 'analyze_L' and is saved when it is closed, e.g. at the end of a 'with' block.
+
+    :param data_path: The path where the original dataframes are stored.
+    :param save_path: The path where the exported data and plots will be saved.
+    :return: The workbook writer.
+    """
+    folder_name = UIf.get_folder_name(data_path)
+    folder_path = os.path.join(save_path, folder_name)
+    os.makedirs(folder_path, exist_ok=True)
+    return ow.WorkbookWriter(os.path.join(folder_path, f'{folder_name}_results.xlsx'))
+
+
+def open_journal(important_l: pd.DataFrame, data_path: str, save_path: str, fixed_cols: list, p_value: float,
+                 err_limit_lambda, pair_schedule: str, correction: str, correction_scope: str, test: str,
+                 resume: bool, threshold: int = None) -> cp.CheckpointJournal:
+    """
+    This function opens the checkpoint journal of an 'analyze_L' run in the output folder of the dataset. The content
+    of 'important_l' (its rows, values and kept columns) is part of the parameters, so a journal is not resumed once
+    the data changed.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param save_path: The path where the exported data and plots will be saved.
+    :param fixed_cols: The fixed columns of the run.
+    :param p_value: The p-value threshold of the run.
+    :param err_limit_lambda: The error limit lambda of the run.
+    :param pair_schedule: The pair schedule of the run.
+    :param correction: The multiple-testing correction of the run.
+    :param correction_scope: The family of the correction of the run.
+    :param test: The test of the run.
+    :param resume: If True, continues the journal of a previous run with the same parameters.
+    :param threshold: The threshold 'important_l' was selected with. Default is None.
+    :return: The checkpoint journal.
+    """
+    parameters = {'fixed_cols': fixed_cols, 'p_value': p_value, 'err_limit_lambda': err_limit_lambda,
+                  'pair_schedule': pair_schedule, 'correction': correction, 'correction_scope': correction_scope,
+                  'test': test, 'threshold': threshold, 'data': memo.hash_frame(important_l)}
+    return cp.CheckpointJournal(os.path.join(save_path, UIf.get_folder_name(data_path)), parameters, resume)
+
+
+def get_run_selections(important_l: pd.DataFrame, cell_line_list: list, selections: dict,
+                       journal: cp.CheckpointJournal = None):
+    """
+    This function resolves the cell lines and the compound selections of a run, reusing the ones recorded in the
+    journal, and records them, if there is a journal.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param cell_line_list: The cell lines to analyze. None - taken from the journal or chosen in the GUI.
+    :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple, see
+                       'get_compound_selection'.
+    :param journal: The checkpoint journal of the run, or None.
+    :return: A tuple containing the cell lines and a dictionary of cell line to its (control_list, inhibitor_list).
+    """
+    if journal is not None:
+        cell_line_list = journal.get_cell_lines(cell_line_list)
+    if cell_line_list is None:
+        cell_line_list = UIf.pop_up_cell_GUI(important_l)
+    cell_selections = {}
     for cell_line in cell_line_list:
-        control_list, inhibitor_list = [], []
-        only_avg, control_treatment = True, False
-        for file_iter in range(4):
-            if file_iter == 1:
-                only_avg = False
-            elif file_iter == 2:
-                control_treatment = True
-            elif file_iter == 3:
-                only_avg = True
-
-            keys_to_remove, compound_names = [], []
-            averages = {}
+        cell_selections[cell_line] = None if journal is None else journal.get_selection(cell_line)
+        if cell_selections[cell_line] is None:
             cell_df = important_l.loc[important_l['cell_line_name'] == cell_line]
-            if (len(control_list) == 0) and (len(inhibitor_list) == 0):
-                control_list, inhibitor_list = UIf.pop_up_compound_GUI(cell_df, cell_line)
-            pairs_dict, cl, il = hf.df_to_dict(cell_df, cell_line, control_list, inhibitor_list, control_treatment,
-                                               fixed_col=fixed_col)
+            cell_selections[cell_line] = get_compound_selection(cell_df, cell_line, selections)
+    if journal is not None:
+        journal.record_selections(cell_line_list, cell_selections)
+    return cell_line_list, cell_selections
 
-            sheet_name = UIf.get_sheet_name(cell_line, only_avg, control_treatment, fixed_col)
-            print(f"Analyzing '{sheet_name}'..")
 
-            for key, sub_df in pairs_dict.items():
-                dfs_to_concat = []
-                analysis_cols = hf.get_analysis_columns(sub_df)
-                for process in analysis_cols:
-                    df_first, df_second = hf.get_comparison_data(sub_df, key, process, cl, il, control_treatment,
-                                                                 fixed_col)
-                    df_with_res_row = hf.create_reason_dataframe(sub_df, process, p_value, df_first, df_second,
-                                                                 err_limit_lambda)
-                    if df_with_res_row is not None:
-                        averages[process] = (df_first.mean(), df_second.mean())
-                        dfs_to_concat.append(df_with_res_row)
-
-                if len(dfs_to_concat) == 0:
-                    keys_to_remove.append(key)
-                else:
-                    if only_avg:
-                        dfs_to_concat, compound_names = hf.create_updated_dataframes(dfs_to_concat, averages, sub_df,
-                                                                                     control_treatment, compound_names)
-
-                    new_df = pd.concat(dfs_to_concat, axis=1)
-                    new_df = new_df.reindex(sorted(new_df.columns), axis=1)
-
-                    if only_avg:
-                        pairs_dict[key] = hf.create_pairs_dataframe_only_avg(sub_df, new_df, control_treatment,
-                                                                             fixed_col)
-                    else:
-                        pairs_dict[key] = hf.create_pairs_dataframe_all_data(sub_df, new_df)
-
-            for key in keys_to_remove:
-                pairs_dict.pop(key)
-
-            if pairs_dict:
-                pairs_df = hf.create_pairs_df(pairs_dict)
-                UIf.export_data(file_iter, pairs_df, pairs_dict, cell_line, fixed_col, data_path, save_path, sheet_name)
+def collect_L_statistics(important_l: pd.DataFrame, data_path: str, fixed_col: str, cell_line_list: list,
+                         selections: dict, pair_schedule: str = 'all', correction: str = 'bh',
+                         correction_scope: str = 'cell_line', save_path: str = os.getcwd(),
+                         writer: ow.OutputWriter = None, test: str = 'ttest',
+                         sparse_l: sl.SparseL = None) -> pd.DataFrame:
+    """
+    This function collects the statistics of all the pairs of a run, adjusts their p-values and saves the raw and
+    adjusted p-values in a 'p_values_by_<fixed_col>.csv' file.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param fixed_col: The name of the column that will remain fixed in each pair.
+    :param cell_line_list: The cell lines of the run.
+    :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple.
+    :param pair_schedule: The pairs of an inhibitor with itself, see 'hf.schedule_pairs'. Default is 'all'.
+    :param correction: The multiple-testing correction, see 'adjust_L_statistics'. Default is 'bh'.
+    :param correction_scope: The family of the correction, see 'adjust_L_statistics'. Default is 'cell_line'.
+    :param save_path: The path where the exported data will be saved.
+    :param writer: The background writer of the outputs. Default is None - the file is saved synchronously.
+    :param test: 'ttest' or 'permutation', see 'hf.test_pair'. Default is 'ttest'.
+    :param sparse_l: The entries of 'L' above the error limit, see 'compute_L_statistics'. Default is None.
+    :return: The statistics DataFrame of 'compute_L_statistics' with the adjusted p-values in a 'q' column.
+    """
+    statistics = compute_L_statistics(important_l, fixed_col=fixed_col, cell_line_list=cell_line_list,
+                                      selections=selections, pair_schedule=pair_schedule, test=test,
+                                      sparse_l=sparse_l)
+    statistics = adjust_L_statistics(statistics, correction, correction_scope)
+    save_L_statistics(statistics, data_path, fixed_col, save_path, writer)
+    return statistics
+
+
+def save_L_statistics(statistics: pd.DataFrame, data_path: str, fixed_col: str, save_path: str = os.getcwd(),
+                      writer: ow.OutputWriter = None):
+    """
+    This function saves the raw and adjusted p-values of a run in a 'p_values_by_<fixed_col>.csv' file.
+
+    :param statistics: The adjusted statistics, see 'collect_L_statistics'.
+    :param data_path: The path where the original dataframes are stored.
+    :param fixed_col: The name of the column that remained fixed in each pair.
+    :param save_path: The path where the exported data will be saved.
+    :param writer: The background writer of the outputs. Default is None - the file is saved synchronously.
+    """
+    folder_path = os.path.join(save_path, UIf.get_folder_name(data_path))
+    os.makedirs(folder_path, exist_ok=True)
+    UIf.save_csv(statistics, os.path.join(folder_path, f'p_values_by_{fixed_col}.csv'), writer,
+                 message=f"p_values_by_{fixed_col}.csv created successfully", index=False)
+
+
+def adjust_L_statistics(statistics: pd.DataFrame, correction: str = 'bh',
+                        correction_scope: str = 'cell_line') -> pd.DataFrame:
+    """
+    This function adjusts the p-values of the statistics for multiple testing. The family holds all the pairwise and
+    control-treatment tests of a cell line, or of the whole run.
+
+    :param statistics: The statistics DataFrame, as returned by 'compute_L_statistics'.
+    :param correction: 'bh' (Benjamini-Hochberg) or 'bonferroni', see 'hf.adjust_p_values'. Default is 'bh'.
+    :param correction_scope: 'cell_line' to adjust the p-values of each cell line separately or 'global' to adjust all
+                             of them together. Default is 'cell_line'.
+    :return: A copy of the statistics with the adjusted p-values in a 'q' column.
+    """
+    statistics = statistics.copy()
+    if correction_scope == 'global':
+        statistics['q'] = hf.adjust_p_values(statistics['p'], correction)
+    elif correction_scope == 'cell_line':
+        statistics['q'] = statistics.groupby('cell_line_name', sort=False)['p'].transform(
+            lambda p: hf.adjust_p_values(p, correction))
+    else:
+        raise ValueError(f"Unknown correction scope '{correction_scope}', should be 'cell_line' or 'global'")
+    return statistics
+
+
+class AnalysisRun:
+    def __init__(self, err_limit_lambda: float, data_path: str, p_value: float = 0.05, save_path: str = os.getcwd(),
+                 writer: ow.OutputWriter = None, pair_schedule: str = 'all', test: str = 'ttest',
+                 journal: cp.CheckpointJournal = None, cache: memo.ResultCache = None,
+                 workbook: ow.WorkbookWriter = None, sparse_l: sl.SparseL = None):
+        """
+        This method initializes the settings of an 'L' analysis that are shared by all its cell lines and fixed
+        columns, see 'analyze_L_axes'. The run also collects the group sizes of the pairs that the permutation test
+        can not make significant, see 'check_power'.
+
+        :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+        :param data_path: The path where the original dataframes are stored.
+        :param p_value: The p-value threshold for determining whether the difference between means is significant.
+                        Default is 0.05.
+        :param save_path: The path where the exported data and plots will be saved.
+        :param writer: The background writer of the outputs. Default is None - the outputs are saved synchronously.
+        :param pair_schedule: The pairs of an inhibitor with itself, see 'hf.schedule_pairs'. Default is 'all'.
+        :param test: 'ttest' or 'permutation', see 'hf.test_pair'. Default is 'ttest'.
+        :param journal: The checkpoint journal of the run. If given, the completed output files are skipped and every
+                        new one is recorded once it is written. Default is None.
+        :param cache: The result cache. If given, the result tables of an output file are reused when the cell line,
+                      the selection and the parameters are unchanged, and only the export is run. Default is None.
+        :param workbook: The workbook of all the results, see 'open_workbook'. If given, every result table is also
+                         written as a sheet of it. Default is None.
+        :param sparse_l: The entries of 'L' above the error limit, see 'sl.SparseL'. If given, only the processes that
+                         are active in one of the samples of a pair are tested; the others can not get a reason.
+                         Default is None.
+        """
+        self.err_limit_lambda = err_limit_lambda
+        self.data_path = data_path
+        self.p_value = p_value
+        self.save_path = save_path
+        self.writer = writer
+        self.pair_schedule = pair_schedule
+        self.test = test
+        self.journal = journal
+        self.cache = cache
+        self.workbook = workbook
+        self.sparse_l = sparse_l
+        self.low_power_sizes = set()
+
+    def check_power(self, n_first: int, n_second: int):
+        """
+        This method records the group sizes of a pair if the permutation test can not reach 'p_value' for them.
+
+        :param n_first: The number of samples of the first group.
+        :param n_second: The number of samples of the second group.
+        """
+        if self.test == 'permutation' and perm.get_min_p_value(n_first, n_second) > self.p_value:
+            self.low_power_sizes.add((n_first, n_second))
+
+    def report_power(self):
+        """
+        This method prints the group sizes recorded by 'check_power', once for the whole run.
+        """
+        if self.low_power_sizes:
+            sizes = sorted(self.low_power_sizes)
+            print(f"The permutation test can not reach the p-value {self.p_value} for the group sizes {sizes} (the "
+                  f"smallest p-values are {[round(perm.get_min_p_value(*size), 4) for size in sizes]}), so their pairs "
+                  f"can not get a reason")
+
+
+def analyze_cell_line(run: AnalysisRun, cell_df: pd.DataFrame, cell_line: str, control_list: list,
+                      inhibitor_list: list, fixed_col: str = 'time', group_index: hf.GroupIndex = None,
+                      statistics: pd.DataFrame = None, progress=None):
+    """
+    This function analyzes the pairs of compounds of a single cell line and exports the four result files.
+
+    :param run: The settings of the analysis.
+    :param cell_df: The DataFrame of the cell line, with only the important columns.
+    :param cell_line: The name of the cell line.
+    :param control_list: The control compound list.
+    :param inhibitor_list: The inhibitor compound list.
+    :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+    :param group_index: The group index of the cell line. If given, the statistics are computed from it.
+    :param statistics: The adjusted statistics of the cell line, see 'collect_L_statistics'. If given, the adjusted
+                       p-values are compared with 'p_value' instead of the raw ones.
+    :param progress: A function called as progress(sheet_name, seconds) after every output file, e.g. to report the
+                     progress of a background analysis. It may raise to stop the analysis.
+    :return: files with new information about the cell line after the analysis.
+    """
+    pair_statistics, p_col = None, 'p'
+    if statistics is not None:
+        pair_statistics = {(control_treatment, key): rows.set_index('process') for (control_treatment, key), rows in
+                           statistics.groupby(['control_treatment', 'pair'], sort=False)}
+        p_col = 'q'
+
+    only_avg, control_treatment = True, False
+    for file_iter in range(4):
+        if file_iter == 1:
+            only_avg = False
+        elif file_iter == 2:
+            control_treatment = True
+        elif file_iter == 3:
+            only_avg = True
+
+        if run.journal is not None and run.journal.is_done(cell_line, fixed_col, file_iter):
+            continue
+
+        stage_start = time.perf_counter()
+        sheet_name = UIf.get_sheet_name(cell_line, only_avg, control_treatment, fixed_col)
+        print(f"Analyzing '{sheet_name}'..")
+
+        pairs_dict, cache_key = None, None
+        if run.cache is not None:
+            cache_key = run.cache.get_key(cell_df, control_list, inhibitor_list, fixed_col, run.p_value,
+                                          run.err_limit_lambda, run.pair_schedule, run.test, statistics, file_iter)
+            pairs_dict = run.cache.get(cache_key)
+        if pairs_dict is None:
+            pairs_dict = analyze_pairs(run, cell_df, cell_line, control_list, inhibitor_list, fixed_col, only_avg,
+                                       control_treatment, group_index, pair_statistics, p_col)
+            if run.cache is not None:
+                run.cache.put(cache_key, pairs_dict)
+
+        if pairs_dict:
+            pairs_df = hf.create_pairs_df(pairs_dict)
+            UIf.export_data(file_iter, pairs_df, pairs_dict, cell_line, fixed_col, run.data_path, run.save_path,
+                            sheet_name, run.writer, run.workbook)
+
+        else:
+            print(f"No interesting data found for '{sheet_name}'\n")
+
+        if run.journal is not None:
+            run.journal.mark_done(cell_line, fixed_col, file_iter, run.writer)
+        if progress is not None:
+            progress(sheet_name, time.perf_counter() - stage_start)
+
+
+def analyze_pairs(run: AnalysisRun, cell_df: pd.DataFrame, cell_line: str, control_list: list,
+                  inhibitor_list: list, fixed_col: str, only_avg: bool, control_treatment: bool,
+                  group_index: hf.GroupIndex = None, pair_statistics: dict = None, p_col: str = 'p') -> dict:
+    """
+    This function builds the result tables of one output file of a cell line: the pairs of compounds with their
+    significant processes and reasons.
+
+    :param run: The settings of the analysis.
+    :param cell_df: The DataFrame of the cell line, with only the important columns.
+    :param cell_line: The name of the cell line.
+    :param control_list: The control compound list.
+    :param inhibitor_list: The inhibitor compound list.
+    :param fixed_col: The name of the column that will remain fixed in each pair.
+    :param only_avg: Flag indicating whether only the averages of the pairs are kept.
+    :param control_treatment: Flag indicating whether the controls are compared with the treatments as single units.
+    :param group_index: The group index of the cell line. If given, the statistics are computed from it.
+    :param pair_statistics: A dictionary of (control_treatment, key) to the precomputed statistics of the pair, e.g.
+                            the adjusted ones. Default is None - the statistics are computed.
+    :param p_col: The column of the p-values compared with 'p_value'. Default is 'p'.
+    :return: A dictionary of pair key to its result DataFrame, without the pairs that have no significant process.
+    """
+    keys_to_remove, compound_names = [], []
+    averages = {}
+    pairs_dict, cl, il = hf.df_to_dict(cell_df, cell_line, control_list, inhibitor_list, control_treatment,
+                                       fixed_col=fixed_col, schedule=run.pair_schedule,
+                                       sort_key=UIf.get_fixed_col_parser(fixed_col))
+
+    for key, sub_df in pairs_dict.items():
+        dfs_to_concat = []
+        analysis_cols = hf.get_analysis_columns(sub_df)
+        if run.sparse_l is not None:
+            first_mask, second_mask = hf.get_comparison_masks(sub_df, key, cl, il, control_treatment, fixed_col)
+            analysis_cols = run.sparse_l.get_active_processes(sub_df.index[first_mask | second_mask], analysis_cols)
+            if not analysis_cols:
+                keys_to_remove.append(key)
+                continue
+
+        if pair_statistics is not None:
+            stats = pair_statistics[(control_treatment, key)]
+            if run.sparse_l is not None:
+                stats = stats.loc[analysis_cols]
+        elif group_index is None:
+            stats = hf.compute_pair_statistics(sub_df, key, analysis_cols, cl, il, control_treatment, fixed_col,
+                                               run.test)
+        else:
+            stats = hf.compute_pair_statistics_from_index(group_index, key, cl, il, control_treatment, fixed_col,
+                                                          run.test, analysis_cols if run.sparse_l is not None else None)
+        if len(stats):
+            run.check_power(int(stats['n_first'].iloc[0]), int(stats['n_second'].iloc[0]))
+        reasons = hf.get_reasons(stats, run.p_value, run.err_limit_lambda, p_col)
+        for process, reason in reasons.items():
+            averages[process] = (stats.at[process, 'mean_first'], stats.at[process, 'mean_second'])
+            dfs_to_concat.append(hf.add_reason_row(sub_df, process, reason))
+
+        if len(dfs_to_concat) == 0:
+            keys_to_remove.append(key)
+        else:
+            if only_avg:
+                dfs_to_concat, compound_names = hf.create_updated_dataframes(dfs_to_concat, averages, sub_df,
+                                                                             control_treatment, compound_names)
+
+            new_df = pd.concat(dfs_to_concat, axis=1)
+            new_df = new_df.reindex(sorted(new_df.columns), axis=1)
 
+            if only_avg:
+                pairs_dict[key] = hf.create_pairs_dataframe_only_avg(sub_df, new_df, control_treatment, fixed_col)
             else:
-                print(f"No interesting data found for '{sheet_name}'\n")
+                pairs_dict[key] = hf.create_pairs_dataframe_all_data(sub_df, new_df)
+
+    for key in keys_to_remove:
+        pairs_dict.pop(key)
+    return pairs_dict
+
+
+def compute_L_statistics(l_df: pd.DataFrame, fixed_col: str = 'time', cell_line_list: list = None,
+                         selections: dict = None, pair_schedule: str = 'all', test: str = 'ttest',
+                         sparse_l: sl.SparseL = None) -> pd.DataFrame:
+    """
+    This function computes the raw statistics (counts, means and p-values) of every pair and every process once, for
+    both the pairwise and the control-treatment comparisons, so they can be reused by 'sweep_L'.
+
+    :param l_df: The 'L' DataFrame. All the processes are used, so the statistics do not depend on 'important_L'.
+    :param fixed_col: The name of the column that will remain fixed in each pair. Default is 'time'.
+    :param cell_line_list: The cell lines to analyze. Default is all the cell lines.
+    :param selections: A dictionary of cell line to a (control_list, inhibitor_list) tuple. Cell lines that are missing
+                       get the default split of 'get_default_compound_lists'.
+    :param pair_schedule: The pairs of an inhibitor with itself at different fixed column values: 'all', 'adjacent' or
+                          'baseline', see 'hf.schedule_pairs'. Default is 'all'.
+    :param test: The test of the difference between the pairs: 'ttest' or 'permutation', see 'hf.test_pair'.
+                 Default is 'ttest'.
+    :param sparse_l: The entries of 'l_df' above the error limit, see 'sl.SparseL'. If given, only the processes that
+                     are active in one of the samples of a pair are tested; the others get a p-value of 1 if the pair
+                     can be tested, see 'hf.is_testable'. Default is None - all the processes are tested.
+    :return: A DataFrame with a row per (cell line, comparison, pair, process).
+    """
+    valid.is_valid_L(l_df)
+    if cell_line_list is None:
+        cell_line_list = l_df['cell_line_name'].unique().tolist()
+    if selections is None:
+        selections = {}
+
+    stats_list = []
+    for cell_line in cell_line_list:
+        cell_df = l_df.loc[l_df['cell_line_name'] == cell_line]
+        control_list, inhibitor_list = get_compound_selection(cell_df, cell_line, selections)
+        for control_treatment in (False, True):
+            pairs_dict, cl, il = hf.df_to_dict(cell_df, cell_line, control_list, inhibitor_list, control_treatment,
+                                               fixed_col=fixed_col, schedule=pair_schedule,
+                                               sort_key=UIf.get_fixed_col_parser(fixed_col))
+            for key, sub_df in pairs_dict.items():
+                analysis_cols, test_cols = hf.get_analysis_columns(sub_df), None
+                if sparse_l is not None:
+                    first_mask, second_mask = hf.get_comparison_masks(sub_df, key, cl, il, control_treatment,
+                                                                      fixed_col)
+                    test_cols = sparse_l.get_active_processes(sub_df.index[first_mask | second_mask], analysis_cols)
+                stats = hf.compute_pair_statistics(sub_df, key, analysis_cols, cl, il, control_treatment, fixed_col,
+                                                   test, test_cols)
+                stats.insert(0, 'cell_line_name', cell_line)
+                stats.insert(1, 'control_treatment', control_treatment)
+                stats.insert(2, 'pair', [key] * len(stats))
+                stats_list.append(stats.rename_axis('process').reset_index())
+
+    if not stats_list:
+        return pd.DataFrame(columns=['process', 'cell_line_name', 'control_treatment', 'pair', 'n_first', 'n_second',
+                                     'mean_first', 'mean_second', 'p'])
+    return pd.concat(stats_list, ignore_index=True)
+
+
+def sweep_L(l_df: pd.DataFrame, statistics: pd.DataFrame, p_values: list, thresholds: list,
+            err_limit_lambdas: list) -> pd.DataFrame:
+    """
+    This function evaluates a grid of 'p_value', 'important_L' threshold and error limit lambda settings against the
+    statistics computed once by 'compute_L_statistics', without redoing any statistical test.
+
+    :param l_df: The 'L' DataFrame the statistics were computed from.
+    :param statistics: The statistics DataFrame returned by 'compute_L_statistics'.
+    :param p_values: The p-value thresholds to evaluate.
+    :param thresholds: The 'important_L' thresholds to evaluate.
+    :param err_limit_lambdas: The error limit lambdas to evaluate.
+    :return: A DataFrame with a row per grid point and comparison type, holding the number of important processes,
+             the number of reasons, the number of processes with at least one reason and the number of pairs with at
+             least one reason.
+    """
+    valid.is_valid_L(l_df)
+    if any(threshold < 0 for threshold in thresholds):
+        raise e.NegativeNumberException("Threshold should be positive number")
+
+    analysis_cols = hf.get_analysis_columns(l_df)
+    abs_values = l_df[analysis_cols].abs()
+
+    rows = []
+    for err_limit_lambda in err_limit_lambdas:
+        counts = (abs_values > hf.get_error_limits(err_limit_lambda, analysis_cols)).sum()
+        for threshold in thresholds:
+            important_processes = counts.index[counts >= threshold]
+            stats = statistics.loc[statistics['process'].isin(important_processes)]
+            for p_value in p_values:
+                keep = hf.get_significance_flags(stats, p_value, err_limit_lambda)['keep']
+                for control_treatment in (False, True):
+                    kept = stats.loc[keep & (stats['control_treatment'] == control_treatment)]
+                    rows.append({'err_limit_lambda': err_limit_lambda,
+                                 'threshold': threshold,
+                                 'p_value': p_value,
+                                 'control_treatment': control_treatment,
+                                 'important_processes': len(important_processes),
+                                 'reasons': len(kept),
+                                 'processes': kept['process'].nunique(),
+                                 'pairs': kept[['cell_line_name', 'pair']].drop_duplicates().shape[0]})
+
+    return pd.DataFrame(rows)
+
+
+def save_edge_overlap(g_df: pd.DataFrame, edge_positions: dict, G_path: str, writer: ow.OutputWriter = None):
+    """
+    This function encodes the lower and upper edges of every process as bitsets over the proteins and saves the
+    process x process overlap of the edge sets ('edges_overlap.csv' and 'edges_jaccard.csv') and the number of edge
+    sets every protein belongs to ('edges_recurrence.csv').
+
+    :param g_df: The G_values DataFrame.
+    :param edge_positions: A dictionary of (process, 'lower' or 'upper') to the positions of the edge proteins in g_df.
+    :param G_path: The path of the 'G' output folder.
+    :param writer: The background writer of the outputs. Default is None - the outputs are saved synchronously.
+    """
+    labels = [f'{process}_{side}' for process, side in edge_positions]
+    packed = hf.pack_edge_sets(list(edge_positions.values()), len(g_df))
+    intersections, jaccard = hf.get_edge_overlap(packed)
+
+    members = np.unpackbits(packed, axis=1, count=len(g_df)).astype(bool)
+    lower = np.array([side == 'lower' for _, side in edge_positions])
+    recurrence = pd.DataFrame({'UID': g_df['UID'],
+                               'lower_count': members[lower].sum(axis=0),
+                               'upper_count': members[~lower].sum(axis=0)})
+    recurrence['total_count'] = recurrence['lower_count'] + recurrence['upper_count']
+    recurrence = recurrence.loc[recurrence['total_count'] > 0].sort_values('total_count', ascending=False,
+                                                                          kind='stable')
+
+    UIf.save_csv(pd.DataFrame(intersections, index=labels, columns=labels), os.path.join(G_path, 'edges_overlap.csv'),
+                 writer)
+    UIf.save_csv(pd.DataFrame(jaccard, index=labels, columns=labels), os.path.join(G_path, 'edges_jaccard.csv'),
+                 writer)
+    UIf.save_csv(recurrence, os.path.join(G_path, 'edges_recurrence.csv'), writer, index=False)
 
 
 def analyze_G(g_df: pd.DataFrame, important_l: pd.DataFrame, data_path: str, save_path: str = os.getcwd(),
-              edge_percents: float = 0.1):
+              edge_percents: float = 0.1, writer: ow.OutputWriter = None, workbook: ow.WorkbookWriter = None):
     """
     This function accepts columns representing processes and sorts for each process its proteins.
     In addition, the function saves the plot of each process.
@@ -183,6 +850,9 @@ def analyze_G(g_df: pd.DataFrame, important_l: pd.DataFrame, data_path: str, sav
     :param data_path: The path where the original dataframes are stored.
     :param save_path: The path where the exported data and plots will be saved.
     :param edge_percents: The percentage of proteins to be considered as the edge for each process. The default is 0.1 (10%).
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :param workbook: The workbook of all the results, see 'open_workbook'. If given, the 'sort_G' and 'edges' tables
+                     are also written as sheets of it. Default is None.
     :return: files with new information about sheet 'G' after the analysis.
     """
     valid.is_valid_path(data_path, directory=False)
@@ -195,35 +865,47 @@ def analyze_G(g_df: pd.DataFrame, important_l: pd.DataFrame, data_path: str, sav
     cols = hf.get_analysis_columns(important_l)
     important_g = pd.DataFrame(columns=pd.MultiIndex.from_product([cols, ['UID', 'Effect']]))
     edges = pd.DataFrame(columns=pd.MultiIndex.from_product([cols, ['UID', 'Effect']]))
+    edge_positions = {}
 
-    names_g, values_g = {}, {}
-    for col in important_g.columns:
-        if col[1] == 'UID':
-            names_g = g_df[col[1]].to_dict()
-        else:
-            values_g = g_df[col[0]].to_dict()
-            sorted_values_g = dict(sorted(values_g.items(), key=lambda item: item[1]))
-            list_values_g = list(sorted_values_g.values())
-
-            sorted_names_g = dict(sorted(names_g.items(), key=lambda item: sorted_values_g[item[0]]))
-            list_names_g = list(sorted_names_g.values())
-
-            os.makedirs(graph_save_path, exist_ok=True)
-            UIf.plot_G_values(f'Process {col[0]}', list_names_g, list_values_g, graph_save_path, edge_percents)
-
-            lower_edges, lower_values, upper_edges, upper_values = hf.find_edges(list_names_g, list_values_g,
-                                                                                 edge_percents)
-            full_edges_list = lower_edges + upper_edges
-            full_values_list = lower_values + upper_values
-
-            edges[(col[0], 'UID')] = full_edges_list
-            edges[col] = full_values_list
-
-            important_g[(col[0], 'UID')] = list_names_g
-            important_g[col] = list_values_g
-
-    edges_save_path = os.path.join(G_path, 'edges.csv')
-    important_g_save_path = os.path.join(G_path, 'sort_G.csv')
-
-    edges.to_csv(edges_save_path, index=False)
-    important_g.to_csv(important_g_save_path, index=False)
+    with ow.writer_context(writer) as writer:
+        names_g, values_g = {}, {}
+        for col in important_g.columns:
+            if col[1] == 'UID':
+                names_g = g_df[col[1]].to_dict()
+            else:
+                values_g = g_df[col[0]].to_dict()
+                sorted_values_g = dict(sorted(values_g.items(), key=lambda item: item[1]))
+                list_values_g = list(sorted_values_g.values())
+
+                sorted_names_g = dict(sorted(names_g.items(), key=lambda item: sorted_values_g[item[0]]))
+                list_names_g = list(sorted_names_g.values())
+
+                os.makedirs(graph_save_path, exist_ok=True)
+                UIf.plot_G_values(f'Process {col[0]}', list_names_g, list_values_g, graph_save_path, edge_percents,
+                                  writer)
+
+                lower_edges, lower_values, upper_edges, upper_values = hf.find_edges(list_names_g, list_values_g,
+                                                                                     edge_percents)
+                full_edges_list = lower_edges + upper_edges
+                full_values_list = lower_values + upper_values
+
+                sorted_positions = g_df.index.get_indexer(list(sorted_names_g.keys()))
+                lower_positions, _, upper_positions, _ = hf.find_edges(sorted_positions, list_values_g, edge_percents)
+                edge_positions[(col[0], 'lower')] = lower_positions
+                edge_positions[(col[0], 'upper')] = upper_positions
+
+                edges[(col[0], 'UID')] = full_edges_list
+                edges[col] = full_values_list
+
+                important_g[(col[0], 'UID')] = list_names_g
+                important_g[col] = list_values_g
+
+        edges_save_path = os.path.join(G_path, 'edges.csv')
+        important_g_save_path = os.path.join(G_path, 'sort_G.csv')
+
+        UIf.save_csv(edges, edges_save_path, writer, index=False)
+        UIf.save_csv(important_g, important_g_save_path, writer, index=False)
+        if workbook is not None:
+            workbook.add_sheet(important_g, 'sort_G', index=False)
+            workbook.add_sheet(edges, 'edges', index=False)
+        save_edge_overlap(g_df, edge_positions, G_path, writer)
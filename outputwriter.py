@@ -0,0 +1,319 @@
+import io
+import os
+import atexit
+import tempfile
+import threading
+import contextlib
+import openpyxl
+import numpy as np
+import pandas as pd
+from openpyxl.cell import WriteOnlyCell
+from openpyxl.styles import Alignment
+from openpyxl.utils import get_column_letter
+from concurrent.futures import ThreadPoolExecutor
+
+
+def atomic_write(data: bytes, path: str):
+    """
+    This function writes data to a temporary file next to the destination and renames it over the destination, so a
+    partially written file is never visible under the final name.
+
+    :param data: The bytes to write.
+    :param path: The destination path.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(path) + '.', suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp_file:
+            tmp_file.write(data)
+        os.replace(tmp_path, path)
+    except BaseException:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def save_csv(df: pd.DataFrame, path: str, **to_csv_kwargs):
+    """
+    This function serializes a DataFrame to CSV and writes it atomically.
+
+    :param df: The DataFrame to save.
+    :param path: The destination path.
+    :param to_csv_kwargs: Keyword arguments passed to 'DataFrame.to_csv'.
+    """
+    buffer = io.StringIO()
+    df.to_csv(buffer, **to_csv_kwargs)
+    atomic_write(buffer.getvalue().encode('utf-8'), path)
+
+
+def render_figure(fig, path: str, **savefig_kwargs) -> bytes:
+    """
+    This function renders a matplotlib figure into memory, in the format given by the extension of the path.
+
+    :param fig: The figure to render.
+    :param path: The destination path of the figure.
+    :param savefig_kwargs: Keyword arguments passed to 'Figure.savefig'.
+    :return: The rendered figure.
+    """
+    buffer = io.BytesIO()
+    fig.savefig(buffer, format=os.path.splitext(path)[1][1:].lower(), **savefig_kwargs)
+    return buffer.getvalue()
+
+
+class OutputWriter:
+    def __init__(self, max_workers: int = 2, max_pending: int = 32):
+        """
+        This method initializes a background writer. Completed tables and rendered figures are handed to a pool of
+        writer threads, so the analysis does not wait on the disk. At most 'max_pending' writes are queued, after which
+        the caller blocks until a write completes. Pending writes are flushed on exit.
+
+        :param max_workers: The number of writer threads.
+        :param max_pending: The maximal number of queued writes.
+        """
+        self.executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='OutputWriter')
+        self.slots = threading.BoundedSemaphore(max_pending)
+        self.lock = threading.Lock()
+        self.futures = []
+        self.closed = False
+        atexit.register(self.close)
+
+    def submit(self, func, *args, **kwargs):
+        """
+        This method queues a write. An error raised by an earlier write is propagated here.
+
+        :param func: The function performing the write.
+        :param args: Positional arguments passed to 'func'.
+        :param kwargs: Keyword arguments passed to 'func'.
+        """
+        if self.closed:
+            raise RuntimeError("The writer is closed")
+        self.raise_errors(wait=False)
+        self.slots.acquire()
+        try:
+            future = self.executor.submit(func, *args, **kwargs)
+        except BaseException:
+            self.slots.release()
+            raise
+        future.add_done_callback(lambda _: self.slots.release())
+        with self.lock:
+            self.futures.append(future)
+
+    def submit_csv(self, df: pd.DataFrame, path: str, **to_csv_kwargs):
+        """
+        This method queues the CSV export of a completed DataFrame.
+
+        :param df: The DataFrame to save. It should not be modified after it was submitted.
+        :param path: The destination path.
+        :param to_csv_kwargs: Keyword arguments passed to 'DataFrame.to_csv'.
+        """
+        self.submit(save_csv, df, path, **to_csv_kwargs)
+
+    def submit_figure(self, fig, path: str, **savefig_kwargs):
+        """
+        This method renders a figure on the calling thread (matplotlib is not thread safe) and queues the write of
+        the rendered buffer.
+
+        :param fig: The figure to save. It can be closed once this method returns.
+        :param path: The destination path.
+        :param savefig_kwargs: Keyword arguments passed to 'Figure.savefig'.
+        """
+        self.submit(atomic_write, render_figure(fig, path, **savefig_kwargs), path)
+
+    def raise_errors(self, wait: bool = True):
+        """
+        This method re-raises the first error of the completed writes.
+
+        :param wait: If True, waits for all the queued writes first.
+        """
+        with self.lock:
+            futures = list(self.futures)
+        if wait:
+            for future in futures:
+                future.exception()
+        done = [future for future in futures if future.done()]
+        with self.lock:
+            self.futures = [future for future in self.futures if future not in done]
+        for future in done:
+            if future.exception() is not None:
+                raise future.exception()
+
+    def when_done(self, callback):
+        """
+        This method calls a function once all the writes queued so far are completed, without waiting for them. The
+        function is called on a writer thread, or at once if nothing is pending, and is not called if one of the
+        writes fails; the error is raised by a later 'submit' or 'flush'.
+
+        :param callback: The function to call, without arguments.
+        """
+        with self.lock:
+            futures = list(self.futures)
+        if any(future.done() and (future.cancelled() or future.exception() is not None) for future in futures):
+            return
+        pending = [future for future in futures if not future.done()]
+        if not pending:
+            callback()
+            return
+
+        count_lock = threading.Lock()
+        state = {'remaining': len(pending), 'failed': False}
+
+        def on_done(future):
+            with count_lock:
+                state['failed'] |= future.cancelled() or future.exception() is not None
+                state['remaining'] -= 1
+                call = state['remaining'] == 0 and not state['failed']
+            if call:
+                callback()
+
+        for future in pending:
+            future.add_done_callback(on_done)
+
+    def flush(self):
+        """
+        This method waits for all the queued writes and raises the first error, if any.
+        """
+        self.raise_errors(wait=True)
+
+    def close(self):
+        """
+        This method flushes the queued writes and stops the writer threads.
+        """
+        if self.closed:
+            return
+        try:
+            self.flush()
+        finally:
+            self.closed = True
+            self.executor.shutdown(wait=True)
+            atexit.unregister(self.close)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:
+            try:
+                self.close()
+            except Exception:
+                pass
+
+
+class WorkbookWriter:
+    INVALID_SHEET_CHARS = '[]:*?/\\'
+
+    def __init__(self, path: str):
+        """
+        This method opens a workbook that is streamed to disk in a single pass with the write-only engine of openpyxl:
+        every sheet is written once, row by row, and is not kept in memory, so the memory does not grow with the number
+        of sheets. The workbook is saved atomically by 'close'.
+
+        :param path: The path of the '.xlsx' file.
+        """
+        self.path = path
+        self.workbook = openpyxl.Workbook(write_only=True)
+        self.sheet_names = set()
+        self.alignment = Alignment(horizontal='center')
+        self.lock = threading.Lock()
+        self.closed = False
+
+    def get_sheet_name(self, name: str) -> str:
+        """
+        This method turns a name into a valid and unique sheet name: at most 31 characters, without the characters
+        that Excel does not allow.
+
+        :param name: The requested name.
+        :return: The sheet name.
+        """
+        name = ''.join('_' if char in self.INVALID_SHEET_CHARS else char for char in str(name))[:31] or 'Sheet'
+        sheet_name, suffix = name, 1
+        while sheet_name.lower() in self.sheet_names:
+            suffix += 1
+            sheet_name = f'{name[:31 - len(str(suffix)) - 1]}~{suffix}'
+        self.sheet_names.add(sheet_name.lower())
+        return sheet_name
+
+    def add_sheet(self, df: pd.DataFrame, sheet_name: str, index: bool = True) -> str:
+        """
+        This method writes a DataFrame as a new sheet, with a header row per level of the columns, like 'to_csv'. The
+        column widths are computed from the data and the header rows are frozen, as in
+        'UIFunctions.create_new_sheet'.
+
+        :param df: The DataFrame to write.
+        :param sheet_name: The name of the sheet.
+        :param index: If True, the index is written as the first column. Default is True.
+        :return: The name of the sheet, after 'get_sheet_name'.
+        """
+        columns = df.columns.to_frame(index=False).to_numpy(dtype=object).T.tolist()
+        values = df.to_numpy(dtype=object)
+        values[pd.isna(df).to_numpy()] = None
+        if index:
+            index_name = df.index.name if df.index.name is not None else ''
+            columns = [[index_name if level == 0 else ''] + row for level, row in enumerate(columns)]
+            values = np.column_stack([df.index.to_numpy(dtype=object), values]) if len(values) else values
+        if len(values) == 0:
+            values = np.empty((0, len(columns[0]) if columns else 0), dtype=object)
+
+        with self.lock:
+            if self.closed:
+                raise RuntimeError("The workbook is closed")
+            sheet_name = self.get_sheet_name(sheet_name)
+            worksheet = self.workbook.create_sheet(sheet_name)
+            for col in range(len(columns[0]) if columns else 0):
+                lengths = [len(str(row[col])) for row in columns if row[col] is not None]
+                lengths += [len(str(value)) for value in values[:, col] if value is not None]
+                worksheet.column_dimensions[get_column_letter(col + 1)].width = (max(lengths, default=0) + 1) * 1.1
+            worksheet.freeze_panes = f'A{len(columns) + 1}'
+
+            for row in columns:
+                worksheet.append([value.item() if isinstance(value, np.generic) else value for value in row])
+            for row in values:
+                cells = []
+                for value in row:
+                    cell = WriteOnlyCell(worksheet, value=value.item() if isinstance(value, np.generic) else value)
+                    cell.alignment = self.alignment
+                    cells.append(cell)
+                worksheet.append(cells)
+        return sheet_name
+
+    def close(self):
+        """
+        This method saves the workbook next to its destination and renames it over the destination.
+        """
+        with self.lock:
+            if self.closed:
+                return
+            self.closed = True
+            if not self.sheet_names:
+                self.workbook.create_sheet('Empty')
+            directory = os.path.dirname(os.path.abspath(self.path))
+            fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.' + os.path.basename(self.path) + '.',
+                                            suffix='.tmp')
+            os.close(fd)
+            try:
+                self.workbook.save(tmp_path)
+                os.replace(tmp_path, self.path)
+            except BaseException:
+                if os.path.exists(tmp_path):
+                    os.remove(tmp_path)
+                raise
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+
+def writer_context(writer: OutputWriter = None):
+    """
+    This function returns a context that provides a writer: the given writer, which stays open, or a new writer that is
+    flushed and closed when the context exits.
+
+    :param writer: The writer to use. Default is None - a new writer is created.
+    :return: A context manager providing the writer.
+    """
+    if writer is None:
+        return OutputWriter()
+    return contextlib.nullcontext(writer)
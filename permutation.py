@@ -0,0 +1,78 @@
+import itertools
+from functools import lru_cache
+from math import comb
+import numpy as np
+
+MAX_PERMUTATIONS = 10000
+
+
+@lru_cache(maxsize=128)
+def get_permutation_weights(n_first: int, n_second: int, max_permutations: int = MAX_PERMUTATIONS,
+                            seed: int = 0) -> np.ndarray:
+    """
+    This function returns the label permutations of two groups as a weight matrix: a row per permutation, with
+    1 / n_first for the samples labelled as the first group and -1 / n_second for the others, so that multiplying it
+    by the pooled samples gives the difference of means of every permutation. The matrices are cached by group sizes
+    and shared between all the pairs with the same sizes.
+
+    :param n_first: The number of samples of the first group.
+    :param n_second: The number of samples of the second group.
+    :param max_permutations: The maximal number of permutations. If the groups have more label permutations, a Monte
+                             Carlo sample of them is drawn.
+    :param seed: The seed of the random generator of the Monte Carlo sample.
+    :return: A read-only weight matrix. Its first row is the observed labelling (the first n_first samples).
+    """
+    n = n_first + n_second
+    if comb(n, n_first) <= max_permutations:
+        first_idx = np.array(list(itertools.combinations(range(n), n_first)))
+    else:
+        rng = np.random.default_rng(seed)
+        shuffled = rng.permuted(np.tile(np.arange(n), (max_permutations, 1)), axis=1)[:, :n_first]
+        first_idx = np.vstack([np.arange(n_first), shuffled])
+
+    weights = np.full((len(first_idx), n), -1 / n_second)
+    np.put_along_axis(weights, first_idx, 1 / n_first, axis=1)
+    weights.flags.writeable = False
+    return weights
+
+
+def get_min_p_value(n_first: int, n_second: int, max_permutations: int = MAX_PERMUTATIONS) -> float:
+    """
+    This function returns the smallest p-value the permutation test can give for two group sizes. With exact
+    enumeration it is 1 / C(n, n_first), doubled for equal groups since the mirrored labelling always ties, e.g. 1 for
+    1 vs 1 and 1/3 for 2 vs 2 samples; with a Monte Carlo sample it is 1 / (max_permutations + 1).
+
+    :param n_first: The number of samples of the first group.
+    :param n_second: The number of samples of the second group.
+    :param max_permutations: The maximal number of permutations. Default is MAX_PERMUTATIONS.
+    :return: The smallest achievable p-value, NaN if one of the groups is empty.
+    """
+    if n_first == 0 or n_second == 0:
+        return np.nan
+    n_labellings = comb(n_first + n_second, n_first)
+    if n_labellings > max_permutations:
+        return 1 / (max_permutations + 1)
+    return (2 if n_first == n_second else 1) / n_labellings
+
+
+def permutation_test(first: np.ndarray, second: np.ndarray, max_permutations: int = MAX_PERMUTATIONS,
+                     seed: int = 0) -> np.ndarray:
+    """
+    This function runs a two-sided permutation test of the difference of means for all the processes at once. The
+    permutations are enumerated exactly when there are at most 'max_permutations' of them, and sampled otherwise.
+    Small groups can not give small p-values, see 'get_min_p_value'.
+
+    :param first: The samples of the first group, a row per sample and a column per process.
+    :param second: The samples of the second group, a row per sample and a column per process.
+    :param max_permutations: The maximal number of permutations. Default is MAX_PERMUTATIONS.
+    :param seed: The seed of the random generator of the Monte Carlo sample. Default is 0.
+    :return: The p-value of every process, NaN if one of the groups is empty.
+    """
+    if len(first) == 0 or len(second) == 0:
+        return np.full(first.shape[1], np.nan)
+    weights = get_permutation_weights(len(first), len(second), max_permutations, seed)
+    differences = weights @ np.vstack([first, second])
+    observed = np.abs(differences[0])
+    # A relative tolerance keeps the permutations that tie with the observed difference up to rounding
+    extreme = np.abs(differences) >= observed * (1 - 1e-9)
+    return extreme.sum(axis=0) / len(weights)
@@ -0,0 +1,140 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy.optimize import linear_sum_assignment
+import exceptions as e
+import validation as valid
+import UIFunctions as UIf
+import outputwriter as ow
+
+
+def align_G(g_dfs: dict) -> tuple:
+    """
+    This function aligns the G sheets of several datasets on the UIDs they all share. Duplicated UIDs within a sheet
+    are averaged.
+
+    :param g_dfs: A dictionary of dataset name to its 'G' DataFrame.
+    :return: A tuple containing the shared UIDs and a dictionary of dataset name to its G values on the shared UIDs,
+             a DataFrame indexed by UID with a column per process.
+    """
+    aligned = {}
+    for name, g_df in g_dfs.items():
+        valid.is_valid_G(g_df)
+        aligned[name] = g_df.groupby('UID', sort=False).mean()
+
+    shared = None
+    for g_values in aligned.values():
+        shared = g_values.index if shared is None else shared.intersection(g_values.index, sort=False)
+    if shared is None or len(shared) < 3:
+        raise e.InvalidUIDException("The datasets should share at least 3 UIDs")
+    return shared, {name: g_values.loc[shared] for name, g_values in aligned.items()}
+
+
+def standardize(values: np.ndarray) -> np.ndarray:
+    """
+    This function standardizes every column to a zero mean and a unit norm, so that the product of two standardized
+    matrices is their correlation matrix. Constant columns are set to zero.
+
+    :param values: The matrix, a row per UID and a column per process.
+    :return: The standardized matrix.
+    """
+    centered = values - values.mean(axis=0)
+    norms = np.linalg.norm(centered, axis=0)
+    norms[norms == 0] = np.inf
+    return centered / norms
+
+
+def correlate_processes(g_first: pd.DataFrame, g_second: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function computes the Pearson correlation of every process of a dataset with every process of another one,
+    with a single matrix multiply of the standardized G columns.
+
+    :param g_first: The aligned G values of the first dataset.
+    :param g_second: The aligned G values of the second dataset, on the same UIDs.
+    :return: The (first processes x second processes) correlation DataFrame.
+    """
+    correlation = standardize(g_first.to_numpy(dtype=float)).T @ standardize(g_second.to_numpy(dtype=float))
+    return pd.DataFrame(correlation, index=g_first.columns, columns=g_second.columns)
+
+
+def match_processes(correlation: pd.DataFrame) -> pd.DataFrame:
+    """
+    This function matches the processes of two datasets one to one, maximizing the total absolute correlation with an
+    optimal assignment. A process is determined up to its sign, so an anti-correlated process is a match with a
+    flipped sign.
+
+    :param correlation: The correlation DataFrame of 'correlate_processes'.
+    :return: A DataFrame with a row per matched pair: 'reference_process', 'process', 'correlation' and 'sign'.
+    """
+    reference_idx, process_idx = linear_sum_assignment(-np.abs(correlation.to_numpy()))
+    matched = correlation.to_numpy()[reference_idx, process_idx]
+    return pd.DataFrame({'reference_process': correlation.index[reference_idx],
+                         'process': correlation.columns[process_idx],
+                         'correlation': matched,
+                         'sign': np.where(matched < 0, -1, 1)})
+
+
+def match_datasets(g_dfs: dict, reference: str = None, processes: dict = None):
+    """
+    This function matches the processes of every dataset with the processes of a reference dataset.
+
+    :param g_dfs: A dictionary of dataset name to its 'G' DataFrame.
+    :param reference: The name of the reference dataset. Default is the first dataset.
+    :param processes: A dictionary of dataset name to the processes to match, e.g. the important processes. Default is
+                      None - all the processes are matched.
+    :return: A tuple containing the mapping DataFrame, with a row per matched process of every other dataset, and a
+             dictionary of dataset name to its correlation DataFrame with the reference.
+    """
+    if reference is None:
+        reference = next(iter(g_dfs))
+    if reference not in g_dfs:
+        raise e.InvalidDataSetException(f"The reference dataset '{reference}' is not in the datasets")
+    shared, aligned = align_G(g_dfs)
+    if processes is not None:
+        aligned = {name: g_values[list(processes[name])] if name in processes else g_values
+                   for name, g_values in aligned.items()}
+
+    mappings, correlations = [], {}
+    for name, g_values in aligned.items():
+        if name == reference:
+            continue
+        correlations[name] = correlate_processes(aligned[reference], g_values)
+        mapping = match_processes(correlations[name])
+        mapping.insert(0, 'dataset', name)
+        mapping.insert(1, 'reference_dataset', reference)
+        mapping['shared_uids'] = len(shared)
+        mappings.append(mapping)
+
+    columns = ['dataset', 'reference_dataset', 'reference_process', 'process', 'correlation', 'sign', 'shared_uids']
+    if not mappings:
+        return pd.DataFrame(columns=columns), correlations
+    return pd.concat(mappings, ignore_index=True)[columns], correlations
+
+
+def analyze_process_matching(data_paths: list, reference: str = None, processes: dict = None,
+                             save_path: str = os.getcwd(), writer: ow.OutputWriter = None) -> pd.DataFrame:
+    """
+    This function matches the processes of several workbooks and saves a 'process_matching.csv' mapping table and a
+    'process_correlation_<dataset>.csv' correlation matrix per matched dataset. The datasets are named as their output
+    folders, so the table can be joined with the 'analyze_G' outputs on ('dataset', 'process').
+
+    :param data_paths: The paths of the workbooks.
+    :param reference: The name of the reference dataset. Default is the first workbook.
+    :param processes: A dictionary of dataset name to the processes to match. Default is all the processes.
+    :param save_path: The path where the exported data will be saved.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :return: The mapping DataFrame.
+    """
+    valid.is_valid_path(save_path)
+    g_dfs = {}
+    for data_path in data_paths:
+        valid.is_valid_path(data_path, directory=False)
+        g_dfs[UIf.get_folder_name(data_path)] = pd.read_excel(data_path, sheet_name='G').fillna(0)
+
+    mapping, correlations = match_datasets(g_dfs, reference=reference, processes=processes)
+    with ow.writer_context(writer) as writer:
+        UIf.save_csv(mapping, os.path.join(save_path, 'process_matching.csv'), writer,
+                     message="process_matching.csv created successfully", index=False)
+        for name, correlation in correlations.items():
+            UIf.save_csv(correlation, os.path.join(save_path, f'process_correlation_{name}.csv'), writer)
+    return mapping
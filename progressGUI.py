@@ -0,0 +1,211 @@
+import time
+import queue
+import threading
+from PyQt5.QtCore import QThread, pyqtSignal
+from PyQt5.QtGui import QFont
+from PyQt5.QtWidgets import QWidget, QTableWidget, QTableWidgetItem, QPushButton, QLabel, QVBoxLayout, \
+    QHeaderView
+import exceptions as e
+
+
+class AnalysisWorker(QThread):
+    stage_finished = pyqtSignal(str, str, float)
+    cell_line_started = pyqtSignal(str)
+    cell_line_finished = pyqtSignal(str, float)
+    failed = pyqtSignal(str, str)
+
+    def __init__(self, task):
+        """
+        This method initializes a worker thread that analyzes the cell lines in the order they are submitted, so the
+        selection of the next cell line can be made while the previous one is analyzed.
+
+        :param task: The analysis of a cell line, called as task(cell_line, selection, progress), where progress is
+                     called as progress(stage, seconds) after every stage and raises
+                     'AnalysisCancelledException' once the worker is cancelled.
+        """
+        super().__init__()
+        self.task = task
+        self.jobs = queue.Queue()
+        self.cancelled = threading.Event()
+
+    def submit(self, cell_line: str, selection: tuple):
+        """
+        This method queues the analysis of a cell line.
+
+        :param cell_line: The name of the cell line.
+        :param selection: A tuple containing the control list and the inhibitor list.
+        """
+        self.jobs.put((cell_line, selection))
+
+    def finish(self):
+        """
+        This method tells the worker that no more cell lines will be submitted.
+        """
+        self.jobs.put(None)
+
+    def cancel(self):
+        """
+        This method stops the worker after its current stage and drops the queued cell lines.
+        """
+        self.cancelled.set()
+        self.jobs.put(None)
+
+    def run(self):
+        """
+        This method analyzes the submitted cell lines until 'finish' or 'cancel' is called.
+        """
+        while True:
+            job = self.jobs.get()
+            if job is None or self.cancelled.is_set():
+                return
+            cell_line, selection = job
+            self.cell_line_started.emit(cell_line)
+            start = time.perf_counter()
+
+            def progress(stage: str, seconds: float):
+                self.stage_finished.emit(cell_line, stage, seconds)
+                if self.cancelled.is_set():
+                    raise e.AnalysisCancelledException(f"The analysis was cancelled during '{cell_line}'")
+
+            try:
+                self.task(cell_line, selection, progress)
+            except e.AnalysisCancelledException:
+                return
+            except Exception as ex:
+                self.failed.emit(cell_line, f"{type(ex).__name__}: {ex}")
+                continue
+            self.cell_line_finished.emit(cell_line, time.perf_counter() - start)
+
+
+class ProgressWindow(QWidget):
+    closed = pyqtSignal()
+
+    def __init__(self, worker: AnalysisWorker):
+        """
+        This method initializes a window that shows the progress of an analysis worker: a row per finished stage with
+        its duration, and a button to cancel the analysis, which becomes a close button when the worker is done.
+
+        :param worker: The analysis worker.
+        """
+        super().__init__()
+        self.worker = worker
+        self.resize(500, 400)
+        self.setWindowTitle("Analysis progress")
+
+        font = QFont('sans-serif', 10)
+
+        self.status_label = QLabel("Waiting for the first cell line..")
+        self.status_label.setFont(font)
+
+        self.table = QTableWidget(0, 3)
+        self.table.setHorizontalHeaderLabels(["Cell line", "Stage", "Seconds"])
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Stretch)
+        self.table.setFont(font)
+
+        self.cancel_button = QPushButton("Cancel")
+        self.cancel_button.clicked.connect(self.cancel)
+        self.cancel_button.setStyleSheet("""
+                    QPushButton {
+                        border: 1px solid black;
+                        color: black;
+                        border-radius: 5px;
+                        padding: 5px;
+                        font-family: sans-serif
+
+                    }
+                    QPushButton:hover {
+                        background-color: #e41b1b;
+                        cursor:pointer;
+                    }
+                """)
+
+        layout = QVBoxLayout()
+        layout.addWidget(self.status_label)
+        layout.addWidget(self.table)
+        layout.addWidget(self.cancel_button)
+        self.setLayout(layout)
+
+        worker.cell_line_started.connect(self.on_cell_line_started)
+        worker.stage_finished.connect(self.on_stage_finished)
+        worker.cell_line_finished.connect(self.on_cell_line_finished)
+        worker.failed.connect(self.on_failed)
+        worker.finished.connect(self.on_worker_finished)
+
+    def add_row(self, cell_line: str, stage: str, seconds: str):
+        """
+        This method adds a row to the progress table.
+
+        :param cell_line: The name of the cell line.
+        :param stage: The name of the stage.
+        :param seconds: The duration of the stage, as text.
+        """
+        row = self.table.rowCount()
+        self.table.insertRow(row)
+        for col, text in enumerate([cell_line, stage, seconds]):
+            self.table.setItem(row, col, QTableWidgetItem(text))
+        self.table.scrollToBottom()
+
+    def on_cell_line_started(self, cell_line: str):
+        """
+        This method shows the cell line that is being analyzed.
+
+        :param cell_line: The name of the cell line.
+        """
+        self.status_label.setText(f"Analyzing '{cell_line}'..")
+
+    def on_stage_finished(self, cell_line: str, stage: str, seconds: float):
+        """
+        This method adds the duration of a finished stage.
+
+        :param cell_line: The name of the cell line.
+        :param stage: The name of the stage.
+        :param seconds: The duration of the stage.
+        """
+        self.add_row(cell_line, stage, f"{seconds:.2f}")
+
+    def on_cell_line_finished(self, cell_line: str, seconds: float):
+        """
+        This method adds the total duration of a finished cell line.
+
+        :param cell_line: The name of the cell line.
+        :param seconds: The duration of the cell line.
+        """
+        self.add_row(cell_line, "total", f"{seconds:.2f}")
+        self.status_label.setText(f"'{cell_line}' done, waiting for the next cell line..")
+
+    def on_failed(self, cell_line: str, message: str):
+        """
+        This method shows the error of a cell line that failed.
+
+        :param cell_line: The name of the cell line.
+        :param message: The error message.
+        """
+        self.add_row(cell_line, "failed", message)
+
+    def on_worker_finished(self):
+        """
+        This method shows that the worker is done and turns the cancel button into a close button.
+        """
+        self.status_label.setText("Cancelled" if self.worker.cancelled.is_set() else "Done")
+        self.cancel_button.setText("Close")
+
+    def cancel(self):
+        """
+        This method cancels the analysis, or closes the window once the worker is done.
+        """
+        if self.worker.isFinished():
+            self.close()
+        else:
+            self.status_label.setText("Cancelling after the current stage..")
+            self.worker.cancel()
+
+    def closeEvent(self, event):
+        """
+        This method cancels the analysis when the window is closed before the worker is done.
+
+        :param event: The close event object.
+        """
+        if not self.worker.isFinished():
+            self.worker.cancel()
+        self.closed.emit()
+        event.accept()
@@ -0,0 +1,292 @@
+from abc import ABC, abstractmethod
+import numpy as np
+import pandas as pd
+import UIFunctions as UIf
+import exceptions as e
+
+
+class Predicate(ABC):
+    @abstractmethod
+    def get_columns(self) -> set:
+        """
+        This method returns the columns the predicate reads.
+
+        :return: A set of column names.
+        """
+
+    @abstractmethod
+    def evaluate(self, df: pd.DataFrame, codes: dict) -> np.ndarray:
+        """
+        This method evaluates the predicate on every row.
+
+        :param df: The DataFrame to filter.
+        :param codes: A dictionary of column name to the (codes, uniques) of 'pd.factorize', shared by all the
+                      predicates of a query, so every column is scanned once.
+        :return: A boolean array with an entry per row.
+        """
+
+    def __and__(self, other):
+        return And(self, other)
+
+    def __or__(self, other):
+        return Or(self, other)
+
+    def __invert__(self):
+        return Not(self)
+
+
+class ValuePredicate(Predicate):
+    def __init__(self, col: str):
+        """
+        This method initializes a predicate on the values of a single column. The condition is checked once per
+        distinct value, and the rows take the result of their value.
+
+        :param col: The name of the column.
+        """
+        self.col = col
+
+    def get_columns(self) -> set:
+        """
+        This method returns the column the predicate reads.
+
+        :return: A set with the column name.
+        """
+        return {self.col}
+
+    @abstractmethod
+    def check_values(self, values: pd.Index) -> np.ndarray:
+        """
+        This method checks the condition on the distinct values of the column.
+
+        :param values: The distinct values.
+        :return: A boolean array with an entry per distinct value.
+        """
+
+    def evaluate(self, df: pd.DataFrame, codes: dict) -> np.ndarray:
+        """
+        This method evaluates the predicate on every row.
+
+        :param df: The DataFrame to filter.
+        :param codes: A dictionary of column name to the (codes, uniques) of 'pd.factorize'.
+        :return: A boolean array with an entry per row.
+        """
+        value_codes, uniques = codes[self.col]
+        matches = np.append(self.check_values(uniques), False)
+        return matches[value_codes]
+
+
+class Isin(ValuePredicate):
+    def __init__(self, col: str, values: list):
+        """
+        This method initializes a membership predicate, as in 'filter_by_col'.
+
+        :param col: The name of the column.
+        :param values: The values that are kept.
+        """
+        super().__init__(col)
+        self.values = list(values)
+
+    def check_values(self, values: pd.Index) -> np.ndarray:
+        """
+        This method checks which distinct values are in the kept values.
+
+        :param values: The distinct values.
+        :return: A boolean array with an entry per distinct value.
+        """
+        return np.asarray(values.isin(self.values), dtype=bool)
+
+    def __repr__(self):
+        return f"Isin({self.col!r}, {self.values!r})"
+
+
+class Between(ValuePredicate):
+    def __init__(self, col: str, low=None, high=None, inclusive: bool = True):
+        """
+        This method initializes a range predicate on the parsed values of the 'time' or 'dosage' column, see
+        'UIf.get_fixed_col_parser'. Values of the column that can not be parsed are not in any range.
+
+        :param col: The name of the column, 'time' or 'dosage'.
+        :param low: The lower bound, a string in the units of the column (e.g. '24hr', '1nm') or a parsed number.
+                    Default is None - no lower bound.
+        :param high: The upper bound, as 'low'. Default is None - no upper bound.
+        :param inclusive: Whether the bounds are included. Default is True.
+        :raises InvalidColumnsException: If the column is not 'time' or 'dosage', or a bound can not be parsed.
+        """
+        if col not in ('time', 'dosage'):
+            raise e.InvalidColumnsException(f"Between supports only the 'time' and 'dosage' columns, got {col!r}")
+        super().__init__(col)
+        self.parser = UIf.get_fixed_col_parser(col)
+        self.low = self.parse_bound(low)
+        self.high = self.parse_bound(high)
+        self.inclusive = inclusive
+
+    def parse_bound(self, bound):
+        """
+        This method parses a bound of the range.
+
+        :param bound: The bound, a string in the units of the column, a number or None.
+        :return: The parsed bound, or None if there is no bound.
+        :raises InvalidColumnsException: If the bound can not be parsed.
+        """
+        if bound is None:
+            return None
+        parsed = self.parse(bound) if isinstance(bound, str) else float(bound)
+        if np.isnan(parsed):
+            raise e.InvalidColumnsException(f"The bound {bound!r} can not be parsed as a {self.col} value")
+        return parsed
+
+    def parse(self, value) -> float:
+        """
+        This method parses a value of the column.
+
+        :param value: The value, e.g. '24hr'.
+        :return: The parsed value, or NaN if it can not be parsed.
+        """
+        try:
+            return float(self.parser(str(value)))
+        except (IndexError, ValueError):
+            return np.nan
+
+    def check_values(self, values: pd.Index) -> np.ndarray:
+        """
+        This method checks which distinct values are within the bounds.
+
+        :param values: The distinct values.
+        :return: A boolean array with an entry per distinct value.
+        """
+        parsed = np.array([self.parse(value) for value in values], dtype=float)
+        matches = ~np.isnan(parsed)
+        if self.low is not None:
+            matches &= parsed >= self.low if self.inclusive else parsed > self.low
+        if self.high is not None:
+            matches &= parsed <= self.high if self.inclusive else parsed < self.high
+        return matches
+
+    def __repr__(self):
+        return f"Between({self.col!r}, {self.low!r}, {self.high!r}, inclusive={self.inclusive})"
+
+
+class And(Predicate):
+    def __init__(self, *predicates: Predicate):
+        """
+        This method initializes the conjunction of predicates. Nested conjunctions are flattened.
+
+        :param predicates: The predicates that must all hold.
+        """
+        self.predicates = []
+        for predicate in predicates:
+            self.predicates.extend(predicate.predicates if isinstance(predicate, And) else [predicate])
+
+    def get_columns(self) -> set:
+        """
+        This method returns the columns the predicates read.
+
+        :return: A set of column names.
+        """
+        return set().union(*(predicate.get_columns() for predicate in self.predicates))
+
+    def evaluate(self, df: pd.DataFrame, codes: dict) -> np.ndarray:
+        """
+        This method evaluates the predicates and combines them. The evaluation stops once no row is left.
+
+        :param df: The DataFrame to filter.
+        :param codes: A dictionary of column name to the (codes, uniques) of 'pd.factorize'.
+        :return: A boolean array with an entry per row.
+        """
+        mask = np.ones(len(df), dtype=bool)
+        for predicate in self.predicates:
+            mask &= predicate.evaluate(df, codes)
+            if not mask.any():
+                break
+        return mask
+
+    def __repr__(self):
+        return ' & '.join(f"({predicate!r})" for predicate in self.predicates)
+
+
+class Or(Predicate):
+    def __init__(self, *predicates: Predicate):
+        """
+        This method initializes the disjunction of predicates. Nested disjunctions are flattened.
+
+        :param predicates: The predicates of which at least one must hold.
+        """
+        self.predicates = []
+        for predicate in predicates:
+            self.predicates.extend(predicate.predicates if isinstance(predicate, Or) else [predicate])
+
+    def get_columns(self) -> set:
+        """
+        This method returns the columns the predicates read.
+
+        :return: A set of column names.
+        """
+        return set().union(*(predicate.get_columns() for predicate in self.predicates))
+
+    def evaluate(self, df: pd.DataFrame, codes: dict) -> np.ndarray:
+        """
+        This method evaluates the predicates and combines them. The evaluation stops once all the rows are kept.
+
+        :param df: The DataFrame to filter.
+        :param codes: A dictionary of column name to the (codes, uniques) of 'pd.factorize'.
+        :return: A boolean array with an entry per row.
+        """
+        mask = np.zeros(len(df), dtype=bool)
+        for predicate in self.predicates:
+            mask |= predicate.evaluate(df, codes)
+            if mask.all():
+                break
+        return mask
+
+    def __repr__(self):
+        return ' | '.join(f"({predicate!r})" for predicate in self.predicates)
+
+
+class Not(Predicate):
+    def __init__(self, predicate: Predicate):
+        """
+        This method initializes the negation of a predicate.
+
+        :param predicate: The predicate that must not hold.
+        """
+        self.predicate = predicate
+
+    def get_columns(self) -> set:
+        """
+        This method returns the columns the predicate reads.
+
+        :return: A set of column names.
+        """
+        return self.predicate.get_columns()
+
+    def evaluate(self, df: pd.DataFrame, codes: dict) -> np.ndarray:
+        """
+        This method evaluates the predicate and negates it.
+
+        :param df: The DataFrame to filter.
+        :param codes: A dictionary of column name to the (codes, uniques) of 'pd.factorize'.
+        :return: A boolean array with an entry per row.
+        """
+        return ~self.predicate.evaluate(df, codes)
+
+    def __invert__(self):
+        return self.predicate
+
+    def __repr__(self):
+        return f"~({self.predicate!r})"
+
+
+def get_mask(df: pd.DataFrame, predicate: Predicate) -> np.ndarray:
+    """
+    This function evaluates a predicate into a single boolean mask. Every column the predicate reads is factorized once,
+    and every condition is checked on the distinct values of its column only.
+
+    :param df: The DataFrame to filter.
+    :param predicate: The predicate, e.g. Isin('dosage', ['1nm', '40nm']) & ~Between('time', high='0hr').
+    :return: A boolean array with an entry per row.
+    """
+    missing = sorted(predicate.get_columns() - set(df.columns))
+    if missing:
+        raise e.InvalidColumnsException(f"The columns {missing} are not in the DataFrame")
+    codes = {col: pd.factorize(df[col], use_na_sentinel=True) for col in predicate.get_columns()}
+    return predicate.evaluate(df, codes)
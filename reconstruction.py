@@ -0,0 +1,183 @@
+import os
+import numpy as np
+import pandas as pd
+import exceptions as e
+import validation as valid
+import UIFunctions as UIf
+import helpfunctions as hf
+import outputwriter as ow
+
+
+def get_factors(g_df: pd.DataFrame, l_df: pd.DataFrame, processes: list = None, samples: list = None):
+    """
+    This function selects the G columns and the L amplitudes of the given processes and samples.
+
+    :param g_df: The 'G' DataFrame.
+    :param l_df: The 'L' DataFrame.
+    :param processes: The processes to use. Default is all the processes of 'L' that are in 'G'.
+    :param samples: The row labels of the samples in 'L'. Default is all the samples.
+    :return: A tuple containing the G matrix (proteins x processes), the L matrix (samples x processes), the processes
+             and the 'L' rows of the samples.
+    """
+    valid.is_valid_G(g_df)
+    valid.is_valid_L(l_df)
+    if processes is None:
+        processes = [process for process in hf.get_analysis_columns(l_df) if process in g_df.columns]
+    missing = [process for process in processes if process not in g_df.columns or process not in l_df.columns]
+    if missing:
+        raise e.InvalidColumnsException(f"The processes {missing} should be in both 'G' and 'L'")
+
+    if samples is not None:
+        missing = pd.Index(samples).difference(l_df.index)
+        if len(missing) > 0:
+            raise e.InvalidDataSetException(f"The samples {list(missing)} are not in 'L'")
+        l_df = l_df.loc[samples]
+
+    g_matrix = g_df[processes].to_numpy(dtype=float)
+    l_matrix = l_df[processes].to_numpy(dtype=float)
+    return g_matrix, l_matrix, list(processes), l_df
+
+
+def reconstruct(g_df: pd.DataFrame, l_df: pd.DataFrame, processes: list = None, samples: list = None,
+                out_path: str = None, tile_size: int = 4096):
+    """
+    This function reconstructs the log-expression G * L' of the given processes and samples. The product is computed
+    in tiles of proteins, so that with 'out_path' only a single tile is held in memory.
+
+    :param g_df: The 'G' DataFrame.
+    :param l_df: The 'L' DataFrame.
+    :param processes: The processes to sum. Default is all the processes of 'L' that are in 'G'.
+    :param samples: The row labels of the samples in 'L'. Default is all the samples.
+    :param out_path: The path of a '.npy' file to write the (proteins x samples) result into as a memory map.
+                     Default is None - the result is returned as a DataFrame.
+    :param tile_size: The number of proteins per tile. Default is 4096.
+    :return: A DataFrame indexed by UID with a column per sample ('L' row label), or the memory-mapped array if
+             'out_path' is given.
+    """
+    g_matrix, l_matrix, processes, sample_df = get_factors(g_df, l_df, processes, samples)
+    shape = (g_matrix.shape[0], l_matrix.shape[0])
+    if out_path is None:
+        out = np.empty(shape)
+    else:
+        out = np.lib.format.open_memmap(out_path, mode='w+', dtype=np.float64, shape=shape)
+
+    l_transposed = np.ascontiguousarray(l_matrix.T)
+    for start in range(0, shape[0], tile_size):
+        np.matmul(g_matrix[start:start + tile_size], l_transposed, out=out[start:start + tile_size])
+
+    if out_path is not None:
+        out.flush()
+        return out
+    return pd.DataFrame(out, index=g_df['UID'], columns=sample_df.index)
+
+
+def get_top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """
+    This function returns the row positions of the k largest values of every column, in decreasing order.
+
+    :param values: The matrix, a row per protein.
+    :param k: The number of rows to keep.
+    :return: A (k x columns) array of row positions.
+    """
+    k = min(k, values.shape[0])
+    top = np.argpartition(-values, k - 1, axis=0)[:k]
+    order = np.argsort(-np.take_along_axis(values, top, axis=0), axis=0, kind='stable')
+    return np.take_along_axis(top, order, axis=0)
+
+
+def top_contributions(g_df: pd.DataFrame, l_df: pd.DataFrame, k: int = 10, processes: list = None,
+                      samples: list = None, direction: str = 'abs', combine: bool = False,
+                      tile_size: int = 256) -> pd.DataFrame:
+    """
+    This function finds the proteins that contribute the most to the given processes in the given samples, without
+    materializing the (proteins x samples x processes) contribution tensor. The contribution of a protein to a
+    process in a sample is G[protein, process] * L[sample, process].
+
+    Per process, the ranking of the proteins only depends on the sign of the amplitude, so it is computed once per
+    process and sign. With 'combine', the contributions are summed over the processes and ranked per sample, in tiles
+    of samples.
+
+    :param g_df: The 'G' DataFrame.
+    :param l_df: The 'L' DataFrame.
+    :param k: The number of proteins per (sample, process). Default is 10.
+    :param processes: The processes to query. Default is all the processes of 'L' that are in 'G'.
+    :param samples: The row labels of the samples in 'L'. Default is all the samples.
+    :param direction: 'abs' for the largest absolute contributions, 'positive' for the largest contributions or
+                      'negative' for the smallest ones. Default is 'abs'.
+    :param combine: If True, ranks the sum of the contributions of all the processes per sample. Default is False.
+    :param tile_size: The number of samples per tile of the combined ranking. Default is 256.
+    :return: A DataFrame with a row per (sample, process, rank): the 'L' row label of the sample and its description,
+             the 'UID' and the 'contribution' of the protein. With 'combine', the 'process' column is 'combined'.
+    """
+    if direction not in ('abs', 'positive', 'negative'):
+        raise ValueError(f"Unknown direction '{direction}', should be 'abs', 'positive' or 'negative'")
+    if k <= 0:
+        raise e.NegativeNumberException("k should be positive number")
+    g_matrix, l_matrix, processes, sample_df = get_factors(g_df, l_df, processes, samples)
+    sample_labels = sample_df.index.to_numpy()
+    uids = g_df['UID'].to_numpy()
+
+    def score(contributions):
+        if direction == 'abs':
+            return np.abs(contributions)
+        return contributions if direction == 'positive' else -contributions
+
+    results = []
+    if combine:
+        for start in range(0, len(sample_labels), tile_size):
+            contributions = g_matrix @ l_matrix[start:start + tile_size].T
+            top = get_top_k(score(contributions), k)
+            n_tile = contributions.shape[1]
+            results.append(pd.DataFrame({
+                'sample': np.repeat(sample_labels[start:start + tile_size], top.shape[0]),
+                'process': 'combined',
+                'rank': np.tile(np.arange(1, top.shape[0] + 1), n_tile),
+                'UID': uids[top.T.ravel()],
+                'contribution': np.take_along_axis(contributions, top, axis=0).T.ravel()}))
+    else:
+        # The k best proteins of a process for a positive and for a negative amplitude
+        top_positive = get_top_k(score(g_matrix), k)
+        top_negative = get_top_k(score(-g_matrix), k)
+        for j, process in enumerate(processes):
+            amplitudes = l_matrix[:, j]
+            top = np.where(amplitudes[None, :] >= 0, top_positive[:, [j]], top_negative[:, [j]])
+            contributions = g_matrix[top, j] * amplitudes[None, :]
+            results.append(pd.DataFrame({
+                'sample': np.repeat(sample_labels, top.shape[0]),
+                'process': process,
+                'rank': np.tile(np.arange(1, top.shape[0] + 1), len(sample_labels)),
+                'UID': uids[top.T.ravel()],
+                'contribution': contributions.T.ravel()}))
+
+    description_cols = ['cell_line_name', 'compound_name', 'dosage', 'time']
+    if not results:
+        return pd.DataFrame(columns=['sample'] + description_cols + ['process', 'rank', 'UID', 'contribution'])
+    results = pd.concat(results, ignore_index=True)
+    description = sample_df[description_cols].loc[results['sample']].reset_index(drop=True)
+    return pd.concat([results[['sample']], description, results.drop(columns='sample')], axis=1)
+
+
+def analyze_contributions(g_df: pd.DataFrame, important_l: pd.DataFrame, data_path: str, k: int = 10,
+                          samples: list = None, direction: str = 'abs', save_path: str = os.getcwd(),
+                          writer: ow.OutputWriter = None) -> pd.DataFrame:
+    """
+    This function runs 'top_contributions' on the important processes and saves a 'top_contributions.csv' file in the
+    'G' folder.
+
+    :param g_df: The 'G' DataFrame.
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param k: The number of proteins per (sample, process). Default is 10.
+    :param samples: The row labels of the samples in 'L'. Default is all the samples.
+    :param direction: 'abs', 'positive' or 'negative', see 'top_contributions'. Default is 'abs'.
+    :param save_path: The path where the exported data will be saved.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :return: The top contributions DataFrame.
+    """
+    results = top_contributions(g_df, important_l, k=k, samples=samples, direction=direction)
+    G_path = os.path.join(save_path, UIf.get_folder_name(data_path), 'G')
+    os.makedirs(G_path, exist_ok=True)
+    with ow.writer_context(writer) as writer:
+        UIf.save_csv(results, os.path.join(G_path, 'top_contributions.csv'), writer,
+                     message="top_contributions.csv created successfully", index=False)
+    return results
@@ -0,0 +1,425 @@
+import os
+import sys
+import json
+import time
+import asyncio
+import argparse
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import pandas as pd
+import exceptions as e
+import helpfunctions as hf
+import oncosensepy as osp
+
+HOST = '127.0.0.1'
+DEFAULT_PORT = 8765
+
+
+class Dataset:
+    def __init__(self, data_path: str, threshold: int = 2, max_statistics: int = 1024):
+        """
+        This method loads a workbook once and keeps its indexed structures: the 'L' and 'G' DataFrames, the important
+        'L', a group index per cell line and an LRU-bounded cache of pair statistics.
+
+        :param data_path: The path of the workbook.
+        :param threshold: The 'important_L' threshold.
+        :param max_statistics: The maximal number of cached pair statistics.
+        """
+        self.data_path = data_path
+        self.l_df, self.g_df, self.err_limit_lambda = osp.get_LGE_data(data_path)
+        self.important_l = osp.important_L(self.l_df, self.err_limit_lambda, threshold)
+        self.cell_dfs = {cell_line: cell_df for cell_line, cell_df in
+                         self.important_l.groupby('cell_line_name', sort=False)}
+        self.group_indexes = {}
+        self.pairs = {}
+        self.statistics = OrderedDict()
+        self.max_statistics = max_statistics
+        self.lock = threading.Lock()
+
+    def get_cell_df(self, cell_line: str) -> pd.DataFrame:
+        """
+        This method returns the important 'L' rows of a cell line.
+
+        :param cell_line: The name of the cell line.
+        :return: The DataFrame of the cell line.
+        """
+        if cell_line not in self.cell_dfs:
+            raise e.InvalidCellLineException(f"The cell line '{cell_line}' is not in the dataset")
+        return self.cell_dfs[cell_line]
+
+    def get_group_index(self, cell_line: str) -> hf.GroupIndex:
+        """
+        This method returns the group index of a cell line, building it on first use.
+
+        :param cell_line: The name of the cell line.
+        :return: The group index.
+        """
+        with self.lock:
+            if cell_line not in self.group_indexes:
+                cell_df = self.get_cell_df(cell_line)
+                self.group_indexes[cell_line] = hf.GroupIndex(cell_df, hf.get_analysis_columns(cell_df))
+            return self.group_indexes[cell_line]
+
+    def get_pairs(self, cell_line: str, fixed_col: str, control_treatment: bool) -> list:
+        """
+        This method returns the pair keys of a cell line with the default compound split.
+
+        :param cell_line: The name of the cell line.
+        :param fixed_col: The name of the fixed column.
+        :param control_treatment: Flag indicating whether to list the control-treatment pairs.
+        :return: A list of pair keys.
+        """
+        with self.lock:
+            pairs_key = (cell_line, fixed_col, control_treatment)
+            if pairs_key not in self.pairs:
+                cell_df = self.get_cell_df(cell_line)
+                control_list, inhibitor_list = hf.get_default_compound_lists(cell_df)
+                pairs_dict, _, _ = hf.df_to_dict(cell_df, cell_line, control_list, inhibitor_list, control_treatment,
+                                                 fixed_col=fixed_col)
+                self.pairs[pairs_key] = list(pairs_dict)
+            return self.pairs[pairs_key]
+
+    def get_pair_statistics(self, key: tuple, control_treatment: bool, fixed_col: str,
+                            test: str = 'ttest') -> pd.DataFrame:
+        """
+        This method returns the statistics of a pair from the group index of its cell line, through the LRU cache.
+
+        :param key: The key of the pair, as built by 'hf.df_to_dict'.
+        :param control_treatment: Flag indicating whether the pair is a control-treatment pair.
+        :param fixed_col: The name of the fixed column.
+        :param test: 'ttest' or 'permutation', see 'hf.test_pair'. Default is 'ttest'.
+        :return: The statistics DataFrame of 'hf.compute_pair_statistics_from_index'.
+        """
+        statistics_key = (key, control_treatment, fixed_col, test)
+        with self.lock:
+            if statistics_key in self.statistics:
+                self.statistics.move_to_end(statistics_key)
+                return self.statistics[statistics_key]
+        group_index = self.get_group_index(key[0])
+        control_list, inhibitor_list = hf.get_default_compound_lists(self.get_cell_df(key[0]))
+        stats = hf.compute_pair_statistics_from_index(group_index, key, control_list, inhibitor_list,
+                                                      control_treatment, fixed_col, test)
+        with self.lock:
+            self.statistics[statistics_key] = stats
+            if len(self.statistics) > self.max_statistics:
+                self.statistics.popitem(last=False)
+        return stats
+
+
+class DatasetCache:
+    def __init__(self, data_dir: str, max_datasets: int = 4, threshold: int = 2):
+        """
+        This method creates an LRU-bounded cache of the loaded datasets of a data directory.
+
+        :param data_dir: The directory of the workbooks that can be queried.
+        :param max_datasets: The maximal number of datasets kept in memory.
+        :param threshold: The 'important_L' threshold of the datasets.
+        """
+        self.data_dir = os.path.abspath(data_dir)
+        self.max_datasets = max_datasets
+        self.threshold = threshold
+        self.datasets = OrderedDict()
+        self.loading = {}
+        self.lock = threading.Lock()
+
+    def list_workbooks(self) -> list:
+        """
+        This method lists the workbooks of the data directory.
+
+        :return: The workbook names, without the extension.
+        """
+        return sorted(os.path.splitext(name)[0] for name in os.listdir(self.data_dir)
+                      if name.endswith('.xlsx') and not name.startswith('~$'))
+
+    def get(self, name: str) -> Dataset:
+        """
+        This method returns a dataset, loading it on first use and evicting the least recently used dataset when the
+        cache is full. The workbook is loaded outside the lock of the cache, so the queries of the other datasets are
+        not blocked; concurrent queries of the same dataset wait for a single load.
+
+        :param name: The workbook name, without the extension.
+        :return: The dataset.
+        """
+        if name not in self.list_workbooks():
+            raise e.InvalidPathException(f"There is no workbook '{name}' in '{self.data_dir}'")
+        with self.lock:
+            if name in self.datasets:
+                self.datasets.move_to_end(name)
+                return self.datasets[name]
+            future = self.loading.get(name)
+            if future is None:
+                future = self.loading[name] = Future()
+                loader = True
+            else:
+                loader = False
+        if not loader:
+            return future.result()
+
+        try:
+            dataset = Dataset(os.path.join(self.data_dir, name + '.xlsx'), threshold=self.threshold)
+        except BaseException as ex:
+            with self.lock:
+                self.loading.pop(name, None)
+            future.set_exception(ex)
+            raise
+        with self.lock:
+            self.loading.pop(name, None)
+            self.datasets[name] = dataset
+            if len(self.datasets) > self.max_datasets:
+                self.datasets.popitem(last=False)
+        future.set_result(dataset)
+        return dataset
+
+
+def to_records(df: pd.DataFrame) -> list:
+    """
+    This function converts a DataFrame to JSON-ready records, with NaN as null.
+
+    :param df: The DataFrame.
+    :return: A list of dictionaries.
+    """
+    return json.loads(df.to_json(orient='records'))
+
+
+def get_param(params: dict, name: str, default=None, required: bool = True):
+    """
+    This function returns a query parameter.
+
+    :param params: The parsed query string.
+    :param name: The name of the parameter.
+    :param default: The default value of an optional parameter.
+    :param required: If True, a missing parameter is an error. Default is True.
+    :return: The value of the parameter.
+    """
+    if name in params:
+        return params[name][0]
+    if required and default is None:
+        raise ValueError(f"Missing query parameter '{name}'")
+    return default
+
+
+def get_process(dataset: Dataset, value: str):
+    """
+    This function finds a process column of a dataset from its name in a query.
+
+    :param dataset: The dataset.
+    :param value: The name of the process.
+    :return: The process column label.
+    """
+    for process in hf.get_analysis_columns(dataset.l_df):
+        if str(process) == value:
+            return process
+    raise e.InvalidColumnsException(f"The process '{value}' is not in the dataset")
+
+
+def query_cell_lines(cache: DatasetCache, params: dict) -> dict:
+    """
+    This function answers '/cell_lines': the cell lines and the important processes of a dataset.
+
+    :param cache: The dataset cache.
+    :param params: The parsed query string, with 'dataset'.
+    :return: A dictionary with the 'cell_lines' and the 'important_processes'.
+    """
+    dataset = cache.get(get_param(params, 'dataset'))
+    return {'cell_lines': list(dataset.cell_dfs),
+            'important_processes': [str(process) for process in hf.get_analysis_columns(dataset.important_l)]}
+
+
+def query_pairs(cache: DatasetCache, params: dict) -> dict:
+    """
+    This function answers '/pairs': the pair keys of a cell line with the default compound split.
+
+    :param cache: The dataset cache.
+    :param params: The parsed query string, with 'dataset', 'cell_line', 'fixed_col' (default 'time') and
+                   'control_treatment' ('1' for the control-treatment pairs, default '0').
+    :return: A dictionary with the 'pairs', a list of pair keys.
+    """
+    dataset = cache.get(get_param(params, 'dataset'))
+    control_treatment = get_param(params, 'control_treatment', '0') == '1'
+    pairs = dataset.get_pairs(get_param(params, 'cell_line'), get_param(params, 'fixed_col', 'time'),
+                              control_treatment)
+    return {'pairs': [list(key) for key in pairs]}
+
+
+def query_reasons(cache: DatasetCache, params: dict) -> dict:
+    """
+    This function answers '/reasons': the statistics and the reason of every process of a pair.
+
+    :param cache: The dataset cache.
+    :param params: The parsed query string, with 'dataset', 'cell_line', 'first', 'second' ('control' and 'treatment'
+                   for the control-treatment pair), 'value', 'second_value' (when 'first' and 'second' are the same
+                   compound), 'fixed_col' (default 'time'), 'p_value' (default '0.05') and 'test' (default 'ttest').
+    :return: A dictionary with the 'pair' key and a record per process under 'processes'.
+    """
+    dataset = cache.get(get_param(params, 'dataset'))
+    cell_line, first, second = get_param(params, 'cell_line'), get_param(params, 'first'), get_param(params, 'second')
+    fixed_col = get_param(params, 'fixed_col', 'time')
+    value = get_param(params, 'value')
+    p_value = float(get_param(params, 'p_value', '0.05'))
+    test = get_param(params, 'test', 'ttest')
+    if test not in ('ttest', 'permutation'):
+        raise ValueError(f"Unknown test '{test}', should be 'ttest' or 'permutation'")
+
+    control_treatment = (first, second) == ('control', 'treatment')
+    if first == second:
+        key = (cell_line, first, second, value, get_param(params, 'second_value'))
+    else:
+        key = (cell_line, first, second, value)
+    if key not in dataset.get_pairs(cell_line, fixed_col, control_treatment):
+        raise ValueError(f"There is no pair {key} in the dataset")
+
+    stats = dataset.get_pair_statistics(key, control_treatment, fixed_col, test)
+    reasons = hf.get_reasons(stats, p_value, dataset.err_limit_lambda)
+    result = stats.assign(reason=reasons).rename_axis('process').reset_index()
+    result['process'] = result['process'].astype(str)
+    return {'pair': list(key), 'processes': to_records(result)}
+
+
+def query_edges(cache: DatasetCache, params: dict) -> dict:
+    """
+    This function answers '/edges': the lower and upper edges of a process in 'G', as in 'analyze_G'.
+
+    :param cache: The dataset cache.
+    :param params: The parsed query string, with 'dataset', 'process' and 'edge_percents' (default '0.1'). Edge percents
+                   that give no protein are rejected.
+    :return: A dictionary with the 'process' and the 'lower' and 'upper' edges, a record per protein.
+    """
+    dataset = cache.get(get_param(params, 'dataset'))
+    process = get_process(dataset, get_param(params, 'process'))
+    edge_percents = float(get_param(params, 'edge_percents', '0.1'))
+    if hf.get_edge_count(len(dataset.g_df), edge_percents) == 0:
+        raise ValueError(f"The edge percents {edge_percents} give no protein of the {len(dataset.g_df)} proteins")
+    sorted_g = dataset.g_df[['UID', process]].sort_values(process, kind='stable')
+    lower_edges, lower_values, upper_edges, upper_values = hf.find_edges(
+        sorted_g['UID'].tolist(), sorted_g[process].tolist(), edge_percents)
+    return {'process': str(process),
+            'lower': [{'UID': uid, 'Effect': value} for uid, value in zip(lower_edges, lower_values)],
+            'upper': [{'UID': uid, 'Effect': value} for uid, value in zip(upper_edges, upper_values)]}
+
+
+def query_process(cache: DatasetCache, params: dict) -> dict:
+    """
+    This function answers '/process': the values of a process in 'L', for all the samples or those of a cell line.
+
+    :param cache: The dataset cache.
+    :param params: The parsed query string, with 'dataset', 'process' and optionally 'cell_line'.
+    :return: A dictionary with the 'process', whether it is 'important', its 'err_limit_lambda' and a record per
+             sample under 'samples'.
+    """
+    dataset = cache.get(get_param(params, 'dataset'))
+    process = get_process(dataset, get_param(params, 'process'))
+    l_df = dataset.l_df
+    cell_line = get_param(params, 'cell_line', required=False)
+    if cell_line is not None:
+        l_df = l_df.loc[l_df['cell_line_name'] == cell_line]
+    values = l_df[['cell_line_name', 'compound_name', 'dosage', 'time', process]].rename(columns={process: 'value'})
+    return {'process': str(process),
+            'important': process in dataset.important_l.columns,
+            'err_limit_lambda': float(np.mean(hf.get_error_limits(dataset.err_limit_lambda, [process]))),
+            'samples': to_records(values)}
+
+
+ROUTES = {'/cell_lines': query_cell_lines,
+          '/pairs': query_pairs,
+          '/reasons': query_reasons,
+          '/edges': query_edges,
+          '/process': query_process}
+
+
+def answer(cache: DatasetCache, target: str):
+    """
+    This function answers a query.
+
+    :param cache: The dataset cache.
+    :param target: The path and query string of the request.
+    :return: A tuple containing the HTTP status and the JSON-ready body.
+    """
+    url = urlsplit(target)
+    params = parse_qs(url.query)
+    if url.path == '/datasets':
+        return 200, {'workbooks': cache.list_workbooks(), 'loaded': list(cache.datasets)}
+    if url.path not in ROUTES:
+        return 404, {'error': f"Unknown query '{url.path}', should be one of {['/datasets'] + list(ROUTES)}"}
+    start = time.perf_counter()
+    try:
+        body = ROUTES[url.path](cache, params)
+    except (ValueError, KeyError, e.InvalidPathException, e.InvalidCellLineException,
+            e.InvalidColumnsException) as ex:
+        return 400, {'error': str(ex)}
+    body['milliseconds'] = round((time.perf_counter() - start) * 1000, 3)
+    return 200, body
+
+
+async def handle_connection(cache: DatasetCache, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+    """
+    This function serves a single HTTP/1.0 GET request. The queries run in a worker thread, so loading a workbook does
+    not block the other connections.
+
+    :param cache: The dataset cache.
+    :param reader: The stream of the request.
+    :param writer: The stream of the response.
+    """
+    try:
+        request_line = (await reader.readline()).decode('latin-1').split()
+        while (await reader.readline()) not in (b'\r\n', b'\n', b''):
+            pass
+        if len(request_line) < 2 or request_line[0] != 'GET':
+            status, body = 405, {'error': "Only GET requests are supported"}
+        else:
+            status, body = await asyncio.get_running_loop().run_in_executor(None, answer, cache, request_line[1])
+    except Exception as ex:
+        status, body = 500, {'error': f"{type(ex).__name__}: {ex}"}
+
+    payload = json.dumps(body, allow_nan=False, default=str).encode()
+    reasons = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 405: 'Method Not Allowed', 500: 'Internal Server Error'}
+    writer.write(f"HTTP/1.0 {status} {reasons[status]}\r\nContent-Type: application/json\r\n"
+                 f"Content-Length: {len(payload)}\r\nConnection: close\r\n\r\n".encode() + payload)
+    await writer.drain()
+    writer.close()
+
+
+async def serve(data_dir: str, port: int = DEFAULT_PORT, max_datasets: int = 4, threshold: int = 2,
+                preload: list = None):
+    """
+    This function runs the analysis service on localhost until it is cancelled.
+
+    :param data_dir: The directory of the workbooks that can be queried.
+    :param port: The port to listen on. Default is DEFAULT_PORT.
+    :param max_datasets: The maximal number of datasets kept in memory. Default is 4.
+    :param threshold: The 'important_L' threshold of the datasets. Default is 2.
+    :param preload: The workbooks to load before serving. Default is None.
+    """
+    cache = DatasetCache(data_dir, max_datasets=max_datasets, threshold=threshold)
+    for name in preload or []:
+        cache.get(name)
+    server = await asyncio.start_server(lambda reader, writer: handle_connection(cache, reader, writer), HOST, port)
+    print(f"Serving '{cache.data_dir}' on http://{HOST}:{port}")
+    async with server:
+        await server.serve_forever()
+
+
+def main(argv: list = None):
+    """
+    This function is the command-line entry point of the service.
+
+    :param argv: The command-line arguments. Default is None - 'sys.argv' is used.
+    """
+    parser = argparse.ArgumentParser(description="Serve queries on 'L'/'G' workbooks kept in memory.")
+    parser.add_argument('data_dir', help="Directory of the workbooks")
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT, help=f"Port on localhost (default: {DEFAULT_PORT})")
+    parser.add_argument('--max-datasets', dest='max_datasets', type=int, default=4,
+                        help="Datasets kept in memory (default: 4)")
+    parser.add_argument('--threshold', type=int, default=2, help="'important_L' threshold (default: 2)")
+    parser.add_argument('--preload', action='append', help="Workbook to load at startup, can be given several times")
+    args = parser.parse_args(argv)
+    try:
+        asyncio.run(serve(args.data_dir, args.port, args.max_datasets, args.threshold, args.preload))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    sys.exit(main())
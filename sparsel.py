@@ -0,0 +1,80 @@
+import numpy as np
+import pandas as pd
+import scipy.sparse as sp
+import validation as valid
+import helpfunctions as hf
+
+
+class SparseL:
+    def __init__(self, l_df: pd.DataFrame, err_limit_lambda: float, chunk_size: int = 4096):
+        """
+        This method stores the entries of 'L' that are higher in absolute value than the error limit as a CSR matrix,
+        a row per sample and a column per process. The rows are converted in chunks, so the dense boolean mask of the
+        whole matrix is never built.
+
+        :param l_df: The 'L' DataFrame, e.g. the important 'L'.
+        :param err_limit_lambda: The error limit lambda, or a Series of error limits indexed by process.
+        :param chunk_size: The number of rows converted at once. Default is 4096.
+        """
+        valid.is_valid_L(l_df)
+        self.index = l_df.index
+        self.processes = hf.get_analysis_columns(l_df)
+        limits = hf.get_error_limits(err_limit_lambda, self.processes)
+
+        rows, cols, data = [], [], []
+        for start in range(0, len(l_df), chunk_size):
+            values = l_df[self.processes].iloc[start:start + chunk_size].to_numpy(dtype=float)
+            chunk_rows, chunk_cols = np.nonzero(np.abs(values) > limits)
+            rows.append(chunk_rows + start)
+            cols.append(chunk_cols)
+            data.append(values[chunk_rows, chunk_cols])
+        self.matrix = sp.csr_matrix((np.concatenate(data) if data else np.empty(0),
+                                     (np.concatenate(rows) if rows else np.empty(0, dtype=int),
+                                      np.concatenate(cols) if cols else np.empty(0, dtype=int))),
+                                    shape=(len(l_df), len(self.processes)))
+
+    def get_density(self) -> float:
+        """
+        This method returns the fraction of the entries that are above the error limit.
+
+        :return: The density of the matrix.
+        """
+        size = self.matrix.shape[0] * self.matrix.shape[1]
+        return self.matrix.nnz / size if size else 0.0
+
+    def get_counts(self) -> pd.Series:
+        """
+        This method counts the entries above the error limit of every process, as 'important_L' does.
+
+        :return: A Series of counts indexed by process.
+        """
+        return pd.Series(np.bincount(self.matrix.indices, minlength=len(self.processes)), index=self.processes)
+
+    def get_important_processes(self, threshold: int) -> list:
+        """
+        This method returns the processes with at least 'threshold' entries above the error limit.
+
+        :param threshold: The number of significant values.
+        :return: The important processes, in the order of 'L'.
+        """
+        counts = self.get_counts()
+        return counts.index[counts >= threshold].tolist()
+
+    def get_active_processes(self, labels, processes: list = None) -> list:
+        """
+        This method returns the processes that have an entry above the error limit in at least one of the given
+        samples. A process that is quiet in all the samples of both groups of a pair has both means within the error
+        limit, so it can not get a reason and does not need to be tested.
+
+        :param labels: The row labels of the samples of both groups of a pair.
+        :param processes: The processes to consider. Default is all the processes of the matrix.
+        :return: The active processes, in the order of 'L'.
+        """
+        positions = self.index.get_indexer(labels)
+        if (positions < 0).any():
+            raise KeyError(f"The samples {list(pd.Index(labels)[positions < 0])} are not in the sparse 'L'")
+        active = self.matrix[positions].getnnz(axis=0) > 0
+        if processes is None:
+            return [process for process, is_active in zip(self.processes, active) if is_active]
+        processes = set(processes)
+        return [process for process, is_active in zip(self.processes, active) if is_active and process in processes]
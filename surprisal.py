@@ -0,0 +1,200 @@
+import os
+import sys
+import time
+import numpy as np
+import pandas as pd
+from scipy.stats import norm
+from scipy.sparse.linalg import svds
+import exceptions as e
+import validation as valid
+
+METADATA_COLUMNS = ['barcode', 'cell_line_name', 'compound_name', '2D_3D', 'dosage', 'time']
+
+
+def load_expression_matrix(path: str) -> pd.DataFrame:
+    """
+    This function loads a raw protein x sample expression matrix.
+
+    :param path: The path of the matrix. A '.csv' file holds the UIDs in its first column and a sample per column,
+                 a '.parquet' file holds the UIDs in its index or in a 'UID' column, and a '.npy' file holds the bare
+                 matrix (the UIDs and samples are then numbered).
+    :return: A DataFrame indexed by UID with a column per sample.
+    """
+    valid.is_valid_path(path, directory=False)
+    extension = os.path.splitext(path)[1].lower()
+    if extension == '.csv':
+        return pd.read_csv(path, index_col=0)
+    if extension == '.parquet':
+        expression = pd.read_parquet(path)
+        if 'UID' in expression.columns:
+            expression = expression.set_index('UID')
+        return expression
+    if extension == '.npy':
+        matrix = np.load(path)
+        return pd.DataFrame(matrix, index=[f'P{i}' for i in range(matrix.shape[0])])
+    raise e.InvalidPathException(f"The file '{path}' should be a '.csv', '.parquet' or '.npy' file")
+
+
+def randomized_svd(matrix: np.ndarray, k: int, n_oversamples: int = 10, n_iter: int = 4, seed: int = 0):
+    """
+    This function computes the first k singular triplets of a matrix with the randomized range finder of Halko,
+    Martinsson and Tropp, using power iterations to sharpen the spectrum.
+
+    :param matrix: The matrix to decompose.
+    :param k: The number of singular triplets.
+    :param n_oversamples: The number of extra random vectors.
+    :param n_iter: The number of power iterations.
+    :param seed: The seed of the random generator.
+    :return: A tuple (U, S, Vt) of the first k singular triplets.
+    """
+    rng = np.random.default_rng(seed)
+    n_random = min(k + n_oversamples, min(matrix.shape))
+    q, _ = np.linalg.qr(matrix @ rng.standard_normal((matrix.shape[1], n_random)))
+    for _ in range(n_iter):
+        q, _ = np.linalg.qr(matrix.T @ q)
+        q, _ = np.linalg.qr(matrix @ q)
+    u_small, s, vt = np.linalg.svd(q.T @ matrix, full_matrices=False)
+    return (q @ u_small)[:, :k], s[:k], vt[:k]
+
+
+def truncated_svd(matrix: np.ndarray, k: int, solver: str = 'randomized', seed: int = 0):
+    """
+    This function computes the first k singular triplets of a matrix, sorted by decreasing singular value.
+
+    :param matrix: The matrix to decompose.
+    :param k: The number of singular triplets.
+    :param solver: 'randomized' (default), 'arpack' for a Lanczos solver or 'full' for a full SVD.
+    :param seed: The seed of the random generator of the 'randomized' and 'arpack' solvers.
+    :return: A tuple (U, S, Vt) of the first k singular triplets.
+    """
+    if not 0 < k <= min(matrix.shape):
+        raise e.InvalidColumnsException(f"The number of processes should be between 1 and {min(matrix.shape)}")
+    if solver == 'randomized':
+        return randomized_svd(matrix, k, seed=seed)
+    if solver == 'arpack':
+        if k >= min(matrix.shape):
+            return truncated_svd(matrix, k, solver='full')
+        v0 = np.random.default_rng(seed).standard_normal(min(matrix.shape))
+        u, s, vt = svds(matrix, k=k, v0=v0)
+        order = np.argsort(s)[::-1]
+        return u[:, order], s[order], vt[order]
+    if solver == 'full':
+        u, s, vt = np.linalg.svd(matrix, full_matrices=False)
+        return u[:, :k], s[:k], vt[:k]
+    raise ValueError(f"Unknown solver '{solver}', should be 'randomized', 'arpack' or 'full'")
+
+
+def estimate_error_limit(log_matrix: np.ndarray, s: np.ndarray, confidence: float = 0.95) -> float:
+    """
+    This function estimates the error limit of the amplitudes from the part of the log-space matrix that the first k
+    processes leave unexplained. A G column has a unit norm, so noise of standard deviation sigma in every entry gives
+    an amplitude noise of standard deviation sigma.
+
+    :param log_matrix: The log-space protein x sample matrix.
+    :param s: The singular values of the kept processes.
+    :param confidence: The two-sided confidence of the limit. Default is 0.95.
+    :return: The error limit lambda.
+    """
+    n_proteins, n_samples = log_matrix.shape
+    k = len(s)
+    residual_ss = max(float(np.sum(log_matrix ** 2)) - float(np.sum(s ** 2)), 0.0)
+    dof = n_proteins * n_samples - k * (n_proteins + n_samples - k)
+    if dof <= 0:
+        return 0.0
+    return float(norm.ppf(1 - (1 - confidence) / 2) * np.sqrt(residual_ss / dof))
+
+
+def surprisal_analysis(expression: pd.DataFrame, metadata: pd.DataFrame, k: int = 10, solver: str = 'randomized',
+                       confidence: float = 0.95, seed: int = 0):
+    """
+    This function computes the surprisal decomposition ln X = G * L' of a raw protein x sample matrix, limited to the
+    first k processes, and returns it in the layout of 'get_LGE_data'.
+
+    :param expression: The protein x sample matrix, indexed by UID with a column per sample. All values should be positive.
+    :param metadata: A DataFrame with a row per sample (in the order of the matrix columns) and the columns 'barcode',
+                     'cell_line_name', 'compound_name', '2D_3D', 'dosage' and 'time'.
+    :param k: The number of processes. Default is 10.
+    :param solver: The SVD solver, see 'truncated_svd'. Default is 'randomized'.
+    :param confidence: The confidence of the error limit, see 'estimate_error_limit'. Default is 0.95.
+    :param seed: The seed of the random generator. Default is 0.
+    :return: l_df (pandas.DataFrame): The metadata followed by the amplitude of each process, named 1..k.
+             g_df (pandas.DataFrame): The 'UID' column followed by the weight of each protein in each process.
+             err_limit_lambda (float): The estimated error limit lambda.
+    """
+    if list(metadata.columns[:len(METADATA_COLUMNS)]) != METADATA_COLUMNS:
+        raise e.InvalidColumnsException(f"The metadata columns should be {METADATA_COLUMNS}")
+    if len(metadata) != expression.shape[1]:
+        raise e.InvalidDataSetException("The metadata should have a row per sample of the matrix")
+
+    matrix = expression.to_numpy(dtype=float)
+    if not np.all(np.isfinite(matrix)) or np.any(matrix <= 0):
+        raise e.InvalidDataSetException("The expression values should be finite and positive")
+    log_matrix = np.log(matrix)
+
+    u, s, vt = truncated_svd(log_matrix, k, solver=solver, seed=seed)
+    # The SVD determines each process up to its sign: make the largest protein weight positive
+    signs = np.sign(u[np.abs(u).argmax(axis=0), np.arange(u.shape[1])])
+    signs[signs == 0] = 1
+    u = u * signs
+    vt = vt * signs[:, None]
+
+    processes = list(range(1, k + 1))
+    amplitudes = pd.DataFrame((s[:, None] * vt).T, columns=processes, index=metadata.index)
+    l_df = pd.concat([metadata[METADATA_COLUMNS], amplitudes], axis=1).reset_index(drop=True)
+    g_df = pd.concat([pd.DataFrame({'UID': expression.index.astype(str)}),
+                      pd.DataFrame(u, columns=processes)], axis=1)
+    err_limit_lambda = estimate_error_limit(log_matrix, s, confidence)
+
+    valid.is_valid_L(l_df)
+    valid.is_valid_G(g_df)
+    return l_df, g_df, err_limit_lambda
+
+
+def save_LGE_data(l_df: pd.DataFrame, g_df: pd.DataFrame, err_limit_lambda: float, data_set_path: str):
+    """
+    This function saves the decomposition as a workbook that 'get_LGE_data' can read.
+
+    :param l_df: The 'L' DataFrame.
+    :param g_df: The 'G' DataFrame.
+    :param err_limit_lambda: The error limit lambda.
+    :param data_set_path: The path of the Excel file to create.
+    """
+    with pd.ExcelWriter(data_set_path) as writer:
+        g_df.to_excel(writer, sheet_name='G', index=False)
+        l_df.to_excel(writer, sheet_name='L', index=False)
+        pd.DataFrame(columns=[err_limit_lambda]).to_excel(writer, sheet_name='ErrorLimitLambda', index=False)
+
+
+def benchmark(n_proteins: int = 20000, n_samples: int = 5000, k: int = 20, seed: int = 0) -> pd.DataFrame:
+    """
+    This function compares the truncated solvers with the full SVD on a synthetic log-space matrix of rank k plus noise.
+
+    :param n_proteins: The number of proteins.
+    :param n_samples: The number of samples.
+    :param k: The number of processes.
+    :param seed: The seed of the random generator.
+    :return: A DataFrame with the duration of each solver and the largest relative error of its singular values.
+    """
+    rng = np.random.default_rng(seed)
+    scales = np.linspace(10, 1, k) * np.sqrt(n_proteins * n_samples) / 10
+    u, _ = np.linalg.qr(rng.standard_normal((n_proteins, k)))
+    v, _ = np.linalg.qr(rng.standard_normal((n_samples, k)))
+    log_matrix = (u * scales) @ v.T + rng.standard_normal((n_proteins, n_samples))
+
+    rows, reference = [], None
+    for solver in ['full', 'arpack', 'randomized']:
+        start = time.perf_counter()
+        _, s, _ = truncated_svd(log_matrix, k, solver=solver, seed=seed)
+        duration = time.perf_counter() - start
+        if reference is None:
+            reference = s
+        rows.append({'solver': solver, 'seconds': duration,
+                     'max_relative_error': float(np.max(np.abs(s - reference) / reference))})
+        print(f"{solver}: {duration:.2f}s")
+    return pd.DataFrame(rows)
+
+
+if __name__ == '__main__':
+    if len(sys.argv) > 1 and sys.argv[1] == '--benchmark':
+        sizes = [int(arg) for arg in sys.argv[2:5]]
+        print(benchmark(*sizes).to_string(index=False))
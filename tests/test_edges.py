@@ -0,0 +1,13 @@
+import helpfunctions as hf
+
+
+def test_find_edges_without_proteins():
+    """
+    This function checks that the edges are empty when there are no proteins, or when the edge percents round down
+    to no protein, instead of the whole list being taken as the upper edge.
+    """
+    names = list('abcdefghij')
+    values = list(range(10))
+    assert hf.find_edges([], [], 0.1) == ([], [], [], [])
+    assert hf.find_edges(names, values, 0.05) == ([], [], [], [])
+    assert hf.find_edges(names, values, 0.2) == (['a', 'b'], [0, 1], ['i', 'j'], [8, 9])
@@ -0,0 +1,77 @@
+import tracemalloc
+import numpy as np
+import pandas as pd
+import pytest
+import oncosensepy as osp
+
+N_ROWS = 20000
+N_PROCESSES = 400
+MAX_PEAK_RATIO = 1.5
+
+
+def make_l_df(n_rows: int = N_ROWS, n_processes: int = N_PROCESSES) -> pd.DataFrame:
+    """
+    This function builds a synthetic 'L' DataFrame in the format of the 'L' sheet.
+
+    :param n_rows: The number of samples.
+    :param n_processes: The number of processes.
+    :return: The 'L' DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    meta = pd.DataFrame({'barcode': np.arange(n_rows),
+                         'cell_line_name': rng.choice(['A', 'B', 'C'], n_rows),
+                         'compound_name': rng.choice(['DMSO', 'X', 'Y'], n_rows),
+                         '2D_3D': '-0-',
+                         'dosage': rng.choice(['-0-', '1nm', '40nm'], n_rows),
+                         'time': rng.choice(['0hr', '24hr', '48hr'], n_rows)})
+    values = pd.DataFrame(rng.normal(0, 1, (n_rows, n_processes)), columns=list(range(1, n_processes + 1)))
+    return pd.concat([meta, values], axis=1)
+
+
+def get_peak(func) -> int:
+    """
+    This function returns the peak of the memory allocated while a function runs.
+
+    :param func: The function to measure, without arguments.
+    :return: The peak allocation in bytes.
+    """
+    tracemalloc.start()
+    try:
+        func()
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return peak
+
+
+@pytest.fixture(scope='module')
+def l_df():
+    """
+    This function builds the synthetic 'L' DataFrame shared by the tests.
+
+    :return: The 'L' DataFrame.
+    """
+    return make_l_df()
+
+
+def test_important_L_peak(l_df):
+    """
+    This function checks that 'important_L' allocates at most about the size of its input, since the kept columns
+    are selected in one indexing step and share the data of the input.
+
+    :param l_df: The synthetic 'L' DataFrame.
+    """
+    input_bytes = l_df.memory_usage(deep=True).sum()
+    peak = get_peak(lambda: osp.important_L(l_df, 1.0, 2))
+    assert peak <= MAX_PEAK_RATIO * input_bytes, f"peak is {peak / input_bytes:.2f}x the input"
+
+
+def test_filter_by_col_peak(l_df):
+    """
+    This function checks that 'filter_by_col' allocates at most about the size of its input.
+
+    :param l_df: The synthetic 'L' DataFrame.
+    """
+    input_bytes = l_df.memory_usage(deep=True).sum()
+    peak = get_peak(lambda: osp.filter_by_col(l_df, 'dosage', ['1nm', '40nm']))
+    assert peak <= MAX_PEAK_RATIO * input_bytes, f"peak is {peak / input_bytes:.2f}x the input"
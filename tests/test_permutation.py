@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import helpfunctions as hf
+import permutation as perm
+
+
+def make_cell_df(n_per_compound: int = 10) -> pd.DataFrame:
+    """
+    This function builds an 'L' DataFrame of a single cell line whose control groups are interleaved row by row.
+
+    :param n_per_compound: The number of samples of every compound.
+    :return: The 'L' DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    compounds = ['DMSO', 'PBS'] * n_per_compound + ['X', 'Y'] * n_per_compound
+    n_rows = len(compounds)
+    df = pd.DataFrame({'barcode': np.arange(n_rows), 'cell_line_name': 'A', 'compound_name': compounds,
+                       '2D_3D': '-0-', 'dosage': '-0-', 'time': '24hr'})
+    values = rng.normal(0, 1, (n_rows, 3)) + np.where(np.isin(compounds, ['X', 'Y']), 0.5, 0)[:, None]
+    return pd.concat([df, pd.DataFrame(values, columns=[1, 2, 3])], axis=1)
+
+
+def test_min_p_value():
+    """
+    This function checks the smallest p-values of the exact test for the usual replicate designs, and that the test
+    reaches them.
+    """
+    assert perm.get_min_p_value(1, 1) == 1
+    assert perm.get_min_p_value(1, 2) == 1 / 3
+    assert perm.get_min_p_value(2, 2) == 1 / 3
+    assert perm.get_min_p_value(30, 30) == 1 / (perm.MAX_PERMUTATIONS + 1)
+    p = perm.permutation_test(np.array([[0.0], [0.1]]), np.array([[5.0], [5.1]]))
+    assert p[0] == perm.get_min_p_value(2, 2)
+
+
+def test_group_index_permutation_matches_direct():
+    """
+    This function checks that a seeded Monte Carlo permutation test gives the same p-values with and without a group
+    index, when the samples of a condition come from interleaved groups.
+    """
+    cell_df = make_cell_df()
+    analysis_cols = hf.get_analysis_columns(cell_df)
+    pairs_dict, cl, il = hf.df_to_dict(cell_df, 'A', [], [], True, fixed_col='time')
+    key, sub_df = next(iter(pairs_dict.items()))
+
+    direct = hf.compute_pair_statistics(sub_df, key, analysis_cols, cl, il, True, 'time', 'permutation')
+    group_index = hf.GroupIndex(cell_df, analysis_cols)
+    indexed = hf.compute_pair_statistics_from_index(group_index, key, cl, il, True, 'time', 'permutation')
+    assert direct['n_first'].iloc[0] == 20
+    np.testing.assert_array_equal(direct['p'].to_numpy(), indexed['p'].to_numpy())
@@ -0,0 +1,70 @@
+import os
+import pandas as pd
+import pytest
+import exceptions as e
+import oncosensepy as osp
+import query as q
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'Data', 'supp_data_4.xlsx')
+
+
+@pytest.fixture(scope='module')
+def l_df() -> pd.DataFrame:
+    """
+    This function reads the 'L' DataFrame of supp_data_4 once for the module.
+
+    :return: The 'L' DataFrame.
+    """
+    l_df, _, _ = osp.get_LGE_data(DATA_PATH)
+    return l_df
+
+
+def test_query_matches_chained_filters(l_df):
+    """
+    This function checks that a conjunction of 'Isin' predicates keeps the same rows, in the same order, as the
+    chained 'filter_by_col' calls, and that the index alone is returned when the rows are not materialized.
+    """
+    chained = osp.filter_by_col(l_df, 'compound_name', ['DMSO', 'GLEEVEC'])
+    chained = osp.filter_by_col(chained, 'time', ['48hrs'])
+    predicate = q.Isin('compound_name', ['DMSO', 'GLEEVEC']) & q.Isin('time', ['48hrs'])
+
+    pd.testing.assert_frame_equal(osp.query_L(l_df, predicate), chained)
+    pd.testing.assert_index_equal(osp.query_L(l_df, predicate, materialize=False), chained.index)
+
+
+def test_between_bounds(l_df):
+    """
+    This function checks the inclusive and exclusive bounds of 'Between' ('-0-' is a dosage of 0), that values which
+    can not be parsed are not in any range, and that bounds or columns which can not be parsed are rejected.
+    """
+    def kept(predicate):
+        return osp.query_L(l_df, predicate)[predicate.col].value_counts().to_dict()
+
+    assert kept(q.Between('time', low='24hrs')) == {'24hrs': 32, '48hrs': 36}
+    assert kept(q.Between('time', low='24hrs', inclusive=False)) == {'48hrs': 36}
+    assert kept(q.Between('dosage', '200nM', '20uM')) == {'200nM': 1, '20uM': 1}
+    assert kept(q.Between('dosage', '200nM', '20uM', inclusive=False)) == {}
+    assert kept(q.Between('dosage', high='200nM')) == {'-0-': 65, '200nM': 1}
+
+    unknown_df = l_df.assign(dosage=l_df['dosage'].replace('5mM', 'unknown'))
+    kept_df = osp.query_L(unknown_df, q.Between('dosage'))
+    assert kept_df['dosage'].value_counts().to_dict() == {'-0-': 65, '200nM': 1, '20uM': 1}
+
+    with pytest.raises(e.InvalidColumnsException):
+        q.Between('time', 'soon')
+    with pytest.raises(e.InvalidColumnsException):
+        q.Between('compound_name', 'A', 'B')
+
+
+def test_composition(l_df):
+    """
+    This function checks that '~' and '|' keep the same rows as the equivalent pandas masks.
+    """
+    dmso = l_df['compound_name'] == 'DMSO'
+    late = l_df['time'] == '48hrs'
+
+    pd.testing.assert_frame_equal(osp.query_L(l_df, ~q.Isin('compound_name', ['DMSO'])), l_df[~dmso])
+    pd.testing.assert_frame_equal(osp.query_L(l_df, q.Isin('compound_name', ['DMSO']) | q.Isin('time', ['48hrs'])),
+                                  l_df[dmso | late])
+    pd.testing.assert_frame_equal(osp.query_L(l_df, ~(q.Isin('compound_name', ['DMSO']) | q.Between('time', '48hrs'))),
+                                  l_df[~(dmso | late)])
@@ -0,0 +1,41 @@
+import numpy as np
+import pandas as pd
+import oncosensepy as osp
+import sparsel as sl
+
+
+def make_l_df(n_samples: int) -> pd.DataFrame:
+    """
+    This function builds an 'L' DataFrame of a single cell line with a control and a treatment at two time points.
+    Process 3 stays within the error limit of 1 in every sample, so it is quiet in every pair.
+
+    :param n_samples: The number of samples of every (compound, time) group.
+    :return: The 'L' DataFrame.
+    """
+    rng = np.random.default_rng(0)
+    groups = [(compound, time) for compound in ('DMSO', 'X') for time in ('0hr', '24hr')] * n_samples
+    df = pd.DataFrame({'barcode': np.arange(len(groups)), 'cell_line_name': 'A',
+                       'compound_name': [compound for compound, _ in groups], '2D_3D': '-0-', 'dosage': '-0-',
+                       'time': [time for _, time in groups]})
+    values = np.column_stack([rng.normal(3, 1, len(groups)), rng.normal(-3, 1, len(groups)),
+                              rng.uniform(-0.5, 0.5, len(groups))])
+    return pd.concat([df, pd.DataFrame(values, columns=[1, 2, 3])], axis=1)
+
+
+def test_sparse_statistics_keep_the_testable_family():
+    """
+    This function checks that the sparse statistics test the same pairs as the dense ones: the quiet processes of a
+    testable pair get a p-value of 1, and a pair that can not be tested keeps NaN p-values for all the processes.
+    """
+    selections = {'A': (['DMSO'], ['X'])}
+    for n_samples, test in [(1, 'ttest'), (3, 'ttest'), (1, 'permutation')]:
+        l_df = make_l_df(n_samples)
+        dense = osp.compute_L_statistics(l_df, selections=selections, test=test)
+        sparse = osp.compute_L_statistics(l_df, selections=selections, test=test, sparse_l=sl.SparseL(l_df, 1.0))
+
+        pd.testing.assert_series_equal(dense['p'].notna(), sparse['p'].notna())
+        quiet = sparse['process'] == 3
+        assert (sparse.loc[quiet & sparse['p'].notna(), 'p'] == 1).all()
+        np.testing.assert_allclose(sparse.loc[~quiet, 'p'], dense.loc[~quiet, 'p'])
+    assert osp.compute_L_statistics(make_l_df(1), selections=selections,
+                                    sparse_l=sl.SparseL(make_l_df(1), 1.0))['p'].isna().all()
@@ -0,0 +1,62 @@
+import numpy as np
+import pandas as pd
+import trends
+
+
+def make_l_df(rows: list) -> pd.DataFrame:
+    """
+    This function builds an 'L' DataFrame of a single cell line from (compound, dosage, time, process values) rows.
+
+    :param rows: The samples.
+    :return: The 'L' DataFrame.
+    """
+    records = [{'barcode': i, 'cell_line_name': 'A', 'compound_name': compound, '2D_3D': '-0-', 'dosage': dosage,
+                'time': time, 1: values[0], 2: values[1]}
+               for i, (compound, dosage, time, values) in enumerate(rows)]
+    return pd.DataFrame(records)
+
+
+def test_dose_response_mixed_design():
+    """
+    This function checks that the dose-response fits of a design with several time points are made per time point.
+    The later time point is shifted up and measured at higher doses, so pooling the time points would bias the slope.
+    """
+    rng = np.random.default_rng(0)
+    design = {'0hr': (0.0, ['1nm', '10nm', '100nm']), '24hr': (10.0, ['100nm', '1um', '10um'])}
+    rows = []
+    for time, (offset, dosages) in design.items():
+        for dosage in dosages:
+            decade = np.log10(trends.UIf.parse_measurement_string(dosage))
+            for _ in range(3):
+                noise = rng.normal(0, 0.01, 2)
+                rows.append(('X', dosage, time, (offset + 2 * decade + noise[0], 5 + noise[1])))
+    results = trends.dose_response(make_l_df(rows))
+
+    process_1 = results.loc[results['process'] == 1].set_index('time')
+    assert sorted(process_1.index) == ['0hr', '24hr']
+    assert (process_1['n_samples'] == 9).all()
+    np.testing.assert_allclose(process_1['slope'], 2, atol=0.05)
+    assert process_1['significant_slope'].all()
+
+
+def test_time_course_mixed_design():
+    """
+    This function checks that the time-course fits of a design with several dosages are made per dosage. The higher
+    dosage is shifted up and measured at later time points, so pooling the dosages would bias the slope.
+    """
+    rng = np.random.default_rng(1)
+    design = {'1nm': (0.0, ['0hr', '4hr', '8hr']), '40nm': (50.0, ['8hr', '24hr', '48hr'])}
+    rows = []
+    for dosage, (offset, times) in design.items():
+        for time in times:
+            minutes = trends.UIf.parse_time_string(time)
+            for _ in range(3):
+                noise = rng.normal(0, 0.01, 2)
+                rows.append(('X', dosage, time, (offset + 0.01 * minutes + noise[0], 5 + noise[1])))
+    results = trends.time_course(make_l_df(rows))
+
+    process_1 = results.loc[results['process'] == 1].set_index('dosage')
+    assert sorted(process_1.index) == ['1nm', '40nm']
+    assert (process_1['n_time_points'] == 3).all()
+    np.testing.assert_allclose(process_1['slope_per_minute'], 0.01, rtol=0.05)
+    assert process_1['significant_slope'].all()
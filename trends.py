@@ -0,0 +1,281 @@
+import os
+import numpy as np
+import pandas as pd
+from scipy import stats as st
+import validation as valid
+import UIFunctions as UIf
+import helpfunctions as hf
+import outputwriter as ow
+
+
+def fit_linear_trend(x: np.ndarray, values: np.ndarray):
+    """
+    This function fits values = intercept + slope * x for all the processes at once, by least squares.
+
+    :param x: The explanatory variable, one value per sample.
+    :param values: The responses, a row per sample and a column per process.
+    :return: A tuple of arrays (slope, intercept, p) with a value per process. The p-value tests slope == 0 and is NaN
+             when there are less than three samples or a single distinct x.
+    """
+    n = len(x)
+    x_centered = x - x.mean()
+    sxx = float(x_centered @ x_centered)
+    values_mean = values.mean(axis=0)
+    if sxx == 0:
+        nan = np.full(values.shape[1], np.nan)
+        return nan, values_mean, nan
+    slope = (x_centered @ (values - values_mean)) / sxx
+    intercept = values_mean - slope * x.mean()
+    p = np.full(values.shape[1], np.nan)
+    if n > 2:
+        residuals = values - intercept - np.outer(x, slope)
+        se = np.sqrt((residuals ** 2).sum(axis=0) / (n - 2) / sxx)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            p = 2 * st.t.sf(np.abs(slope / se), n - 2)
+    return slope, intercept, p
+
+
+def rank_correlation(x: np.ndarray, values: np.ndarray):
+    """
+    This function computes the Spearman rank correlation between x and every process at once.
+
+    :param x: The explanatory variable, one value per sample.
+    :param values: The responses, a row per sample and a column per process.
+    :return: A tuple of arrays (rho, p) with a value per process.
+    """
+    n = len(x)
+    x_ranks = st.rankdata(x)
+    value_ranks = st.rankdata(values, axis=0)
+    x_ranks = x_ranks - x_ranks.mean()
+    value_ranks = value_ranks - value_ranks.mean(axis=0)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        rho = (x_ranks @ value_ranks) / np.sqrt((x_ranks @ x_ranks) * (value_ranks ** 2).sum(axis=0))
+        p = np.full(values.shape[1], np.nan)
+        if n > 2:
+            t = rho * np.sqrt((n - 2) / np.maximum(1 - rho ** 2, 1e-300))
+            p = 2 * st.t.sf(np.abs(t), n - 2)
+    return rho, p
+
+
+def fit_hill(doses: np.ndarray, values: np.ndarray, grid_size: int = 50):
+    """
+    This function fits values = bottom + span * d / (d + EC50) for all the processes at once. For every EC50 of a
+    log-spaced grid the model is linear, so it is solved in closed form for all the grid points and processes together,
+    and the EC50 with the smallest residual sum of squares is kept per process.
+
+    :param doses: The molar doses, one value per sample.
+    :param values: The responses, a row per sample and a column per process.
+    :param grid_size: The number of EC50 candidates.
+    :return: A tuple of arrays (ec50, bottom, span) with a value per process, all NaN if there are less than two
+             distinct positive doses.
+    """
+    positive = np.unique(doses[doses > 0])
+    if len(positive) < 2:
+        nan = np.full(values.shape[1], np.nan)
+        return nan, nan, nan
+    candidates = np.logspace(np.log10(positive.min()) - 1, np.log10(positive.max()) + 1, grid_size)
+
+    x = doses[None, :] / (doses[None, :] + candidates[:, None])
+    x_centered = x - x.mean(axis=1, keepdims=True)
+    values_centered = values - values.mean(axis=0)
+    sxx = (x_centered ** 2).sum(axis=1)
+    sxy = x_centered @ values_centered
+    with np.errstate(divide='ignore', invalid='ignore'):
+        span = sxy / sxx[:, None]
+    rss = (values_centered ** 2).sum(axis=0)[None, :] - span * sxy
+
+    best = np.nanargmin(np.where(np.isfinite(rss), rss, np.inf), axis=0)
+    processes = np.arange(values.shape[1])
+    span = span[best, processes]
+    bottom = values.mean(axis=0) - span * x.mean(axis=1)[best]
+    return candidates[best], bottom, span
+
+
+def one_way_anova(groups: np.ndarray, values: np.ndarray):
+    """
+    This function runs a one-way ANOVA across the groups for all the processes at once.
+
+    :param groups: The group code of every sample, from 0 to the number of groups - 1.
+    :param values: The responses, a row per sample and a column per process.
+    :return: A tuple of arrays (F, p) with a value per process. Both are NaN when there is a single group or no
+             sample left for the within-group variance.
+    """
+    n = len(groups)
+    n_groups = groups.max() + 1
+    counts = np.bincount(groups, minlength=n_groups)
+    sums = np.zeros((n_groups, values.shape[1]))
+    np.add.at(sums, groups, values)
+    group_means = sums / counts[:, None]
+
+    ss_between = (counts[:, None] * (group_means - values.mean(axis=0)) ** 2).sum(axis=0)
+    ss_within = ((values - group_means[groups]) ** 2).sum(axis=0)
+    df_between, df_within = n_groups - 1, n - n_groups
+    if df_between < 1 or df_within < 1:
+        nan = np.full(values.shape[1], np.nan)
+        return nan, nan
+    with np.errstate(divide='ignore', invalid='ignore'):
+        f = (ss_between / df_between) / (ss_within / df_within)
+    return f, st.f.sf(f, df_between, df_within)
+
+
+def time_course(l_df: pd.DataFrame, p_value: float = 0.05, cell_line_list: list = None) -> pd.DataFrame:
+    """
+    This function fits the time-course trend of every process for each (cell line, compound, dosage) with at least two
+    distinct time points, in one pass per compound and dosage instead of a t-test per pair of time points, so the
+    samples of different dosages are never pooled. The time points are parsed to minutes with 'parse_time_string'.
+    Two tests are made for all the processes at once: a linear regression on the minutes and a one-way ANOVA across
+    the time points.
+
+    :param l_df: The 'L' DataFrame (or the important 'L').
+    :param p_value: The p-value threshold of the significance flags. Default is 0.05.
+    :param cell_line_list: The cell lines to analyze. Default is all the cell lines.
+    :return: A DataFrame with a row per (cell line, compound, dosage, process).
+    """
+    valid.is_valid_L(l_df)
+    if cell_line_list is None:
+        cell_line_list = l_df['cell_line_name'].unique().tolist()
+    analysis_cols = hf.get_analysis_columns(l_df)
+
+    results = []
+    for cell_line in cell_line_list:
+        cell_df = l_df.loc[l_df['cell_line_name'] == cell_line]
+        for (compound, dosage), compound_df in cell_df.groupby(['compound_name', 'dosage'], sort=False):
+            minutes = compound_df['time'].map(UIf.parse_time_string).to_numpy(dtype=float)
+            time_points, groups = np.unique(minutes, return_inverse=True)
+            if len(time_points) < 2:
+                continue
+            values = compound_df[analysis_cols].to_numpy(dtype=float)
+
+            slope, intercept, slope_p = fit_linear_trend(minutes, values)
+            f, anova_p = one_way_anova(groups, values)
+
+            result = pd.DataFrame({'cell_line_name': cell_line,
+                                   'compound_name': compound,
+                                   'dosage': dosage,
+                                   'process': analysis_cols,
+                                   'n_samples': len(minutes),
+                                   'n_time_points': len(time_points),
+                                   'slope_per_minute': slope,
+                                   'intercept': intercept,
+                                   'slope_p': slope_p,
+                                   'anova_f': f,
+                                   'anova_p': anova_p})
+            result['significant_slope'] = result['slope_p'] <= p_value
+            result['significant_anova'] = result['anova_p'] <= p_value
+            results.append(result)
+
+    if not results:
+        return pd.DataFrame(columns=['cell_line_name', 'compound_name', 'dosage', 'process', 'n_samples',
+                                     'n_time_points', 'slope_per_minute', 'intercept', 'slope_p', 'anova_f', 'anova_p',
+                                     'significant_slope', 'significant_anova'])
+    return pd.concat(results, ignore_index=True)
+
+
+def dose_response(l_df: pd.DataFrame, p_value: float = 0.05, cell_line_list: list = None,
+                  grid_size: int = 50) -> pd.DataFrame:
+    """
+    This function fits the dose-response trend of every process for each (cell line, compound, time) with at least two
+    distinct dosages, so the samples of different time points are never pooled. The dosages are parsed to molar values
+    with 'parse_measurement_string'. Three fits are made for all the processes at once: a log-linear model on the
+    positive doses (slope per decade), a Spearman monotonic trend and a Hill model with a Hill coefficient of 1.
+
+    :param l_df: The 'L' DataFrame (or the important 'L').
+    :param p_value: The p-value threshold of the significance flags. Default is 0.05.
+    :param cell_line_list: The cell lines to analyze. Default is all the cell lines.
+    :param grid_size: The number of EC50 candidates of the Hill fit. Default is 50.
+    :return: A DataFrame with a row per (cell line, compound, time, process).
+    """
+    valid.is_valid_L(l_df)
+    if cell_line_list is None:
+        cell_line_list = l_df['cell_line_name'].unique().tolist()
+    analysis_cols = hf.get_analysis_columns(l_df)
+
+    results = []
+    for cell_line in cell_line_list:
+        cell_df = l_df.loc[l_df['cell_line_name'] == cell_line]
+        for (compound, time), compound_df in cell_df.groupby(['compound_name', 'time'], sort=False):
+            doses = compound_df['dosage'].map(UIf.parse_measurement_string).to_numpy(dtype=float)
+            if len(np.unique(doses)) < 2:
+                continue
+            values = compound_df[analysis_cols].to_numpy(dtype=float)
+
+            positive = doses > 0
+            slope, intercept, slope_p = fit_linear_trend(np.log10(doses[positive]), values[positive])
+            rho, rho_p = rank_correlation(doses, values)
+            ec50, bottom, span = fit_hill(doses, values, grid_size)
+
+            result = pd.DataFrame({'cell_line_name': cell_line,
+                                   'compound_name': compound,
+                                   'time': time,
+                                   'process': analysis_cols,
+                                   'n_samples': len(doses),
+                                   'n_doses': len(np.unique(doses)),
+                                   'slope': slope,
+                                   'intercept': intercept,
+                                   'slope_p': slope_p,
+                                   'spearman_rho': rho,
+                                   'spearman_p': rho_p,
+                                   'ec50': ec50,
+                                   'bottom': bottom,
+                                   'span': span})
+            result['significant_slope'] = result['slope_p'] <= p_value
+            result['significant_trend'] = result['spearman_p'] <= p_value
+            results.append(result)
+
+    if not results:
+        return pd.DataFrame(columns=['cell_line_name', 'compound_name', 'time', 'process', 'n_samples', 'n_doses',
+                                     'slope', 'intercept', 'slope_p', 'spearman_rho', 'spearman_p', 'ec50', 'bottom',
+                                     'span', 'significant_slope', 'significant_trend'])
+    return pd.concat(results, ignore_index=True)
+
+
+def analyze_dose_response(important_l: pd.DataFrame, data_path: str, p_value: float = 0.05,
+                          save_path: str = os.getcwd(), cell_line_list: list = None,
+                          writer: ow.OutputWriter = None) -> pd.DataFrame:
+    """
+    This function runs 'dose_response' and saves a '<cell line>_dose_response.csv' file per cell line.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param p_value: The p-value threshold of the significance flags. Default is 0.05.
+    :param save_path: The path where the exported data will be saved.
+    :param cell_line_list: The cell lines to analyze. Default is all the cell lines.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :return: The dose-response DataFrame of all the cell lines.
+    """
+    results = dose_response(important_l, p_value=p_value, cell_line_list=cell_line_list)
+    folder_path = os.path.join(save_path, UIf.get_folder_name(data_path))
+
+    with ow.writer_context(writer) as writer:
+        for cell_line, cell_results in results.groupby('cell_line_name', sort=False):
+            cell_path = os.path.join(folder_path, cell_line)
+            os.makedirs(cell_path, exist_ok=True)
+            UIf.save_csv(cell_results, os.path.join(cell_path, f'{cell_line}_dose_response.csv'), writer,
+                         message=f"{cell_line}_dose_response.csv created successfully", index=False)
+    return results
+
+
+def analyze_time_course(important_l: pd.DataFrame, data_path: str, p_value: float = 0.05,
+                        save_path: str = os.getcwd(), cell_line_list: list = None,
+                        writer: ow.OutputWriter = None) -> pd.DataFrame:
+    """
+    This function runs 'time_course' and saves a '<cell line>_time_course.csv' file per cell line.
+
+    :param important_l: The DataFrame with only the important columns.
+    :param data_path: The path where the original dataframes are stored.
+    :param p_value: The p-value threshold of the significance flags. Default is 0.05.
+    :param save_path: The path where the exported data will be saved.
+    :param cell_line_list: The cell lines to analyze. Default is all the cell lines.
+    :param writer: The background writer of the outputs. Default is None - a writer is created and flushed at the end.
+    :return: The time-course DataFrame of all the cell lines.
+    """
+    results = time_course(important_l, p_value=p_value, cell_line_list=cell_line_list)
+    folder_path = os.path.join(save_path, UIf.get_folder_name(data_path))
+
+    with ow.writer_context(writer) as writer:
+        for cell_line, cell_results in results.groupby('cell_line_name', sort=False):
+            cell_path = os.path.join(folder_path, cell_line)
+            os.makedirs(cell_path, exist_ok=True)
+            UIf.save_csv(cell_results, os.path.join(cell_path, f'{cell_line}_time_course.csv'), writer,
+                         message=f"{cell_line}_time_course.csv created successfully", index=False)
+    return results